@@ -0,0 +1,75 @@
+"""add content hash and analysis cache
+
+Revision ID: 3f9c2a7d1b44
+Revises: 9d04d721dbfb
+Create Date: 2026-10-19 09:12:40.218533
+
+"""
+from typing import Sequence, Union
+import logging
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import text
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c2a7d1b44'
+down_revision: Union[str, None] = '9d04d721dbfb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Run migrations"""
+    try:
+        connection = op.get_bind()
+        connection.execute(text('SET search_path TO elucide, public'))
+        
+        # Content hash of the uploaded bytes
+        connection.execute(text('ALTER TABLE elucide.images ADD COLUMN content_hash VARCHAR(64)'))
+        connection.execute(text('CREATE INDEX ix_images_content_hash ON elucide.images (content_hash)'))
+        
+        # Cache accounting on processing records
+        connection.execute(text('ALTER TABLE elucide.image_processings ADD COLUMN cache_hit BOOLEAN DEFAULT FALSE'))
+        connection.execute(text('ALTER TABLE elucide.image_processings ADD COLUMN saved_api_seconds FLOAT'))
+        
+        connection.execute(text('''
+            CREATE TABLE elucide.analysis_cache (
+                id UUID PRIMARY KEY,
+                content_hash VARCHAR(64) NOT NULL,
+                prompt_hash VARCHAR(64) NOT NULL,
+                model_version VARCHAR NOT NULL,
+                description TEXT NOT NULL,
+                api_duration_seconds FLOAT,
+                hit_count INTEGER NOT NULL DEFAULT 0,
+                created_at TIMESTAMP WITH TIME ZONE,
+                last_hit_at TIMESTAMP WITH TIME ZONE,
+                CONSTRAINT uq_analysis_cache_key UNIQUE (content_hash, prompt_hash, model_version)
+            )
+        '''))
+        
+        logger.info("Migration completed successfully!")
+    except Exception as e:
+        logger.error(f"Error during migration: {str(e)}")
+        raise
+
+
+def downgrade() -> None:
+    """Revert migrations"""
+    try:
+        connection = op.get_bind()
+        connection.execute(text('SET search_path TO elucide, public'))
+        
+        connection.execute(text('DROP TABLE IF EXISTS elucide.analysis_cache'))
+        connection.execute(text('ALTER TABLE elucide.image_processings DROP COLUMN IF EXISTS saved_api_seconds'))
+        connection.execute(text('ALTER TABLE elucide.image_processings DROP COLUMN IF EXISTS cache_hit'))
+        connection.execute(text('DROP INDEX IF EXISTS elucide.ix_images_content_hash'))
+        connection.execute(text('ALTER TABLE elucide.images DROP COLUMN IF EXISTS content_hash'))
+        
+        logger.info("Downgrade completed successfully!")
+    except Exception as e:
+        logger.error(f"Error during downgrade: {str(e)}")
+        raise
@@ -0,0 +1,56 @@
+"""track processing rows not yet rolled up
+
+Revision ID: 4b8e2f6a1c93
+Revises: 7a1c5e3f9b24
+Create Date: 2026-10-19 21:04:17.552310
+
+"""
+from typing import Sequence, Union
+import logging
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import text
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# revision identifiers, used by Alembic.
+revision: str = '4b8e2f6a1c93'
+down_revision: Union[str, None] = '7a1c5e3f9b24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Run migrations"""
+    try:
+        connection = op.get_bind()
+        connection.execute(text('SET search_path TO elucide, public'))
+        
+        # Existing rows start pending, so the first refresh covers all of them
+        connection.execute(text('ALTER TABLE elucide.image_processings ADD COLUMN rollup_pending BOOLEAN NOT NULL DEFAULT true'))
+        connection.execute(text('''
+            CREATE INDEX ix_image_processings_rollup_pending ON elucide.image_processings (end_time)
+            WHERE rollup_pending
+        '''))
+        
+        logger.info("Migration completed successfully!")
+    except Exception as e:
+        logger.error(f"Error during migration: {str(e)}")
+        raise
+
+
+def downgrade() -> None:
+    """Revert migrations"""
+    try:
+        connection = op.get_bind()
+        connection.execute(text('SET search_path TO elucide, public'))
+        
+        connection.execute(text('DROP INDEX IF EXISTS elucide.ix_image_processings_rollup_pending'))
+        connection.execute(text('ALTER TABLE elucide.image_processings DROP COLUMN IF EXISTS rollup_pending'))
+        
+        logger.info("Downgrade completed successfully!")
+    except Exception as e:
+        logger.error(f"Error during downgrade: {str(e)}")
+        raise
@@ -0,0 +1,76 @@
+"""add processing rollups for latency analytics
+
+Revision ID: 5e2d8c61f0a3
+Revises: b71e4c09a5d2
+Create Date: 2026-10-19 11:20:41.318257
+
+"""
+from typing import Sequence, Union
+import logging
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import text
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# revision identifiers, used by Alembic.
+revision: str = '5e2d8c61f0a3'
+down_revision: Union[str, None] = 'b71e4c09a5d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Run migrations"""
+    try:
+        connection = op.get_bind()
+        connection.execute(text('SET search_path TO elucide, public'))
+        
+        connection.execute(text('''
+            CREATE TABLE elucide.processing_rollups (
+                id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+                granularity VARCHAR NOT NULL,
+                bucket_start TIMESTAMP WITH TIME ZONE NOT NULL,
+                model_version VARCHAR NOT NULL,
+                status VARCHAR NOT NULL,
+                job_count INTEGER NOT NULL,
+                duration_sum FLOAT,
+                api_count INTEGER NOT NULL,
+                api_duration_sum FLOAT,
+                duration_p50 FLOAT,
+                duration_p95 FLOAT,
+                duration_p99 FLOAT,
+                api_p50 FLOAT,
+                api_p95 FLOAT,
+                api_p99 FLOAT,
+                duration_histogram JSONB NOT NULL DEFAULT '{}'::jsonb,
+                api_histogram JSONB NOT NULL DEFAULT '{}'::jsonb,
+                refreshed_at TIMESTAMP WITH TIME ZONE,
+                CONSTRAINT uq_processing_rollup_key UNIQUE (granularity, bucket_start, model_version, status)
+            )
+        '''))
+        
+        # Refreshes only rescan recently finished jobs
+        connection.execute(text('CREATE INDEX ix_image_processings_end_time ON elucide.image_processings (end_time)'))
+        
+        logger.info("Migration completed successfully!")
+    except Exception as e:
+        logger.error(f"Error during migration: {str(e)}")
+        raise
+
+
+def downgrade() -> None:
+    """Revert migrations"""
+    try:
+        connection = op.get_bind()
+        connection.execute(text('SET search_path TO elucide, public'))
+        
+        connection.execute(text('DROP INDEX IF EXISTS elucide.ix_image_processings_end_time'))
+        connection.execute(text('DROP TABLE IF EXISTS elucide.processing_rollups'))
+        
+        logger.info("Downgrade completed successfully!")
+    except Exception as e:
+        logger.error(f"Error during downgrade: {str(e)}")
+        raise
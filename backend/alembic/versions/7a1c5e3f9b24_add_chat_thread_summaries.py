@@ -0,0 +1,54 @@
+"""add rolling summaries to chat threads
+
+Revision ID: 7a1c5e3f9b24
+Revises: e3b7d19a4c52
+Create Date: 2026-10-19 18:27:51.390462
+
+"""
+from typing import Sequence, Union
+import logging
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import text
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# revision identifiers, used by Alembic.
+revision: str = '7a1c5e3f9b24'
+down_revision: Union[str, None] = 'e3b7d19a4c52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Run migrations"""
+    try:
+        connection = op.get_bind()
+        connection.execute(text('SET search_path TO elucide, public'))
+        
+        connection.execute(text('ALTER TABLE elucide.chat_threads ADD COLUMN summary TEXT'))
+        connection.execute(text('ALTER TABLE elucide.chat_threads ADD COLUMN summary_message_count INTEGER NOT NULL DEFAULT 0'))
+        connection.execute(text('ALTER TABLE elucide.chat_threads ADD COLUMN summary_updated_at TIMESTAMP WITH TIME ZONE'))
+        
+        logger.info("Migration completed successfully!")
+    except Exception as e:
+        logger.error(f"Error during migration: {str(e)}")
+        raise
+
+
+def downgrade() -> None:
+    """Revert migrations"""
+    try:
+        connection = op.get_bind()
+        connection.execute(text('SET search_path TO elucide, public'))
+        
+        connection.execute(text('ALTER TABLE elucide.chat_threads DROP COLUMN IF EXISTS summary_updated_at'))
+        connection.execute(text('ALTER TABLE elucide.chat_threads DROP COLUMN IF EXISTS summary_message_count'))
+        connection.execute(text('ALTER TABLE elucide.chat_threads DROP COLUMN IF EXISTS summary'))
+        
+        logger.info("Downgrade completed successfully!")
+    except Exception as e:
+        logger.error(f"Error during downgrade: {str(e)}")
+        raise
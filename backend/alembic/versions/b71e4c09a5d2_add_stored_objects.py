@@ -0,0 +1,62 @@
+"""add stored objects for content-addressed uploads
+
+Revision ID: b71e4c09a5d2
+Revises: 3f9c2a7d1b44
+Create Date: 2026-10-19 10:03:17.552904
+
+"""
+from typing import Sequence, Union
+import logging
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import text
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# revision identifiers, used by Alembic.
+revision: str = 'b71e4c09a5d2'
+down_revision: Union[str, None] = '3f9c2a7d1b44'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Run migrations"""
+    try:
+        connection = op.get_bind()
+        connection.execute(text('SET search_path TO elucide, public'))
+        
+        connection.execute(text('''
+            CREATE TABLE elucide.stored_objects (
+                content_hash VARCHAR(64) PRIMARY KEY,
+                storage_path VARCHAR NOT NULL,
+                size_bytes INTEGER,
+                ref_count INTEGER NOT NULL DEFAULT 1,
+                created_at TIMESTAMP WITH TIME ZONE
+            )
+        '''))
+        
+        # Per-user duplicate lookups at upload time
+        connection.execute(text('CREATE INDEX ix_images_user_content_hash ON elucide.images (user_id, content_hash)'))
+        
+        logger.info("Migration completed successfully!")
+    except Exception as e:
+        logger.error(f"Error during migration: {str(e)}")
+        raise
+
+
+def downgrade() -> None:
+    """Revert migrations"""
+    try:
+        connection = op.get_bind()
+        connection.execute(text('SET search_path TO elucide, public'))
+        
+        connection.execute(text('DROP INDEX IF EXISTS elucide.ix_images_user_content_hash'))
+        connection.execute(text('DROP TABLE IF EXISTS elucide.stored_objects'))
+        
+        logger.info("Downgrade completed successfully!")
+    except Exception as e:
+        logger.error(f"Error during downgrade: {str(e)}")
+        raise
@@ -0,0 +1,63 @@
+"""add job results for large celery results
+
+Revision ID: c8a4f2e91d07
+Revises: 5e2d8c61f0a3
+Create Date: 2026-10-19 14:05:12.604118
+
+"""
+from typing import Sequence, Union
+import logging
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import text
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8a4f2e91d07'
+down_revision: Union[str, None] = '5e2d8c61f0a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Run migrations"""
+    try:
+        connection = op.get_bind()
+        connection.execute(text('SET search_path TO elucide, public'))
+        
+        connection.execute(text('''
+            CREATE TABLE elucide.job_results (
+                job_id VARCHAR PRIMARY KEY,
+                task_name VARCHAR,
+                status VARCHAR NOT NULL,
+                result JSONB,
+                size_bytes INTEGER,
+                created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                expires_at TIMESTAMP WITH TIME ZONE
+            )
+        '''))
+        
+        # Compaction purges expired results
+        connection.execute(text('CREATE INDEX ix_job_results_expires_at ON elucide.job_results (expires_at)'))
+        
+        logger.info("Migration completed successfully!")
+    except Exception as e:
+        logger.error(f"Error during migration: {str(e)}")
+        raise
+
+
+def downgrade() -> None:
+    """Revert migrations"""
+    try:
+        connection = op.get_bind()
+        connection.execute(text('SET search_path TO elucide, public'))
+        
+        connection.execute(text('DROP TABLE IF EXISTS elucide.job_results'))
+        
+        logger.info("Downgrade completed successfully!")
+    except Exception as e:
+        logger.error(f"Error during downgrade: {str(e)}")
+        raise
@@ -0,0 +1,69 @@
+"""add ingest derivatives and image embeddings
+
+Revision ID: e3b7d19a4c52
+Revises: c8a4f2e91d07
+Create Date: 2026-10-19 16:42:37.218904
+
+"""
+from typing import Sequence, Union
+import logging
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import text
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3b7d19a4c52'
+down_revision: Union[str, None] = 'c8a4f2e91d07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Run migrations"""
+    try:
+        connection = op.get_bind()
+        connection.execute(text('SET search_path TO elucide, public'))
+        
+        # Written by the ingest workflow's derivative and hashing stages
+        connection.execute(text('ALTER TABLE elucide.images ADD COLUMN perceptual_hash VARCHAR(16)'))
+        connection.execute(text('ALTER TABLE elucide.images ADD COLUMN thumbnail_path VARCHAR'))
+        connection.execute(text('CREATE INDEX ix_images_perceptual_hash ON elucide.images (perceptual_hash)'))
+        
+        connection.execute(text('''
+            CREATE TABLE elucide.image_embeddings (
+                id UUID PRIMARY KEY,
+                image_id UUID NOT NULL REFERENCES elucide.images(id) ON DELETE CASCADE,
+                model VARCHAR NOT NULL,
+                source_hash VARCHAR(64) NOT NULL,
+                dimensions INTEGER NOT NULL,
+                embedding DOUBLE PRECISION[] NOT NULL,
+                created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                CONSTRAINT uq_image_embeddings_image_model UNIQUE (image_id, model)
+            )
+        '''))
+        
+        logger.info("Migration completed successfully!")
+    except Exception as e:
+        logger.error(f"Error during migration: {str(e)}")
+        raise
+
+
+def downgrade() -> None:
+    """Revert migrations"""
+    try:
+        connection = op.get_bind()
+        connection.execute(text('SET search_path TO elucide, public'))
+        
+        connection.execute(text('DROP TABLE IF EXISTS elucide.image_embeddings'))
+        connection.execute(text('DROP INDEX IF EXISTS elucide.ix_images_perceptual_hash'))
+        connection.execute(text('ALTER TABLE elucide.images DROP COLUMN IF EXISTS thumbnail_path'))
+        connection.execute(text('ALTER TABLE elucide.images DROP COLUMN IF EXISTS perceptual_hash'))
+        
+        logger.info("Downgrade completed successfully!")
+    except Exception as e:
+        logger.error(f"Error during downgrade: {str(e)}")
+        raise
@@ -0,0 +1,89 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Dict, Any, Optional
+from datetime import datetime, timezone, timedelta
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.security import get_admin_user
+from app.core.config import get_db
+from app.core.logging import setup_logger
+from app.services.analytics_service import GRANULARITIES, get_latency_series, get_latency_histogram
+from app.services.llm_gateway import gateway
+
+# Set up logging
+logger = setup_logger("analytics")
+
+router = APIRouter()
+
+# Window returned when no start is given
+DEFAULT_WINDOWS = {
+    "minute": timedelta(hours=1),
+    "hour": timedelta(days=1),
+    "day": timedelta(days=30)
+}
+
+def _resolve_window(granularity: str, start: Optional[datetime], end: Optional[datetime]):
+    """Validate the granularity and fill in a default time range"""
+    if granularity not in GRANULARITIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid granularity: {granularity}. Must be one of {', '.join(GRANULARITIES)}"
+        )
+    end = end or datetime.now(timezone.utc)
+    start = start or end - DEFAULT_WINDOWS[granularity]
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    return start, end
+
+@router.get("/latency")
+async def get_latency(
+    granularity: str = Query("hour"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    model_version: Optional[str] = None,
+    status: Optional[str] = None,
+    current_user: Dict[str, Any] = Depends(get_admin_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get p50/p95/p99 of job and API duration per time bucket, model version and status"""
+    start, end = _resolve_window(granularity, start, end)
+    buckets = await get_latency_series(db, granularity, start, end, model_version, status)
+    return {
+        "granularity": granularity,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "buckets": buckets
+    }
+
+@router.get("/latency/histogram")
+async def get_latency_histogram_endpoint(
+    granularity: str = Query("hour"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    model_version: Optional[str] = None,
+    status: Optional[str] = None,
+    current_user: Dict[str, Any] = Depends(get_admin_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get latency histograms and approximate percentiles over a time range, per model version"""
+    start, end = _resolve_window(granularity, start, end)
+    models = await get_latency_histogram(db, granularity, start, end, model_version, status)
+    return {
+        "granularity": granularity,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "models": models
+    }
+
+@router.get("/providers")
+async def get_provider_budgets(
+    current_user: Dict[str, Any] = Depends(get_admin_user)
+):
+    """Get each provider and model's rate budget, queued calls and recent queue waits per lane"""
+    try:
+        return {"budgets": gateway.state()}
+    except Exception as e:
+        logger.error(f"Error reading provider budgets: {str(e)}")
+        raise HTTPException(status_code=503, detail="Provider budgets unavailable")
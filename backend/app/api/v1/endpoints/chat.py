@@ -6,6 +6,7 @@ import logging
 from sqlalchemy import select, update
 from datetime import datetime
 from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 
 from app.db.session import get_db
 from app.db.repositories.chat import ChatRepository
@@ -19,6 +20,7 @@ from app.schemas.chat import (
     ChatThreadWithMessages
 )
 from app.services.chat_service import ChatService
+from app.services.thread_summary_service import request_summary
 from pydantic import BaseModel, Field
 
 logger = logging.getLogger(__name__)
@@ -326,21 +328,38 @@ async def chat(
         chat_repo = ChatRepository(db)
 
         # Store the user's message
+        thread_id = UUID(request.thread_id)
         last_message = request.messages[-1]
         await chat_repo.add_message(
-            thread_id=UUID(request.thread_id),
+            thread_id=thread_id,
             role=last_message["role"],
             content=last_message["content"],
             model=request.model
         )
 
-        # Get chat response
+        # The rolling summary stands in for the messages it covers
+        thread = await chat_repo.get_thread(thread_id)
+        summary = thread.summary if thread else None
+        summarized_count = (thread.summary_message_count or 0) if thread else 0
+        message_count = await chat_repo.count_thread_messages(thread_id)
+        unsummarized = None
+        if summary:
+            unsummarized = [
+                {"role": message.role, "content": message.content}
+                for message in await chat_repo.get_messages_after(thread_id, summarized_count)
+            ]
+
+        # Get chat response; a fallback model may answer instead of the requested one
+        served = {"model": request.model}
         chat_stream = chat_service.stream_chat(
             messages=request.messages,
             model=request.model,
             thread_id=request.thread_id,
             temperature=request.temperature,
-            max_tokens=request.max_tokens
+            max_tokens=request.max_tokens,
+            summary=summary,
+            unsummarized=unsummarized,
+            on_model=lambda name: served.update(model=name)
         )
 
         # Create a wrapper generator that stores the assistant's response
@@ -352,12 +371,17 @@ async def chat(
 
             # Store the assistant's response after streaming is complete
             await chat_repo.add_message(
-                thread_id=UUID(request.thread_id),
+                thread_id=thread_id,
                 role="assistant",
                 content=accumulated_response,
-                model=request.model
+                model=served["model"]
             )
 
+            # Fold older messages into the summary in the background once enough have built up
+            if thread:
+                # Blocking Redis and broker calls stay off the event loop
+                await run_in_threadpool(request_summary, request.thread_id, message_count + 1, summarized_count)
+
         return StreamingResponse(
             stream_and_store(),
             media_type="text/event-stream"
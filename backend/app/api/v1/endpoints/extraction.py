@@ -4,7 +4,7 @@ from pydantic import BaseModel, HttpUrl
 from app.core.security import get_current_user
 from app.services.extraction_service import extract_data, create_extraction_schema
 from app.core.logging import setup_logger
-from celery.result import AsyncResult
+from app.core.job_backend import submit_job, get_job_result
 
 # Set up logging
 logger = setup_logger("extraction_endpoints")
@@ -38,13 +38,13 @@ async def create_extraction(
             raise HTTPException(status_code=400, detail="No URLs provided")
             
         # Start Celery task
-        task = extract_data.delay(
-            urls=request.urls,
-            prompt=request.prompt,
-            schema=request.extraction_schema,
-            enable_web_search=request.enable_web_search,
-            user_id=current_user["user_id"]
-        )
+        task = submit_job(extract_data, kwargs={
+            "urls": request.urls,
+            "prompt": request.prompt,
+            "schema": request.extraction_schema,
+            "enable_web_search": request.enable_web_search,
+            "user_id": current_user["user_id"]
+        })
         
         return ExtractionResponse(
             job_id=task.id,
@@ -67,7 +67,7 @@ async def get_extraction_status(
     Get the status of an extraction job
     """
     try:
-        task_result = AsyncResult(job_id)
+        task_result = get_job_result(job_id)
         
         if task_result.ready():
             if task_result.successful():
@@ -1,7 +1,8 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Body
-from typing import List, Dict, Any
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Body, Header
+from typing import List, Dict, Any, Optional
 import uuid
 import os
+import hashlib
 from app.core.security import get_current_user
 from app.core.config import settings, get_sync_db
 from app.db.repositories.sync_storage import SyncStorageManager
@@ -9,9 +10,13 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.config import get_db
 from app.utils.helpers import is_valid_file, is_valid_image, generate_unique_filename
 from app.core.logging import setup_logger
-from app.services.image_service import upload_image, analyze_image
+from app.services.image_service import upload_image, analyze_images_batch
+from app.core.job_backend import submit_job
+from app.services.fair_queue import analysis_queue
+from app.services.ingest_service import start_ingest
+from app.services.single_flight import analysis_flights, analysis_flight_key, IdempotencyKeyReusedError
 from app.services.stats_service import sync_stats
-from app.db.models.image import Image
+from pydantic import BaseModel
 import httpx
 
 # Set up logging
@@ -19,6 +24,11 @@ logger = setup_logger("images")
 
 router = APIRouter()
 
+class BatchAnalysisRequest(BaseModel):
+    """Model for batch analysis request"""
+    image_ids: List[uuid.UUID]
+    prompt: str
+
 @router.post("/")
 async def upload_images(
     files: List[UploadFile] = File(...),
@@ -46,42 +56,32 @@ async def upload_images(
                 unique_filename = generate_unique_filename(file.filename)
                 file_path = os.path.join(settings.UPLOAD_DIR, unique_filename)
                 
-                # Save file temporarily
-                content = await file.read()
+                # Save file temporarily, hashing the bytes as they stream in
+                content_hash = hashlib.sha256()
                 with open(file_path, "wb") as f:
-                    f.write(content)
+                    while chunk := await file.read(settings.UPLOAD_CHUNK_SIZE):
+                        content_hash.update(chunk)
+                        f.write(chunk)
                 
                 if not is_valid_image(file_path):
                     os.remove(file_path)
                     continue
 
-                # Generate GCS key
-                image_id = uuid.uuid4()
-                gcs_key = f"users/{current_user['user_id']}/images/{image_id}/{unique_filename}"
-                
-                # Upload to GCS
-                bucket = storage.bucket
-                blob = bucket.blob(gcs_key)
-                blob.content_type = "image/jpeg"
-                blob.cache_control = "public, max-age=31536000"
-                blob.upload_from_filename(file_path, predefined_acl='publicRead')
-                
-                # Create database record
-                image = Image(
-                    id=image_id,
-                    filename=file.filename,
-                    storage_path=gcs_key,
-                    user_id=current_user["user_id"]
+                # Upload to GCS and create the database record, reusing identical content
+                image, created = storage.store_image_file(
+                    file_path,
+                    file.filename,
+                    current_user["user_id"],
+                    content_hash.hexdigest()
                 )
-                sync_db.add(image)
-                sync_db.commit()
                 
                 # Return the public URL
-                public_url = f"https://storage.googleapis.com/elucide/{gcs_key}"
+                public_url = f"https://storage.googleapis.com/elucide/{image.storage_path}"
                 results.append({
-                    "id": str(image_id),
+                    "id": str(image.id),
                     "filename": file.filename,
-                    "url": public_url
+                    "url": public_url,
+                    "duplicate": not created
                 })
                 
             except Exception as e:
@@ -97,14 +97,47 @@ async def upload_images(
     finally:
         sync_db.close()
 
+@router.post("/ingest")
+async def ingest_image(
+    file: UploadFile = File(...),
+    prompt: Optional[str] = Form(None),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Upload, derive, analyze and index an image as one job; poll or stream it under /jobs/{job_id}"""
+    if not file.filename or not is_valid_file(file.filename):
+        raise HTTPException(status_code=400, detail="Unsupported file type")
+    
+    # Save the file for the upload workers, which read it once and share the bytes with later stages
+    file_path = os.path.join(settings.UPLOAD_DIR, generate_unique_filename(file.filename))
+    try:
+        size = 0
+        with open(file_path, "wb") as f:
+            while chunk := await file.read(settings.UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > settings.MAX_UPLOAD_SIZE:
+                    raise HTTPException(status_code=413, detail=f"File is larger than {settings.MAX_UPLOAD_SIZE} bytes")
+                f.write(chunk)
+        job_id = start_ingest(file_path, file.filename, current_user["user_id"], prompt)
+    except Exception:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+    logger.info(f"Created ingest job {job_id} for {file.filename}")
+    
+    return {
+        "job_id": job_id,
+        "filename": file.filename
+    }
+
 @router.post("/{image_id}/analyze")
 async def analyze_image_endpoint(
     image_id: uuid.UUID,
     prompt: str = Body(..., embed=True),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     current_user: Dict[str, Any] = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """Analyze an image with a user-provided prompt"""
+    """Analyze an image with a user-provided prompt; repeats of an unfinished request return its job"""
     logger.info(f"Analyzing image {image_id} with prompt: {prompt}")
     
     # Use sync session for storage operations
@@ -113,21 +146,78 @@ async def analyze_image_endpoint(
         storage = SyncStorageManager(sync_db)
         
         # Verify image exists and belongs to user
+        user_id = current_user["user_id"]
         image = storage.get_image_with_analysis(image_id)
-        if not image:
+        # Someone else's image is not found: its in-flight job must not be shared
+        if not image or image["user_id"] != user_id:
             raise HTTPException(status_code=404, detail="Image not found")
         
-        # Start analysis task
-        task = analyze_image.delay(str(image_id), prompt)
-        logger.info(f"Created analysis job {task.id} for image {image_id}")
+        # Claim the request atomically so double clicks and client retries share one job
+        flight_key = analysis_flight_key(str(image_id), prompt)
+        request_key = analysis_flights.idempotency_key(user_id, idempotency_key) if idempotency_key else None
+        job_id = str(uuid.uuid4())
+        try:
+            existing = analysis_flights.claim(flight_key, job_id, request_key)
+        except IdempotencyKeyReusedError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        if existing:
+            logger.info(f"Returning in-flight analysis job {existing} for image {image_id}")
+            return {
+                "job_id": existing,
+                "image_id": str(image_id),
+                "deduplicated": True
+            }
+        
+        # Queue the analysis behind the user's own jobs; it reaches the workers in fair turn
+        try:
+            analysis_queue.submit(user_id, [str(image_id), prompt, user_id], job_id=job_id)
+        except Exception:
+            analysis_flights.release(flight_key, job_id, request_key)
+            raise
+        logger.info(f"Created analysis job {job_id} for image {image_id}")
         
         return {
-            "job_id": task.id,
-            "image_id": str(image_id)
+            "job_id": job_id,
+            "image_id": str(image_id),
+            "deduplicated": False
         }
     finally:
         sync_db.close()
 
+@router.get("/analyze/queue")
+async def get_analysis_queue(
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Get the current user's queued and running analyses and their recent queue waits"""
+    return analysis_queue.user_stats(current_user["user_id"])
+
+@router.post("/analyze/batch")
+async def analyze_images_batch_endpoint(
+    request: BatchAnalysisRequest,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Analyze many images with one prompt as a single job"""
+    image_ids = list(dict.fromkeys(str(image_id) for image_id in request.image_ids))
+    if not image_ids:
+        raise HTTPException(status_code=400, detail="No image IDs provided")
+    if len(image_ids) > settings.BATCH_ANALYSIS_MAX_IMAGES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many images: at most {settings.BATCH_ANALYSIS_MAX_IMAGES} per batch"
+        )
+    
+    logger.info(f"Analyzing {len(image_ids)} images with prompt: {request.prompt}")
+    
+    # Start a single batch task; it verifies ownership and reports per-image results
+    task = submit_job(analyze_images_batch, [image_ids, request.prompt, current_user["user_id"]])
+    logger.info(f"Created batch analysis job {task.id} for {len(image_ids)} images")
+    
+    return {
+        "job_id": task.id,
+        "image_ids": image_ids
+    }
+
 @router.get("/{image_id}")
 async def get_image(
     image_id: uuid.UUID,
@@ -1,18 +1,32 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from typing import Dict, Any
-from celery.result import AsyncResult
+from app.core.job_backend import get_job_result
 from app.core.security import get_current_user
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.config import get_db
 from app.utils.helpers import parse_celery_result
 from app.core.logging import setup_logger
 from app.services.stats_service import stats
+from app.core.job_events import job_event_hub, stream_job_events
 
 # Set up logging
 logger = setup_logger("stats")
 
 router = APIRouter()
 
+@router.get("/{job_id}/events")
+async def get_job_events(
+    job_id: str,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Stream job state transitions as server-sent events instead of polling the job status"""
+    return StreamingResponse(
+        stream_job_events(job_id, job_event_hub),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/{job_id}")
 async def get_job_status(
     job_id: str,
@@ -21,7 +35,7 @@ async def get_job_status(
 ):
     """Get job status and results"""
     try:
-        result = AsyncResult(job_id)
+        result = get_job_result(job_id)
         celery_result = parse_celery_result(job_id, result)
         
         # Add processing details if available
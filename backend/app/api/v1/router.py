@@ -1,9 +1,10 @@
 from fastapi import APIRouter
-from app.api.v1.endpoints import images, stats, chat, extraction
+from app.api.v1.endpoints import images, stats, chat, extraction, analytics
 
 api_router = APIRouter()
 
 api_router.include_router(images.router, prefix="/images", tags=["images"])
 api_router.include_router(stats.router, prefix="/jobs", tags=["jobs"])
 api_router.include_router(chat.router, prefix="/chat", tags=["chat"])
-api_router.include_router(extraction.router, prefix="/extraction", tags=["extraction"]) 
\ No newline at end of file
+api_router.include_router(extraction.router, prefix="/extraction", tags=["extraction"])
+api_router.include_router(analytics.router, prefix="/analytics", tags=["analytics"]) 
\ No newline at end of file
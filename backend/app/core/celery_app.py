@@ -1,9 +1,24 @@
-from celery import Celery
+from celery import Celery, Task
 import os
 from dotenv import load_dotenv
 from kombu.serialization import register
+from celery.signals import (
+    before_task_publish, task_prerun, task_postrun, worker_init, worker_process_init, worker_process_shutdown, worker_shutdown
+)
+from celery.concurrency import get_implementation
 import json
+import time
+from datetime import datetime
 from uuid import UUID
+from app.core.metrics import CELERY_TASK_DURATION, CELERY_TASKS, start_metrics_server, mark_process_dead
+from app.core.tracing import setup_tracing, inject_task_headers, start_task_span, end_task_span
+from app.core.job_events import TERMINAL_STATES, publish_job_event
+from app.db.session import init_worker_engine, dispose_worker_engine
+from app.core.job_backend import local_jobs, uses_local_jobs
+from app.core.queues import (
+    DEFAULT_QUEUE, UPLOADS_QUEUE, ANALYSIS_QUEUE, EXTRACTION_QUEUE, MAINTENANCE_QUEUE,
+    PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW, PRIORITY_STEPS, PRIORITY_SEP
+)
 
 load_dotenv()
 
@@ -22,29 +37,225 @@ def custom_loads(obj):
     return json.loads(obj)
 
 # Register our custom serializer
+JSON_CONTENT_TYPE = 'application/x-custom-json'
 register('custom_json', custom_dumps, custom_loads,
-         content_type='application/x-custom-json',
+         content_type=JSON_CONTENT_TYPE,
          content_encoding='utf-8')
 
+# Optional binary serializer (pip install msgpack), registered alongside custom_json.
+# Messages carry their content type, so workers accepting both can mix them.
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK_CONTENT_TYPE = 'application/x-custom-msgpack'
+MSGPACK_EXT_UUID = 1
+MSGPACK_EXT_DATETIME = 2
+
+def _msgpack_default(obj):
+    if isinstance(obj, UUID):
+        return msgpack.ExtType(MSGPACK_EXT_UUID, obj.bytes)
+    if isinstance(obj, datetime):
+        return msgpack.ExtType(MSGPACK_EXT_DATETIME, obj.isoformat().encode())
+    raise TypeError(f"Object of type {type(obj).__name__} is not msgpack serializable")
+
+def _msgpack_ext_hook(code, data):
+    if code == MSGPACK_EXT_UUID:
+        return UUID(bytes=data)
+    if code == MSGPACK_EXT_DATETIME:
+        return datetime.fromisoformat(data.decode())
+    return msgpack.ExtType(code, data)
+
+def custom_msgpack_dumps(obj):
+    return msgpack.packb(obj, default=_msgpack_default, use_bin_type=True)
+
+def custom_msgpack_loads(data):
+    return msgpack.unpackb(data, ext_hook=_msgpack_ext_hook, raw=False, strict_map_key=False)
+
+if msgpack is not None:
+    register('custom_msgpack', custom_msgpack_dumps, custom_msgpack_loads,
+             content_type=MSGPACK_CONTENT_TYPE,
+             content_encoding='binary')
+
+# Switch to custom_msgpack only once every worker and API process runs code that accepts it
+celery_serializer = os.getenv('CELERY_SERIALIZER', 'custom_json')
+if celery_serializer == 'custom_msgpack' and msgpack is None:
+    raise ImportError("CELERY_SERIALIZER=custom_msgpack requires the msgpack package")
+
+class JobEventTask(Task):
+    """Publishes state transitions to the job's watchers once the result backend has them"""
+
+    publish_events = True  # Off for housekeeping tasks nobody watches
+
+    def before_start(self, task_id, args, kwargs):
+        if self.publish_events:
+            publish_job_event(task_id, "STARTED")
+
+    def update_state(self, task_id=None, state=None, meta=None, **kwargs):
+        if uses_local_jobs():
+            # Run by the local executor, which keeps job states in memory
+            local_jobs.update(task_id or self.request.id, state, meta)
+        else:
+            super().update_state(task_id=task_id, state=state, meta=meta, **kwargs)
+        if self.publish_events:
+            publish_job_event(task_id or self.request.id, state, meta)
+            if state in TERMINAL_STATES:
+                # Tasks that report their own outcome are not announced again on return
+                self.request.job_event_published = True
+
+    def on_success(self, retval, task_id, args, kwargs):
+        if self.publish_events and not getattr(self.request, "job_event_published", False):
+            publish_job_event(task_id, "SUCCESS", retval)
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        if self.publish_events:
+            publish_job_event(task_id, "FAILURE", exc)
+
 # Initialize Celery with Redis backend
 redis_url = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
 celery_app = Celery(
     'tasks',
     broker=redis_url,
-    backend='redis'  # Just specify the backend type
+    backend='redis',  # Just specify the backend type
+    task_cls=JobEventTask
 )
 
 # Configure Celery
 celery_app.conf.update(
     broker_url=redis_url,
     result_backend=redis_url,
-    task_serializer='custom_json',
-    accept_content=['custom_json', 'application/json', 'json'],  # Accept more content types
-    result_serializer='custom_json',
-    result_expires=None,  # Results don't expire
+    task_serializer=celery_serializer,
+    accept_content=['custom_json', 'application/json', 'json'] + (['custom_msgpack'] if msgpack else []),  # Accept more content types
+    result_serializer=celery_serializer,
+    result_expires=int(os.getenv('RESULT_TTL_SECONDS', str(24 * 60 * 60))),  # Per-task TTLs come from RESULT_TTLS
     task_track_started=True,  # Track when tasks are started
+    task_default_queue=DEFAULT_QUEUE,
+    # Quick uploads, vision calls and slow crawls no longer queue behind each other;
+    # within a queue interactive work is served before batches
+    task_routes={
+        'app.services.image_service.upload_image': {'queue': UPLOADS_QUEUE, 'priority': PRIORITY_HIGH},
+        'app.services.image_service.analyze_image': {'queue': ANALYSIS_QUEUE, 'priority': PRIORITY_NORMAL},
+        'app.services.image_service.analyze_images_batch': {'queue': ANALYSIS_QUEUE, 'priority': PRIORITY_LOW},
+        # Ingest workflow: storage and image work on the upload workers, provider calls on the analysis workers
+        'app.services.ingest_service.ingest_upload': {'queue': UPLOADS_QUEUE, 'priority': PRIORITY_HIGH},
+        'app.services.ingest_service.ingest_derivatives': {'queue': UPLOADS_QUEUE, 'priority': PRIORITY_NORMAL},
+        'app.services.ingest_service.ingest_perceptual_hash': {'queue': UPLOADS_QUEUE, 'priority': PRIORITY_NORMAL},
+        'app.services.ingest_service.ingest_analysis': {'queue': ANALYSIS_QUEUE, 'priority': PRIORITY_NORMAL},
+        'app.services.ingest_service.ingest_embedding': {'queue': ANALYSIS_QUEUE, 'priority': PRIORITY_NORMAL},
+        'app.services.ingest_service.finalize_ingest': {'queue': UPLOADS_QUEUE, 'priority': PRIORITY_HIGH},
+        'app.services.extraction_service.extract_data': {'queue': EXTRACTION_QUEUE, 'priority': PRIORITY_NORMAL},
+        'app.services.thread_summary_service.summarize_thread': {'queue': ANALYSIS_QUEUE, 'priority': PRIORITY_LOW},
+        'app.services.stats_service.flush_job_stats': {'queue': MAINTENANCE_QUEUE},
+        'app.services.analytics_service.refresh_latency_rollups': {'queue': MAINTENANCE_QUEUE},
+        'app.services.result_service.compact_task_results': {'queue': MAINTENANCE_QUEUE},
+        'app.services.fair_queue.dispatch_fair_queues': {'queue': MAINTENANCE_QUEUE}
+    },
+    task_default_priority=PRIORITY_NORMAL,
+    broker_transport_options={
+        'queue_order_strategy': 'priority',
+        'priority_steps': PRIORITY_STEPS,
+        'sep': PRIORITY_SEP,
+        # Unacknowledged acks_late tasks are redelivered after this, so it must outlast the slowest crawl
+        'visibility_timeout': int(os.getenv('CELERY_VISIBILITY_TIMEOUT_SECONDS', str(2 * 60 * 60)))
+    },
+    # Job tasks are acknowledged after they finish so a lost worker's tasks are redelivered;
+    # housekeeping tasks just run again on the next beat
+    task_annotations={
+        'app.services.image_service.upload_image': {'acks_late': True},
+        'app.services.image_service.analyze_image': {'acks_late': True},
+        'app.services.image_service.analyze_images_batch': {'acks_late': True},
+        'app.services.ingest_service.ingest_upload': {'acks_late': True},
+        'app.services.ingest_service.ingest_derivatives': {'acks_late': True},
+        'app.services.ingest_service.ingest_perceptual_hash': {'acks_late': True},
+        'app.services.ingest_service.ingest_analysis': {'acks_late': True},
+        'app.services.ingest_service.ingest_embedding': {'acks_late': True},
+        'app.services.extraction_service.extract_data': {'acks_late': True}
+    },
+    task_reject_on_worker_lost=True,
     task_ignore_result=False,  # Don't ignore results
     timezone='UTC',
     enable_utc=True,
-    imports=['app.services.image_service']  # Updated import path
-) 
\ No newline at end of file
+    imports=['app.services.image_service', 'app.services.extraction_service', 'app.services.stats_service', 'app.services.analytics_service', 'app.services.result_service', 'app.services.fair_queue', 'app.services.single_flight', 'app.services.ingest_service', 'app.services.thread_summary_service'],  # Updated import path
+    beat_schedule={
+        'flush-job-stats': {
+            'task': 'app.services.stats_service.flush_job_stats',
+            'schedule': float(os.getenv('STATS_FLUSH_INTERVAL_SECONDS', '10'))
+        },
+        'refresh-latency-rollups': {
+            'task': 'app.services.analytics_service.refresh_latency_rollups',
+            'schedule': float(os.getenv('LATENCY_ROLLUP_INTERVAL_SECONDS', '60'))
+        },
+        'compact-task-results': {
+            'task': 'app.services.result_service.compact_task_results',
+            'schedule': float(os.getenv('RESULT_COMPACTION_INTERVAL_SECONDS', '3600'))
+        },
+        'dispatch-fair-queues': {
+            'task': 'app.services.fair_queue.dispatch_fair_queues',
+            'schedule': float(os.getenv('FAIR_QUEUE_DISPATCH_INTERVAL_SECONDS', '5'))
+        }
+    }
+)
+
+# Store results through the Redis backend with per-task TTLs; result_backend still supplies the URL
+celery_app.backend_cls = 'app.core.result_backend:RetentionRedisBackend'
+
+# Task runtime metrics, keyed by task ID between prerun and postrun
+_task_started = {}
+
+@task_prerun.connect
+def _record_task_start(task_id=None, task=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+    if task is not None:
+        start_task_span(task_id, task)
+
+@task_postrun.connect
+def _record_task_end(task_id=None, task=None, retval=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is None:
+        return
+    # Our tasks report failures as an error result rather than raising
+    if isinstance(retval, dict) and retval.get("status") == "error":
+        state = "FAILURE"
+    name = task.name if task else "unknown"
+    CELERY_TASK_DURATION.labels(task=name, state=state or "UNKNOWN").observe(time.perf_counter() - started)
+    CELERY_TASKS.labels(task=name, state=state or "UNKNOWN").inc()
+    end_task_span(task_id, retval, state)
+
+# Carry the publisher's trace context into the task message
+@before_task_publish.connect
+def _propagate_trace(headers=None, **kwargs):
+    if headers is not None:
+        inject_task_headers(headers)
+
+@worker_init.connect
+def _start_worker_metrics(**kwargs):
+    setup_tracing(os.getenv('TRACING_SERVICE_NAME', 'elucide-worker'))
+    port = int(os.getenv('CELERY_METRICS_PORT', '0'))
+    if port:
+        start_metrics_server(port)
+
+@worker_process_shutdown.connect
+def _release_worker_metrics(pid=None, **kwargs):
+    mark_process_dead(pid or os.getpid())
+
+# One pooled database engine per worker process. Prefork and solo pools run tasks in a
+# process that signals worker_process_init (after the fork, for prefork); thread and
+# green pools run them in the main process, which shares one pool across its tasks.
+@worker_init.connect
+def _init_thread_pool_engine(sender=None, **kwargs):
+    pool_cls = get_implementation(sender.pool_cls)
+    if pool_cls.__module__.rsplit('.', 1)[-1] not in ('prefork', 'solo'):
+        init_worker_engine(sender.concurrency)
+
+@worker_process_init.connect
+def _init_process_engine(**kwargs):
+    init_worker_engine()
+
+@worker_process_shutdown.connect
+def _dispose_process_engine(**kwargs):
+    dispose_worker_engine()
+
+@worker_shutdown.connect
+def _dispose_thread_pool_engine(**kwargs):
+    dispose_worker_engine()
@@ -10,6 +10,7 @@ from urllib.parse import urlparse, parse_qs
 import logging
 import sys
 from sqlalchemy.pool import NullPool
+from app.core.metrics import instrument_engine
 
 # Configure logging
 logging.basicConfig(
@@ -73,12 +74,130 @@ class Settings(BaseSettings):
     
     # OpenAI settings
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
+    OPENAI_BASE_URL: str = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+    GROQ_BASE_URL: str = os.getenv("GROQ_BASE_URL", "https://api.groq.com")
+    VISION_MODEL: str = os.getenv("VISION_MODEL", "gpt-4o-mini")
+    VISION_CLIENT_MODE: str = os.getenv("VISION_CLIENT_MODE", "sync")  # sync or async
+    VISION_HTTP2: bool = os.getenv("VISION_HTTP2", "true").lower() == "true"
+    VISION_MAX_CONNECTIONS: int = int(os.getenv("VISION_MAX_CONNECTIONS", "20"))
+    VISION_KEEPALIVE_SECONDS: float = float(os.getenv("VISION_KEEPALIVE_SECONDS", "60"))
+    VISION_TIMEOUT_SECONDS: float = float(os.getenv("VISION_TIMEOUT_SECONDS", "60"))
+    VISION_MAX_CONCURRENCY: int = int(os.getenv("VISION_MAX_CONCURRENCY", "8"))
+    BATCH_ANALYSIS_MAX_IMAGES: int = int(os.getenv("BATCH_ANALYSIS_MAX_IMAGES", "100"))
+    ANALYSIS_CACHE_TTL_SECONDS: int = int(os.getenv("ANALYSIS_CACHE_TTL_SECONDS", str(7 * 24 * 60 * 60)))  # 1 week in Redis
+    EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+    
+    # Rolling chat thread summaries
+    CHAT_SUMMARY_ENABLED: bool = os.getenv("CHAT_SUMMARY_ENABLED", "true").lower() == "true"
+    CHAT_SUMMARY_MODEL: str = os.getenv("CHAT_SUMMARY_MODEL", "gpt-4o-mini")
+    CHAT_SUMMARY_KEEP_RECENT: int = int(os.getenv("CHAT_SUMMARY_KEEP_RECENT", "10"))  # Latest messages always sent verbatim
+    CHAT_SUMMARY_EVERY_MESSAGES: int = int(os.getenv("CHAT_SUMMARY_EVERY_MESSAGES", "10"))  # Older messages folded in per update
+    CHAT_SUMMARY_MAX_TOKENS: int = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", "500"))
+    CHAT_SUMMARY_MESSAGE_CHARS: int = int(os.getenv("CHAT_SUMMARY_MESSAGE_CHARS", "4000"))  # Longer messages are truncated for the summariser
+    CHAT_HISTORY_MAX_MESSAGES: int = int(os.getenv("CHAT_HISTORY_MAX_MESSAGES", "40"))  # Raw messages sent while the summary catches up
+    
+    # LLM gateway: requests and tokens per minute per provider and model, interactive calls first
+    LLM_GATEWAY_ENABLED: bool = os.getenv("LLM_GATEWAY_ENABLED", "true").lower() == "true"
+    OPENAI_REQUESTS_PER_MINUTE: int = int(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "500"))  # 0 for no limit
+    OPENAI_TOKENS_PER_MINUTE: int = int(os.getenv("OPENAI_TOKENS_PER_MINUTE", "200000"))
+    GROQ_REQUESTS_PER_MINUTE: int = int(os.getenv("GROQ_REQUESTS_PER_MINUTE", "30"))
+    GROQ_TOKENS_PER_MINUTE: int = int(os.getenv("GROQ_TOKENS_PER_MINUTE", "6000"))
+    LLM_MODEL_RATE_LIMITS: str = os.getenv("LLM_MODEL_RATE_LIMITS", "")  # e.g. "openai:gpt-4o=500/30000,groq:llama-3.3-70b-versatile=30/6000"
+    LLM_BACKGROUND_RESERVE: float = float(os.getenv("LLM_BACKGROUND_RESERVE", "0.2"))  # Share of each budget kept for interactive calls
+    LLM_INTERACTIVE_QUEUE_TIMEOUT_SECONDS: float = float(os.getenv("LLM_INTERACTIVE_QUEUE_TIMEOUT_SECONDS", "30"))
+    LLM_GATEWAY_WAIT_SAMPLES: int = int(os.getenv("LLM_GATEWAY_WAIT_SAMPLES", "200"))
+    
+    # Hedged chat requests: race an equivalent model when the first token is late
+    CHAT_HEDGING_ENABLED: bool = os.getenv("CHAT_HEDGING_ENABLED", "false").lower() == "true"
+    CHAT_HEDGE_QUANTILE: float = float(os.getenv("CHAT_HEDGE_QUANTILE", "0.95"))  # Of recent times to first token
+    CHAT_HEDGE_DEFAULT_DELAY_SECONDS: float = float(os.getenv("CHAT_HEDGE_DEFAULT_DELAY_SECONDS", "2"))  # Until enough are observed
+    CHAT_HEDGE_MIN_DELAY_SECONDS: float = float(os.getenv("CHAT_HEDGE_MIN_DELAY_SECONDS", "0.3"))
+    CHAT_HEDGE_MAX_DELAY_SECONDS: float = float(os.getenv("CHAT_HEDGE_MAX_DELAY_SECONDS", "10"))
+    CHAT_HEDGE_SAMPLES: int = int(os.getenv("CHAT_HEDGE_SAMPLES", "200"))
+    CHAT_HEDGE_MIN_SAMPLES: int = int(os.getenv("CHAT_HEDGE_MIN_SAMPLES", "20"))
+    CHAT_BREAKER_FAILURES: int = int(os.getenv("CHAT_BREAKER_FAILURES", "5"))  # Consecutive failures that open a provider's circuit
+    CHAT_BREAKER_COOLDOWN_SECONDS: float = float(os.getenv("CHAT_BREAKER_COOLDOWN_SECONDS", "30"))
+    
+    # Adaptive provider concurrency (AIMD), shared across processes through Redis
+    PROVIDER_LIMITER_ENABLED: bool = os.getenv("PROVIDER_LIMITER_ENABLED", "true").lower() == "true"
+    PROVIDER_LIMIT_INITIAL: float = float(os.getenv("PROVIDER_LIMIT_INITIAL", "8"))
+    PROVIDER_LIMIT_MIN: float = float(os.getenv("PROVIDER_LIMIT_MIN", "1"))
+    PROVIDER_LIMIT_MAX: float = float(os.getenv("PROVIDER_LIMIT_MAX", "64"))
+    PROVIDER_LIMIT_BACKOFF_FACTOR: float = float(os.getenv("PROVIDER_LIMIT_BACKOFF_FACTOR", "0.75"))
+    PROVIDER_LIMIT_DECREASE_WINDOW_SECONDS: float = float(os.getenv("PROVIDER_LIMIT_DECREASE_WINDOW_SECONDS", "1"))  # About one call round trip; one cut per burst of 429s
+    PROVIDER_MAX_RETRIES: int = int(os.getenv("PROVIDER_MAX_RETRIES", "5"))
+    PROVIDER_RETRY_BASE_SECONDS: float = float(os.getenv("PROVIDER_RETRY_BASE_SECONDS", "0.5"))
+    PROVIDER_RETRY_MAX_SECONDS: float = float(os.getenv("PROVIDER_RETRY_MAX_SECONDS", "30"))
+    PROVIDER_QUEUE_TIMEOUT_SECONDS: float = float(os.getenv("PROVIDER_QUEUE_TIMEOUT_SECONDS", "300"))
+    PROVIDER_LEASE_SECONDS: int = int(os.getenv("PROVIDER_LEASE_SECONDS", "600"))  # Slot reclaimed from a crashed process
+    
+    # Job metrics settings
+    STATS_SINK: str = os.getenv("STATS_SINK", "db")  # db, redis or memory
+    STATS_FLUSH_BATCH_SIZE: int = int(os.getenv("STATS_FLUSH_BATCH_SIZE", "500"))
+    STATS_FLUSH_INTERVAL_SECONDS: float = float(os.getenv("STATS_FLUSH_INTERVAL_SECONDS", "10"))
+    LATENCY_ROLLUP_INTERVAL_SECONDS: float = float(os.getenv("LATENCY_ROLLUP_INTERVAL_SECONDS", "60"))
+    LATENCY_ROLLUP_MINUTE_RETENTION_DAYS: int = int(os.getenv("LATENCY_ROLLUP_MINUTE_RETENTION_DAYS", "7"))
+    
+    # Fair scheduling of analysis jobs across users
+    FAIR_QUEUE_ENABLED: bool = os.getenv("FAIR_QUEUE_ENABLED", "true").lower() == "true"
+    FAIR_QUEUE_MAX_IN_FLIGHT_PER_USER: int = int(os.getenv("FAIR_QUEUE_MAX_IN_FLIGHT_PER_USER", "8"))
+    FAIR_QUEUE_LEASE_SECONDS: int = int(os.getenv("FAIR_QUEUE_LEASE_SECONDS", "900"))  # Slot reclaimed if a task never finishes
+    FAIR_QUEUE_DISPATCH_BATCH_SIZE: int = int(os.getenv("FAIR_QUEUE_DISPATCH_BATCH_SIZE", "100"))
+    FAIR_QUEUE_WAIT_SAMPLES: int = int(os.getenv("FAIR_QUEUE_WAIT_SAMPLES", "256"))  # Recent waits kept per user
+    
+    # Duplicate analysis requests
+    SINGLE_FLIGHT_TTL_SECONDS: int = int(os.getenv("SINGLE_FLIGHT_TTL_SECONDS", "3600"))  # Upper bound on a job holding its request
+    IDEMPOTENCY_KEY_TTL_SECONDS: int = int(os.getenv("IDEMPOTENCY_KEY_TTL_SECONDS", str(24 * 60 * 60)))
+    
+    # Ingest workflow (upload, then derivatives, hashing, analysis and embedding in parallel)
+    INGEST_DEFAULT_PROMPT: str = os.getenv("INGEST_DEFAULT_PROMPT", "Describe this image in detail.")
+    INGEST_BLOB_TTL_SECONDS: int = int(os.getenv("INGEST_BLOB_TTL_SECONDS", "900"))  # Uploaded bytes shared with the stages through Redis
+    INGEST_BLOB_MAX_BYTES: int = int(os.getenv("INGEST_BLOB_MAX_BYTES", str(4 * 1024 * 1024)))  # Larger uploads are read from storage
+    INGEST_STATE_TTL_SECONDS: int = int(os.getenv("INGEST_STATE_TTL_SECONDS", str(24 * 60 * 60)))
+    INGEST_THUMBNAIL_SIZE: int = int(os.getenv("INGEST_THUMBNAIL_SIZE", "512"))  # Longest edge in pixels
+    
+    # Job execution: celery (Redis and workers) or local (thread pool in the API process)
+    JOB_BACKEND: str = os.getenv("JOB_BACKEND", "celery")
+    LOCAL_JOB_WORKERS: int = int(os.getenv("LOCAL_JOB_WORKERS", "4"))
+    LOCAL_JOB_MAX_RESULTS: int = int(os.getenv("LOCAL_JOB_MAX_RESULTS", "10000"))  # Finished jobs kept in memory
+    
+    # Celery worker database settings
+    CELERY_DB_POOL_SIZE: int = int(os.getenv("CELERY_DB_POOL_SIZE", "0"))  # Per worker process; 0 sizes it to the tasks the process runs at once
+    CELERY_DB_MAX_OVERFLOW: int = int(os.getenv("CELERY_DB_MAX_OVERFLOW", "2"))
+    CELERY_DB_POOL_RECYCLE_SECONDS: int = int(os.getenv("CELERY_DB_POOL_RECYCLE_SECONDS", "1800"))
+    
+    # Celery result retention settings
+    RESULT_TTL_SECONDS: int = int(os.getenv("RESULT_TTL_SECONDS", str(24 * 60 * 60)))  # Tasks not in RESULT_TTLS; 0 keeps forever
+    RESULT_TTLS: str = os.getenv("RESULT_TTLS", "upload_image=3600,analyze_image=86400,analyze_images_batch=86400,extract_data=604800")  # task=seconds,...
+    RESULT_OFFLOAD_MIN_BYTES: int = int(os.getenv("RESULT_OFFLOAD_MIN_BYTES", "16384"))  # Larger results are kept in Postgres
+    RESULT_COMPACTION_BATCH_SIZE: int = int(os.getenv("RESULT_COMPACTION_BATCH_SIZE", "500"))
+    
+    # Job event streaming settings
+    JOB_EVENTS_HEARTBEAT_SECONDS: float = float(os.getenv("JOB_EVENTS_HEARTBEAT_SECONDS", "15"))
+    JOB_EVENTS_QUEUE_SIZE: int = int(os.getenv("JOB_EVENTS_QUEUE_SIZE", "16"))  # Per watcher; oldest events dropped first
+    
+    # Prometheus settings
+    METRICS_CELERY_QUEUES: str = os.getenv("METRICS_CELERY_QUEUES", "celery,uploads,analysis,extraction,maintenance")  # Comma-separated
+    CELERY_METRICS_PORT: int = int(os.getenv("CELERY_METRICS_PORT", "0"))  # 0 disables the worker exporter
+    
+    # Tracing settings
+    TRACING_EXPORTER: str = os.getenv("TRACING_EXPORTER", "none")  # none, file, console or otlp
+    TRACING_SAMPLE_RATIO: float = float(os.getenv("TRACING_SAMPLE_RATIO", "0.1"))
+    TRACING_FILE_PATH: Path = Path(os.getenv("TRACING_FILE_PATH", str(Path(__file__).parent.parent.parent / "logs" / "traces.jsonl")))
+    TRACING_OTLP_ENDPOINT: str = os.getenv("TRACING_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
     
     # Groq settings
     GROQ_API_KEY: str = os.getenv("GROQ_API_KEY", "")
     
     # Firecrawl settings
     FIRECRAWL_API_KEY: str = os.getenv("FIRECRAWL_API_KEY", "")
+    FIRECRAWL_API_URL: str = os.getenv("FIRECRAWL_API_URL", "https://api.firecrawl.dev")
+    
+    # Extraction engine settings
+    EXTRACTION_MAX_CONCURRENCY: int = int(os.getenv("EXTRACTION_MAX_CONCURRENCY", "4"))
+    EXTRACTION_RATE_LIMIT_PER_SECOND: float = float(os.getenv("EXTRACTION_RATE_LIMIT_PER_SECOND", "2"))
+    EXTRACTION_CACHE_TTL_SECONDS: int = int(os.getenv("EXTRACTION_CACHE_TTL_SECONDS", str(24 * 60 * 60)))  # 1 day
+    EXTRACTION_LOCK_TTL_SECONDS: int = int(os.getenv("EXTRACTION_LOCK_TTL_SECONDS", "300"))
     
     # CORS settings
     CORS_ORIGINS: str = os.getenv("CORS_ORIGINS", "http://localhost:3000")
@@ -91,6 +210,8 @@ class Settings(BaseSettings):
     # File upload settings
     UPLOAD_DIR: Path = Path(__file__).parent.parent.parent / "uploads"
     MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024  # 10MB
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024  # 1MB
+    SHARE_STORAGE_ACROSS_USERS: bool = os.getenv("SHARE_STORAGE_ACROSS_USERS", "false").lower() == "true"
     
     # Google Cloud Storage settings
     GCS_BUCKET_NAME: str = os.getenv("GCS_BUCKET_NAME", "")
@@ -255,6 +376,10 @@ logger.info(f"Async Database URL (masked): {urlparse(settings.DATABASE_URL_ASYNC
 logger.info(f"Async Engine Arguments: {async_engine_args}")
 logger.info(f"Sync Engine Arguments: {sync_engine_args}")
 
+# Export connection usage to Prometheus
+instrument_engine(sync_engine, "sync")
+instrument_engine(async_engine.sync_engine, "async")
+
 logger.info("Creating session factories")
 # Create session factories
 AsyncSessionLocal = sessionmaker(
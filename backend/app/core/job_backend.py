@@ -0,0 +1,231 @@
+from typing import Any, Callable, Dict, List, Optional, Union
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import threading
+import time
+import uuid
+from celery import current_app, states, Task
+from celery.canvas import Signature
+from celery.exceptions import TimeoutError as JobTimeoutError
+from celery.result import AsyncResult
+from app.core.config import settings
+from app.core.logging import setup_logger
+
+# Set up logging
+logger = setup_logger("job_backend")
+
+# celery: jobs go through Redis to the Celery workers (default)
+# local:  jobs run on a thread pool inside this process; no broker or worker needed
+JOB_BACKENDS = ("celery", "local")
+
+if settings.JOB_BACKEND not in JOB_BACKENDS:
+    raise ValueError(f"Invalid job backend: {settings.JOB_BACKEND}. Must be one of {', '.join(JOB_BACKENDS)}")
+
+class LocalResult:
+    """AsyncResult-like handle on a job run by the local executor"""
+
+    def __init__(self, job_id: str, task_name: Optional[str] = None):
+        self.id = job_id
+        self.name = task_name
+        self.state = states.PENDING
+        self.info: Any = None
+        self.date_done: Optional[datetime] = None
+        self.enqueued_at = time.time()
+        self.started_at: Optional[float] = None
+        self._done = threading.Event()
+
+    @property
+    def task_id(self) -> str:
+        return self.id
+
+    @property
+    def status(self) -> str:
+        return self.state
+
+    @property
+    def result(self) -> Any:
+        return self.info
+
+    def ready(self) -> bool:
+        return self.state in states.READY_STATES
+
+    def successful(self) -> bool:
+        return self.state == states.SUCCESS
+
+    def failed(self) -> bool:
+        return self.state == states.FAILURE
+
+    def get(self, timeout: Optional[float] = None, propagate: bool = True, **kwargs: Any) -> Any:
+        """Wait for the job to finish and return its result, as AsyncResult.get does"""
+        if not self._done.wait(timeout):
+            raise JobTimeoutError(f"Job {self.id} did not finish within {timeout}s")
+        if propagate and self.failed() and isinstance(self.info, BaseException):
+            raise self.info
+        return self.info
+
+class LocalJobExecutor:
+    """Runs jobs on a thread pool inside this process instead of sending them to Celery.
+
+    Tasks run through Task.apply, so signals, handlers and self.update_state
+    behave as they do on a worker, and job states are kept in memory for the
+    status endpoints. Nothing survives a restart: queued and running jobs are
+    lost, and only the most recent max_results finished jobs are kept.
+    """
+
+    def __init__(self, max_workers: int = settings.LOCAL_JOB_WORKERS, max_results: int = settings.LOCAL_JOB_MAX_RESULTS):
+        self.max_workers = max_workers
+        self.max_results = max_results
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._results: "OrderedDict[str, LocalResult]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="local-job")
+                    logger.info(f"Started local job executor with {self.max_workers} threads")
+        return self._executor
+
+    def submit(self, run: Callable[[str], Any], job_id: str, task_name: Optional[str] = None) -> LocalResult:
+        """Queue run(job_id), which returns a Celery EagerResult; returns the job's handle"""
+        result = LocalResult(job_id, task_name)
+        with self._lock:
+            self._results[job_id] = result
+            self._evict()
+        self._pool().submit(self._run, run, result)
+        return result
+
+    def _run(self, run: Callable[[str], Any], result: LocalResult) -> None:
+        result.started_at = time.time()
+        result.state = states.STARTED
+        try:
+            eager = run(result.id)
+            result.info, result.state = eager.result, eager.state
+        except Exception as e:
+            logger.error(f"Local job {result.id} failed: {str(e)}", exc_info=True)
+            result.info, result.state = e, states.FAILURE
+        finally:
+            result.date_done = datetime.now(timezone.utc)
+            result._done.set()
+
+    def _evict(self) -> None:
+        """Forget the oldest finished jobs beyond max_results; running jobs are never dropped"""
+        excess = len(self._results) - self.max_results
+        if excess <= 0:
+            return
+        finished = [job_id for job_id, result in self._results.items() if result._done.is_set()][:excess]
+        for job_id in finished:
+            del self._results[job_id]
+
+    def get(self, job_id: str) -> Optional[LocalResult]:
+        return self._results.get(job_id)
+
+    def update(self, job_id: str, state: str, meta: Any = None) -> bool:
+        """Record a state reported by a running job; False if the job is not ours"""
+        result = self._results.get(job_id)
+        if result is None:
+            return False
+        result.state, result.info = state, meta
+        return True
+
+    def shutdown(self, wait: bool = False) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+class LocalBeat:
+    """Runs the periodic tasks of a beat schedule in this process, for when no Celery beat runs.
+
+    Each due task runs through Task.apply on one scheduler thread, so a slow
+    task delays the others rather than piling up. Only interval schedules
+    (seconds) are supported.
+    """
+
+    def __init__(self):
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self, schedule: Dict[str, Dict[str, Any]]) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        entries = []
+        for name, entry in schedule.items():
+            interval = entry["schedule"]
+            if not isinstance(interval, (int, float)):
+                logger.warning(f"Skipping periodic task {name}: only interval schedules run locally")
+                continue
+            entries.append((name, entry["task"], float(interval)))
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(entries,), name="local-beat", daemon=True)
+        self._thread.start()
+        logger.info(f"Started local beat with {len(entries)} periodic tasks")
+
+    def _run(self, entries: List[Any]) -> None:
+        due = {name: time.monotonic() + interval for name, _, interval in entries}
+        while entries:
+            name, task_name, interval = min(entries, key=lambda entry: due[entry[0]])
+            if self._stop.wait(max(0.0, due[name] - time.monotonic())):
+                return
+            try:
+                current_app.tasks[task_name].apply()
+            except Exception as e:
+                logger.error(f"Periodic task {name} failed: {str(e)}", exc_info=True)
+            due[name] = time.monotonic() + interval
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+local_jobs = LocalJobExecutor()
+local_beat = LocalBeat()
+
+def uses_local_jobs() -> bool:
+    return settings.JOB_BACKEND == "local"
+
+JobResult = Union[AsyncResult, LocalResult]
+
+def submit_job(
+    job: Union[Task, Signature],
+    args: Optional[List[Any]] = None,
+    kwargs: Optional[Dict[str, Any]] = None,
+    task_id: Optional[str] = None,
+    **options: Any
+) -> JobResult:
+    """Run a task or a canvas on the configured job backend; returns an AsyncResult-like handle.
+    Canvases carry their own task IDs, so for them task_id only names the local job."""
+    if not uses_local_jobs():
+        if isinstance(job, Signature):
+            return job.apply_async(**options)
+        return job.apply_async(args=args, kwargs=kwargs, task_id=task_id, **options)
+
+    if isinstance(job, Signature):
+        # Canvases run eagerly, their steps one after another in one pool thread
+        return local_jobs.submit(lambda job_id: job.apply(), task_id or str(uuid.uuid4()), job.name)
+    return local_jobs.submit(
+        lambda job_id: job.apply(args=args, kwargs=kwargs, task_id=job_id),
+        task_id or str(uuid.uuid4()),
+        job.name
+    )
+
+def send_job(task_name: str, args: List[Any], kwargs: Dict[str, Any], task_id: Optional[str] = None) -> JobResult:
+    """submit_job() by task name, for callers that do not import the task"""
+    if not uses_local_jobs():
+        return current_app.send_task(task_name, args=args, kwargs=kwargs, task_id=task_id)
+    return submit_job(current_app.tasks[task_name], args, kwargs, task_id=task_id)
+
+def get_job_result(job_id: str) -> JobResult:
+    """Handle on a job's state and result, wherever it runs; unknown jobs are PENDING, as with Celery"""
+    if not uses_local_jobs():
+        return AsyncResult(job_id)
+    return local_jobs.get(job_id) or LocalResult(job_id)
+
+def store_job_state(job_id: str, state: str, meta: Any = None) -> None:
+    """Set the state of a job from outside its task, e.g. a workflow's progress"""
+    if uses_local_jobs():
+        local_jobs.update(job_id, state, meta)
+    else:
+        current_app.backend.store_result(job_id, meta, state)
@@ -0,0 +1,182 @@
+from typing import Dict, Any, Optional, Set, Tuple, AsyncIterator
+from contextlib import asynccontextmanager
+import asyncio
+import json
+import redis.asyncio as aioredis
+from app.core.job_backend import get_job_result
+from starlette.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.core.logging import setup_logger
+from app.core.redis_client import get_redis
+from app.utils.helpers import format_job_state, parse_celery_result
+
+# Set up logging
+logger = setup_logger("job_events")
+
+CHANNEL_PREFIX = "job-events:"
+TERMINAL_STATES = ("SUCCESS", "FAILURE", "REVOKED")
+
+# A pre-rendered server-sent event and the task state it reports
+JobEvent = Tuple[str, str]
+
+def job_channel(job_id: str) -> str:
+    return f"{CHANNEL_PREFIX}{job_id}"
+
+def format_event(job_id: str, state: str, data: Any) -> JobEvent:
+    """Render a job state as a server-sent event"""
+    return state, f"event: {state.lower()}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def publish_job_event(job_id: str, state: str, info: Any = None) -> None:
+    """Publish a task state transition to the job's watchers; best effort, never fails the task"""
+    if not job_id or not state:
+        return
+    message = json.dumps({"state": state, "data": format_job_state(job_id, state, info)}, default=str)
+    try:
+        get_redis().publish(job_channel(job_id), message)
+    except Exception as e:
+        logger.warning(f"Failed to publish {state} event for job {job_id}: {str(e)}")
+
+async def current_job_event(job_id: str) -> JobEvent:
+    """Read the job's current state once from the result backend"""
+
+    def read() -> Tuple[str, Dict[str, Any]]:
+        result = get_job_result(job_id)
+        return result.state, parse_celery_result(job_id, result)
+
+    state, data = await run_in_threadpool(read)
+    return format_event(job_id, state, data)
+
+class JobEventHub:
+    """Fans job events out to this process's watchers over one Redis pub/sub connection.
+
+    A job's channel is subscribed while at least one watcher is attached, and
+    each published event is decoded and rendered once however many watchers
+    receive it. After a connection error watchers get None, telling them to
+    re-read the job state since events may have been missed.
+    """
+
+    def __init__(self, queue_size: int = settings.JOB_EVENTS_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._watchers: Dict[str, Set[asyncio.Queue]] = {}
+        self._lock = asyncio.Lock()
+        self._redis: Optional[aioredis.Redis] = None
+        self._pubsub = None
+        self._reader: Optional[asyncio.Task] = None
+
+    @property
+    def watcher_count(self) -> int:
+        return sum(len(queues) for queues in self._watchers.values())
+
+    @asynccontextmanager
+    async def watch(self, job_id: str) -> AsyncIterator[asyncio.Queue]:
+        """Receive a job's events for the duration of the block"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        await self._attach(job_id, queue)
+        try:
+            yield queue
+        finally:
+            await self._detach(job_id, queue)
+
+    async def _attach(self, job_id: str, queue: asyncio.Queue) -> None:
+        async with self._lock:
+            queues = self._watchers.get(job_id)
+            if queues is None:
+                if self._pubsub is None:
+                    self._redis = aioredis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+                    self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                await self._pubsub.subscribe(job_channel(job_id))
+                queues = self._watchers[job_id] = set()
+                # The reader needs an open subscription before it can start reading
+                if self._reader is None or self._reader.done():
+                    self._reader = asyncio.create_task(self._read())
+            queues.add(queue)
+
+    async def _detach(self, job_id: str, queue: asyncio.Queue) -> None:
+        async with self._lock:
+            queues = self._watchers.get(job_id)
+            if queues is None:
+                return
+            queues.discard(queue)
+            if not queues:
+                del self._watchers[job_id]
+                try:
+                    await self._pubsub.unsubscribe(job_channel(job_id))
+                except Exception as e:
+                    logger.warning(f"Failed to unsubscribe from job {job_id}: {str(e)}")
+
+    async def _read(self) -> None:
+        while True:
+            try:
+                message = await self._pubsub.get_message(timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Job event subscription failed, resubscribing: {str(e)}")
+                self._broadcast_resync()
+                await asyncio.sleep(1.0)
+                continue
+            if message is not None and message["type"] == "message":
+                self._dispatch(message["channel"], message["data"])
+
+    def _dispatch(self, channel: str, data: str) -> None:
+        job_id = channel[len(CHANNEL_PREFIX):]
+        queues = self._watchers.get(job_id)
+        if not queues:
+            return
+        try:
+            payload = json.loads(data)
+            event = format_event(job_id, payload["state"], payload["data"])
+        except (ValueError, KeyError) as e:
+            logger.warning(f"Dropping malformed event for job {job_id}: {str(e)}")
+            return
+        for queue in queues:
+            self._offer(queue, event)
+
+    def _broadcast_resync(self) -> None:
+        for queues in self._watchers.values():
+            for queue in queues:
+                self._offer(queue, None)
+
+    @staticmethod
+    def _offer(queue: asyncio.Queue, event: Optional[JobEvent]) -> None:
+        # A slow watcher loses its oldest events; the latest state is what matters
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+    async def stop(self) -> None:
+        """Stop reading and close the Redis connection"""
+        if self._reader is not None:
+            self._reader.cancel()
+            try:
+                await self._reader
+            except asyncio.CancelledError:
+                pass
+            self._reader = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+        self._watchers.clear()
+
+async def stream_job_events(job_id: str, hub: JobEventHub) -> AsyncIterator[str]:
+    """Yield a job's state as server-sent events until it finishes"""
+    async with hub.watch(job_id) as events:
+        # Subscribed before reading the current state, so no transition falls in between
+        state, frame = await current_job_event(job_id)
+        yield frame
+        while state not in TERMINAL_STATES:
+            try:
+                event = await asyncio.wait_for(events.get(), timeout=settings.JOB_EVENTS_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                # Keeps proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+                continue
+            if event is None:
+                event = await current_job_event(job_id)
+            state, frame = event
+            yield frame
+
+job_event_hub = JobEventHub()
@@ -0,0 +1,252 @@
+from typing import Dict, Any, Optional, Tuple
+import os
+import time
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, REGISTRY,
+    generate_latest, multiprocess, start_http_server
+)
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.core.logging import setup_logger
+from app.core.queues import queue_keys
+
+# Set up logging
+logger = setup_logger("metrics")
+
+# Set PROMETHEUS_MULTIPROC_DIR before the process starts to aggregate uvicorn and
+# Celery worker processes; each process then writes its samples to mmap'd files there
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# API
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests currently being served",
+    ["method"],
+    multiprocess_mode="livesum"
+)
+
+# Chat streaming
+CHAT_TIME_TO_FIRST_TOKEN = Histogram(
+    "chat_time_to_first_token_seconds",
+    "Time from request to the first streamed chunk",
+    ["provider", "model"],
+    buckets=LATENCY_BUCKETS
+)
+CHAT_HEDGES = Counter(
+    "chat_hedges_total",
+    "Chats that raced a backup provider, by why it was started and which attempt streamed first",
+    ["model", "reason", "winner"]
+)
+CHAT_TOKENS_PER_SECOND = Histogram(
+    "chat_tokens_per_second",
+    "Streamed chunks per second after the first chunk",
+    ["provider", "model"],
+    buckets=(1, 5, 10, 20, 40, 60, 80, 100, 150, 200, 400)
+)
+CHAT_STREAMED_TOKENS = Counter(
+    "chat_streamed_tokens_total",
+    "Streamed chunks (approximately tokens)",
+    ["provider", "model"]
+)
+
+# Upstream providers
+PROVIDER_ERRORS = Counter(
+    "provider_errors_total",
+    "Errors returned by upstream model and extraction providers",
+    ["provider", "operation", "error"]
+)
+PROVIDER_THROTTLED = Counter(
+    "provider_throttled_total",
+    "Provider calls answered with 429/503 and retried or given up",
+    ["provider", "model"]
+)
+PROVIDER_CIRCUIT_OPEN = Gauge(
+    "provider_circuit_open",
+    "1 while chats skip the provider after repeated failures",
+    ["provider"],
+    multiprocess_mode="max"
+)
+PROVIDER_CONCURRENCY_LIMIT = Gauge(
+    "provider_concurrency_limit",
+    "Adaptive concurrency limit shared by all processes, per provider and model",
+    ["provider", "model"],
+    multiprocess_mode="mostrecent"
+)
+PROVIDER_LIMITER_WAIT_SECONDS = Histogram(
+    "provider_limiter_wait_seconds",
+    "Time provider calls waited for a concurrency slot",
+    ["provider", "model"],
+    buckets=LATENCY_BUCKETS
+)
+LLM_GATEWAY_QUEUE_DEPTH = Gauge(
+    "llm_gateway_queue_depth",
+    "Provider calls queued for their rate budget, per lane",
+    ["provider", "model", "lane"],
+    multiprocess_mode="livesum"
+)
+LLM_GATEWAY_WAIT_SECONDS = Histogram(
+    "llm_gateway_wait_seconds",
+    "Time provider calls queued for their rate budget, per lane",
+    ["provider", "model", "lane"],
+    buckets=LATENCY_BUCKETS
+)
+LLM_GATEWAY_TOKENS = Counter(
+    "llm_gateway_tokens_total",
+    "Estimated prompt plus max_tokens charged against provider token budgets",
+    ["provider", "model", "lane"]
+)
+VISION_API_DURATION = Histogram(
+    "vision_api_duration_seconds",
+    "Vision API call latency",
+    ["model", "mode", "outcome"],
+    buckets=LATENCY_BUCKETS
+)
+
+# Database
+DB_CONNECTIONS_CHECKED_OUT = Gauge(
+    "db_connections_checked_out",
+    "Database connections currently checked out",
+    ["engine"],
+    multiprocess_mode="livesum"
+)
+DB_CONNECTIONS_OPENED = Counter(
+    "db_connections_opened_total",
+    "New database connections opened",
+    ["engine"]
+)
+
+# Celery
+CELERY_TASK_DURATION = Histogram(
+    "celery_task_duration_seconds",
+    "Celery task runtime by task name",
+    ["task", "state"],
+    buckets=LATENCY_BUCKETS
+)
+CELERY_TASKS = Counter(
+    "celery_tasks_total",
+    "Celery tasks finished by task name and state",
+    ["task", "state"]
+)
+
+FAIR_QUEUE_WAIT_SECONDS = Histogram(
+    "fair_queue_wait_seconds",
+    "Time from job submission to a worker starting it, for fairly scheduled queues",
+    ["queue"],
+    buckets=LATENCY_BUCKETS + (300.0, 600.0, 1800.0)
+)
+
+class QueueDepthCollector:
+    """Reports Celery queue lengths from Redis at scrape time"""
+
+    def __init__(self, queues: Tuple[str, ...] = ("celery",)):
+        self.queues = queues
+
+    def collect(self):
+        from app.core.redis_client import get_redis
+
+        family = GaugeMetricFamily("celery_queue_depth", "Messages waiting in each Celery queue", labels=["queue"])
+        try:
+            redis_client = get_redis()
+            for queue in self.queues:
+                # Each priority step of a queue is a separate Redis list
+                with redis_client.pipeline(transaction=False) as pipe:
+                    for key in queue_keys(queue):
+                        pipe.llen(key)
+                    family.add_metric([queue], sum(pipe.execute()))
+        except Exception as e:
+            logger.warning(f"Failed to read Celery queue depth: {str(e)}")
+        yield family
+
+class _DefaultCollector:
+    """Exposes the default process registry through a scrape registry"""
+
+    def collect(self):
+        yield from REGISTRY.collect()
+
+def build_registry(queues: Optional[Tuple[str, ...]] = None) -> CollectorRegistry:
+    """Build the registry to expose, merging every process's samples in multiprocess mode"""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = CollectorRegistry()
+        registry.register(_DefaultCollector())
+    if queues:
+        registry.register(QueueDepthCollector(queues))
+    return registry
+
+def render_metrics(queues: Optional[Tuple[str, ...]] = None) -> Tuple[bytes, str]:
+    """Render metrics in the Prometheus text format"""
+    return generate_latest(build_registry(queues)), CONTENT_TYPE_LATEST
+
+def start_metrics_server(port: int) -> None:
+    """Serve /metrics from a worker's main process"""
+    start_http_server(port, registry=build_registry())
+    logger.info(f"Serving metrics on port {port}")
+
+def mark_process_dead(pid: int) -> None:
+    """Drop live gauges of an exited process"""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(pid)
+
+def instrument_engine(engine: Engine, name: str) -> None:
+    """Track connection checkouts and opens for a SQLAlchemy engine"""
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        DB_CONNECTIONS_OPENED.labels(engine=name).inc()
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_CONNECTIONS_CHECKED_OUT.labels(engine=name).inc()
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        DB_CONNECTIONS_CHECKED_OUT.labels(engine=name).dec()
+
+def record_provider_error(provider: str, operation: str, error: Exception) -> None:
+    """Count an upstream provider failure by exception type"""
+    PROVIDER_ERRORS.labels(provider=provider, operation=operation, error=type(error).__name__).inc()
+
+class PrometheusMiddleware:
+    """ASGI middleware recording request latency per route template"""
+
+    def __init__(self, app, skip_paths: Tuple[str, ...] = ("/metrics",)):
+        self.app = app
+        self.skip_paths = skip_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status: Dict[str, Any] = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_PROGRESS.labels(method=method).inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Label by template (e.g. /api/v1/jobs/{job_id}) to keep cardinality bounded
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.labels(
+                method=method,
+                route=getattr(route, "path", "unmatched"),
+                status=str(status["code"])
+            ).observe(time.perf_counter() - started)
+            HTTP_REQUESTS_IN_PROGRESS.labels(method=method).dec()
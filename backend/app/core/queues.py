@@ -0,0 +1,20 @@
+from typing import Tuple
+
+# Named Celery queues, each consumed by its own worker profile (scripts/worker.sh)
+DEFAULT_QUEUE = "celery"
+UPLOADS_QUEUE = "uploads"
+ANALYSIS_QUEUE = "analysis"
+EXTRACTION_QUEUE = "extraction"
+MAINTENANCE_QUEUE = "maintenance"
+TASK_QUEUES = (DEFAULT_QUEUE, UPLOADS_QUEUE, ANALYSIS_QUEUE, EXTRACTION_QUEUE, MAINTENANCE_QUEUE)
+
+# The Redis transport emulates priorities with one list per step and serves 0 first
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 3
+PRIORITY_LOW = 6
+PRIORITY_STEPS = [0, 3, 6, 9]
+PRIORITY_SEP = ":"
+
+def queue_keys(queue: str) -> Tuple[str, ...]:
+    """Redis lists holding a queue's messages, one per priority step"""
+    return tuple(f"{queue}{PRIORITY_SEP}{step}" if step else queue for step in PRIORITY_STEPS)
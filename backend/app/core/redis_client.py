@@ -0,0 +1,20 @@
+import redis
+from typing import Optional
+from app.core.config import settings
+
+_redis_client: Optional[redis.Redis] = None
+_binary_redis_client: Optional[redis.Redis] = None
+
+def get_redis() -> redis.Redis:
+    """Get the shared Redis client for caching and coordination"""
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _redis_client
+
+def get_binary_redis() -> redis.Redis:
+    """Get the shared Redis client for raw bytes, such as image blobs"""
+    global _binary_redis_client
+    if _binary_redis_client is None:
+        _binary_redis_client = redis.Redis.from_url(settings.REDIS_URL)
+    return _binary_redis_client
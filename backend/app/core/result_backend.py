@@ -0,0 +1,188 @@
+from typing import Dict, Any, Optional
+from datetime import datetime, timezone, timedelta
+import json
+from celery import states
+from celery.backends.redis import RedisBackend
+from celery.exceptions import BackendStoreError
+from kombu.serialization import loads
+from kombu.utils.encoding import bytes_to_str
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from app.core.celery_app import JSON_CONTENT_TYPE, MSGPACK_CONTENT_TYPE, msgpack
+from app.core.config import settings, SyncSessionLocal
+from app.core.logging import setup_logger
+from app.db.models.job import JobResult
+
+# Set up logging
+logger = setup_logger("result_backend")
+
+# Stands in for a task result that lives in Postgres
+RESULT_REF_KEY = "__job_result__"
+
+def parse_result_ttls(spec: str) -> Dict[str, int]:
+    """Parse "task=seconds,..." into a TTL per task name"""
+    ttls = {}
+    for item in spec.split(","):
+        name, _, seconds = item.partition("=")
+        if name.strip() and seconds.strip():
+            ttls[name.strip()] = int(seconds)
+    return ttls
+
+RESULT_TTLS = parse_result_ttls(settings.RESULT_TTLS)
+
+def result_ttl(task_name: Optional[str]) -> int:
+    """Seconds to keep a task's result, by full or short task name; 0 keeps it forever"""
+    if task_name:
+        for name in (task_name, task_name.rsplit(".", 1)[-1]):
+            if name in RESULT_TTLS:
+                return RESULT_TTLS[name]
+    return settings.RESULT_TTL_SECONDS
+
+def store_job_result(job_id: str, task_name: Optional[str], status: str, result: Any, ttl: int) -> int:
+    """Write a task result to Postgres, returning its size in bytes"""
+    # Round-trip through JSON so UUIDs and datetimes land as the strings clients already get
+    payload = json.dumps(result, default=str)
+    now = datetime.now(timezone.utc)
+    stmt = insert(JobResult).values(
+        job_id=job_id,
+        task_name=task_name,
+        status=status,
+        result=json.loads(payload),
+        size_bytes=len(payload),
+        created_at=now,
+        expires_at=now + timedelta(seconds=ttl) if ttl else None
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[JobResult.job_id],
+        set_={column: stmt.excluded[column] for column in ("task_name", "status", "result", "size_bytes", "expires_at")}
+    )
+    db = SyncSessionLocal()
+    try:
+        db.execute(stmt)
+        db.commit()
+    finally:
+        db.close()
+    return len(payload)
+
+def load_job_result(job_id: str) -> Any:
+    """Read a task result stored in Postgres"""
+    db = SyncSessionLocal()
+    try:
+        result = db.execute(select(JobResult.result).where(JobResult.job_id == job_id)).first()
+    finally:
+        db.close()
+    if result is None:
+        logger.warning(f"Result for job {job_id} is missing from job_results")
+        return None
+    return result[0]
+
+class RetentionRedisBackend(RedisBackend):
+    """Redis result backend that expires results per task type and keeps large ones in Postgres.
+
+    A successful result whose encoded size reaches RESULT_OFFLOAD_MIN_BYTES is
+    written to job_results and its Redis key holds only a pointer, which is
+    resolved transparently whenever the result is read.
+    """
+
+    def __init__(self, url=None, **kwargs):
+        # Selected by class rather than URL, so Celery passes no URL
+        app = kwargs.get("app")
+        if url is None and app is not None:
+            url = app.conf.result_backend
+        super().__init__(url=url, **kwargs)
+
+    def _store_result(self, task_id, result, state, traceback=None, request=None, **kwargs):
+        meta = self._get_result_meta(result=result, state=state, traceback=traceback, request=request)
+        meta["task_id"] = bytes_to_str(task_id)
+        key = self.get_key_for_task(task_id)
+
+        # As in Celery, a successful result is never overwritten by a later update
+        current = self.get(key)
+        if current and self.decode(current)["status"] == states.SUCCESS:
+            return result
+
+        task_name = getattr(request, "task", None)
+        ttl = result_ttl(task_name)
+        value = self.encode(meta)
+        if state == states.SUCCESS and len(value) >= settings.RESULT_OFFLOAD_MIN_BYTES:
+            value = self._offload(meta, task_name, ttl) or value
+
+        try:
+            self.ensure(self._set_expiring, (key, value, ttl))
+        except BackendStoreError as ex:
+            raise BackendStoreError(str(ex), state=state, task_id=task_id) from ex
+        return result
+
+    def _offload(self, meta: Dict[str, Any], task_name: Optional[str], ttl: int) -> Optional[Any]:
+        """Move the result into Postgres and return the encoded pointer meta, or None to keep it inline"""
+        try:
+            store_job_result(meta["task_id"], task_name, meta["status"], meta["result"], ttl)
+        except Exception as e:
+            logger.warning(f"Keeping result of job {meta['task_id']} in Redis, Postgres write failed: {str(e)}")
+            return None
+        return self.encode(dict(meta, result={RESULT_REF_KEY: meta["task_id"]}))
+
+    def _set_expiring(self, key, value, ttl: int) -> None:
+        if isinstance(value, str) and len(value) > self._MAX_STR_VALUE_SIZE:
+            raise BackendStoreError("value too large for Redis backend")
+        with self.client.pipeline() as pipe:
+            if ttl:
+                pipe.setex(key, ttl, value)
+            else:
+                pipe.set(key, value)
+            pipe.publish(key, value)
+            pipe.execute()
+
+    def decode(self, payload):
+        # Results are stored without a content type; sniff it so JSON and msgpack writers can coexist
+        if msgpack is None or not payload:
+            return super().decode(payload)
+        if payload[:1] in (b"{", "{"):
+            return loads(payload, content_type=JSON_CONTENT_TYPE, content_encoding="utf-8", accept=self.accept)
+        return loads(payload, content_type=MSGPACK_CONTENT_TYPE, content_encoding="binary", accept=self.accept)
+
+    def meta_from_decoded(self, meta):
+        result = meta.get("result")
+        if isinstance(result, dict) and RESULT_REF_KEY in result:
+            meta["result"] = load_job_result(result[RESULT_REF_KEY])
+        return super().meta_from_decoded(meta)
+
+    def compact_key(self, key: bytes, now: datetime) -> str:
+        """Bring one stored result in line with the retention policy; returns the action taken"""
+        raw = self.client.get(key)
+        if raw is None:
+            return "missing"
+        meta = self.decode(raw)
+        remaining = self.client.ttl(key)
+        needs_expiry = remaining == -1
+
+        if needs_expiry:
+            # Results stored before retention carry no task name, so they get the default TTL from date_done
+            remaining = result_ttl(None)
+            date_done = meta.get("date_done")
+            if remaining and date_done:
+                done_at = datetime.fromisoformat(date_done)
+                if done_at.tzinfo is None:
+                    done_at = done_at.replace(tzinfo=timezone.utc)
+                remaining -= int((now - done_at).total_seconds())
+                if remaining <= 0:
+                    self.client.delete(key)
+                    return "expired"
+        elif remaining < 0:
+            return "missing"
+
+        result = meta.get("result")
+        if (
+            meta.get("status") == states.SUCCESS
+            and len(raw) >= settings.RESULT_OFFLOAD_MIN_BYTES
+            and not (isinstance(result, dict) and RESULT_REF_KEY in result)
+        ):
+            pointer = self._offload(meta, meta.get("name"), remaining)
+            if pointer is not None:
+                self.client.set(key, pointer, ex=remaining or None)
+                return "offloaded"
+
+        if needs_expiry and remaining:
+            self.client.expire(key, remaining)
+            return "expiring"
+        return "kept"
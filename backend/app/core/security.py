@@ -1,43 +1,294 @@
-from fastapi import HTTPException, Security
+from fastapi import Depends, HTTPException, Security
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from jose import jwt, JWTError
-import requests
+from jose import jwt, jwk, JWTError
+from jose.backends.base import Key
+from collections import OrderedDict
+import asyncio
+import hashlib
+import httpx
 import os
+import time
 from dotenv import load_dotenv
-from typing import Optional, Dict, Any
-from functools import lru_cache
+from typing import Optional, Dict, Any, Tuple
+from app.core.logging import setup_logger
 
 load_dotenv()
 
+# Set up logging
+logger = setup_logger("security")
+
 security = HTTPBearer()
 CLERK_ISSUER = os.getenv("CLERK_ISSUER")  # e.g., "https://clerk.your-domain.com"
-CLERK_PEM_KEYS: Dict[str, Any] = {}
+JWKS_TTL_SECONDS = float(os.getenv("JWKS_TTL_SECONDS", "3600"))
+JWKS_REFRESH_INTERVAL_SECONDS = float(os.getenv("JWKS_REFRESH_INTERVAL_SECONDS", "900"))
+JWKS_NEGATIVE_TTL_SECONDS = float(os.getenv("JWKS_NEGATIVE_TTL_SECONDS", "60"))  # Unknown kids
+JWKS_MAX_UNKNOWN_KIDS = int(os.getenv("JWKS_MAX_UNKNOWN_KIDS", "1000"))
+JWKS_TIMEOUT_SECONDS = float(os.getenv("JWKS_TIMEOUT_SECONDS", "5"))
+JWT_VERIFIER = os.getenv("JWT_VERIFIER", "jose")  # jose or pyjwt
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "10000"))  # 0 disables the verified-token cache
+ADMIN_USER_IDS = {user_id.strip() for user_id in os.getenv("ADMIN_USER_IDS", "").split(",") if user_id.strip()}  # Clerk user IDs
 
-@lru_cache()
-def get_clerk_jwks() -> Dict[str, Any]:
-    """Fetch and cache Clerk's public keys"""
-    if not CLERK_ISSUER:
-        raise ValueError("CLERK_ISSUER environment variable is not set")
-        
-    jwks_url = f"{CLERK_ISSUER}/.well-known/jwks.json"
-    response = requests.get(jwks_url)
-    response.raise_for_status()
-    return response.json()
-
-def get_public_key(kid: str) -> Optional[str]:
-    """Get the public key for a given key ID"""
-    if kid not in CLERK_PEM_KEYS:
-        jwks = get_clerk_jwks()
-        for key in jwks.get("keys", []):
-            if key.get("kid") == kid:
-                CLERK_PEM_KEYS[kid] = key
+class JWKSManager:
+    """Caches Clerk's signing keys as parsed key objects, fetched without blocking the event loop.
+
+    Keys are refreshed in the background and on expiry. Unknown kids trigger
+    at most one fetch per negative TTL, whatever the kid, so forged tokens
+    cannot force a fetch per request; kids still unknown afterwards are
+    remembered for that long, up to JWKS_MAX_UNKNOWN_KIDS of them.
+    """
+
+    def __init__(
+        self,
+        issuer: Optional[str],
+        ttl: float = JWKS_TTL_SECONDS,
+        refresh_interval: float = JWKS_REFRESH_INTERVAL_SECONDS,
+        negative_ttl: float = JWKS_NEGATIVE_TTL_SECONDS,
+        timeout: float = JWKS_TIMEOUT_SECONDS
+    ):
+        self.issuer = issuer
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        self.negative_ttl = negative_ttl
+        self.timeout = timeout
+        self._keys: Dict[str, Key] = {}
+        self._fetched_at: Optional[float] = None
+        self._unknown_kids: Dict[str, float] = {}
+        self._forced_refresh_at: Optional[float] = None
+        self._inflight: Optional[asyncio.Future] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._refresher: Optional[asyncio.Task] = None
+
+    @property
+    def jwks_url(self) -> str:
+        if not self.issuer:
+            raise ValueError("CLERK_ISSUER environment variable is not set")
+        return f"{self.issuer}/.well-known/jwks.json"
+
+    def _is_fresh(self) -> bool:
+        return self._fetched_at is not None and time.monotonic() - self._fetched_at < self.ttl
+
+    async def _fetch(self) -> None:
+        """Download the key set and parse every key once"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        response = await self._client.get(self.jwks_url)
+        response.raise_for_status()
+
+        keys = {}
+        for key_data in response.json().get("keys", []):
+            kid = key_data.get("kid")
+            if not kid:
+                continue
+            try:
+                keys[kid] = jwk.construct(key_data, key_data.get("alg", "RS256"))
+            except Exception as e:
+                logger.warning(f"Skipping unusable JWKS key {kid}: {str(e)}")
+
+        self._keys = keys
+        self._fetched_at = time.monotonic()
+        # Newly published kids are no longer unknown
+        for kid in keys:
+            self._unknown_kids.pop(kid, None)
+        logger.info(f"Loaded {len(keys)} JWKS keys")
+
+    async def refresh(self) -> None:
+        """Fetch the key set, joining a fetch already in flight"""
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.ensure_future(self._fetch())
+        # Shielded so a cancelled request does not cancel the fetch other requests wait on
+        await asyncio.shield(self._inflight)
+
+    async def get_key(self, kid: str) -> Optional[Key]:
+        """Get the parsed public key for a key ID"""
+        key = self._keys.get(kid)
+        if key is not None:
+            if not self._is_fresh():
+                # Serve the known key and revalidate in the background
+                self._refresh_in_background()
+            return key
+
+        now = time.monotonic()
+        unknown_until = self._unknown_kids.get(kid)
+        if unknown_until is not None and now < unknown_until:
+            return None
+        if self._inflight is None or self._inflight.done():
+            # Joining a fetch in flight is free; starting one is allowed once per negative TTL
+            if self._forced_refresh_at is not None and now - self._forced_refresh_at < self.negative_ttl:
+                return None
+            self._forced_refresh_at = now
+
+        await self.refresh()
+        key = self._keys.get(kid)
+        if key is None:
+            self._remember_unknown(kid)
+        return key
+
+    def _remember_unknown(self, kid: str) -> None:
+        """Remember a kid missing from the key set, dropping expired and excess entries"""
+        now = time.monotonic()
+        self._unknown_kids.pop(kid, None)
+        # Entries share one TTL, so the oldest are first to expire
+        for stale in list(self._unknown_kids):
+            if self._unknown_kids[stale] > now and len(self._unknown_kids) < JWKS_MAX_UNKNOWN_KIDS:
                 break
-    return CLERK_PEM_KEYS.get(kid)
+            del self._unknown_kids[stale]
+        self._unknown_kids[kid] = now + self.negative_ttl
+
+    def has_key(self, kid: str) -> bool:
+        """Whether a key ID is in the current key set"""
+        return kid in self._keys
+
+    def _refresh_in_background(self) -> None:
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.ensure_future(self._fetch())
+            self._inflight.add_done_callback(self._log_refresh_failure)
+
+    @staticmethod
+    def _log_refresh_failure(future: asyncio.Future) -> None:
+        if not future.cancelled() and future.exception():
+            logger.warning(f"JWKS refresh failed, keeping cached keys: {str(future.exception())}")
+
+    async def _refresh_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"JWKS refresh failed, keeping cached keys: {str(e)}")
+
+    async def start(self) -> None:
+        """Prime the cache and start the background refresh"""
+        try:
+            await self.refresh()
+        except Exception as e:
+            logger.warning(f"Initial JWKS fetch failed, will retry on demand: {str(e)}")
+        if self._refresher is None:
+            self._refresher = asyncio.create_task(self._refresh_periodically())
+
+    async def stop(self) -> None:
+        """Stop the background refresh and close the HTTP client"""
+        if self._refresher is not None:
+            self._refresher.cancel()
+            try:
+                await self._refresher
+            except asyncio.CancelledError:
+                pass
+            self._refresher = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+class JoseVerifier:
+    """Verifies tokens with python-jose"""
+
+    name = "jose"
+
+    def decode(self, token: str, key: Key) -> Dict[str, Any]:
+        return jwt.decode(
+            token,
+            key,
+            algorithms=["RS256"],
+            issuer=CLERK_ISSUER,
+            options={"verify_aud": False}  # Skip audience verification
+        )
+
+class PyJWTVerifier:
+    """Verifies tokens with PyJWT, reusing the cryptography key jose already parsed"""
+
+    name = "pyjwt"
+
+    def __init__(self):
+        # Optional dependency: PyJWT[crypto]
+        import jwt as pyjwt
+        self._pyjwt = pyjwt
+
+    def decode(self, token: str, key: Key) -> Dict[str, Any]:
+        try:
+            return self._pyjwt.decode(
+                token,
+                getattr(key, "prepared_key", key),
+                algorithms=["RS256"],
+                issuer=CLERK_ISSUER,
+                options={"verify_aud": False}  # Skip audience verification
+            )
+        except self._pyjwt.PyJWTError as e:
+            # Surface failures the same way as the jose verifier
+            raise JWTError(str(e))
+
+def build_verifier(name: str):
+    """Build the token verifier selected by JWT_VERIFIER"""
+    if name == "jose":
+        return JoseVerifier()
+    if name == "pyjwt":
+        return PyJWTVerifier()
+    raise ValueError(f"Invalid JWT verifier: {name}. Must be 'jose' or 'pyjwt'")
+
+class VerifiedTokenCache:
+    """Bounded LRU of verified token digests to the user they identify.
+
+    Entries are only served until the token's exp and while its signing key is
+    still published, so a rotated-out key stops authenticating cached tokens.
+    Only touched from the event loop, so no locking is needed.
+    """
+
+    def __init__(self, max_size: int = JWT_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[bytes, Tuple[Dict[str, Any], float, str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, digest: bytes, key_known) -> Optional[Dict[str, Any]]:
+        """Get the cached user for a token digest if the token is still valid"""
+        entry = self._entries.get(digest)
+        if entry is None:
+            self.misses += 1
+            return None
+        user, exp, kid = entry
+        if time.time() >= exp or not key_known(kid):
+            del self._entries[digest]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(digest)
+        self.hits += 1
+        return dict(user)
+
+    def put(self, digest: bytes, user: Dict[str, Any], payload: Dict[str, Any], kid: str) -> None:
+        """Remember a verified token until its exp"""
+        exp = payload.get("exp")
+        # Tokens without an expiry are verified every time
+        if self.max_size <= 0 or not isinstance(exp, (int, float)):
+            return
+        self._entries[digest] = (dict(user), float(exp), kid)
+        self._entries.move_to_end(digest)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+jwks_manager = JWKSManager(CLERK_ISSUER)
+token_verifier = build_verifier(JWT_VERIFIER)
+token_cache = VerifiedTokenCache()
 
 async def validate_token(credentials: HTTPAuthorizationCredentials = Security(security)) -> Dict[str, Any]:
     """Validate the JWT token from Clerk"""
     try:
         token = credentials.credentials
+        # Polling clients resend the same token, so skip verification for ones already verified
+        digest = token_cache.digest(token)
+        user = token_cache.get(digest, jwks_manager.has_key)
+        if user is not None:
+            return user
+
         # Extract the key ID from the token header
         header = jwt.get_unverified_header(token)
         kid = header.get("kid")
@@ -46,30 +297,28 @@ async def validate_token(credentials: HTTPAuthorizationCredentials = Security(se
             raise HTTPException(status_code=401, detail="Invalid token header")
             
         # Get the public key
-        public_key = get_public_key(kid)
+        public_key = await jwks_manager.get_key(kid)
         if not public_key:
             raise HTTPException(status_code=401, detail="Invalid key ID")
             
         # Verify the token
-        payload = jwt.decode(
-            token,
-            public_key,
-            algorithms=["RS256"],
-            issuer=CLERK_ISSUER,
-            options={"verify_aud": False}  # Skip audience verification
-        )
+        payload = token_verifier.decode(token, public_key)
         
         # Extract user information
         user_id = payload.get("sub")
         if not user_id:
             raise HTTPException(status_code=401, detail="Invalid user ID in token")
             
-        return {
+        user = {
             "user_id": user_id,
             "email": payload.get("email"),
             "name": payload.get("name")
         }
+        token_cache.put(digest, user, payload, kid)
+        return user
         
+    except HTTPException:
+        raise
     except JWTError as e:
         raise HTTPException(status_code=401, detail=f"Invalid token: {str(e)}")
     except Exception as e:
@@ -77,4 +326,10 @@ async def validate_token(credentials: HTTPAuthorizationCredentials = Security(se
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Security(security)) -> Dict[str, Any]:
     """Dependency to get the current authenticated user"""
-    return await validate_token(credentials) 
\ No newline at end of file
+    return await validate_token(credentials)
+
+async def get_admin_user(current_user: Dict[str, Any] = Depends(get_current_user)) -> Dict[str, Any]:
+    """Dependency for endpoints that expose data across all users, such as analytics"""
+    if current_user["user_id"] not in ADMIN_USER_IDS:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return current_user
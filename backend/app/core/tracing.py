@@ -0,0 +1,183 @@
+from typing import Dict, Any, Optional, Sequence
+from pathlib import Path
+import json
+import threading
+import time
+from opentelemetry import context, propagate, trace
+from opentelemetry.propagators.textmap import Getter
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider, ReadableSpan
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter, SpanExporter, SpanExportResult
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+from opentelemetry.trace import SpanKind, Status, StatusCode
+from app.core.config import settings
+from app.core.logging import setup_logger
+
+# Set up logging
+logger = setup_logger("tracing")
+
+ENQUEUED_AT_HEADER = "elucide-enqueued-at"
+
+tracer = trace.get_tracer("elucide")
+
+_configured = False
+_configure_lock = threading.Lock()
+
+class FileSpanExporter(SpanExporter):
+    """Appends finished spans to a JSON-lines file, a local stand-in for a collector"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        lines = []
+        for span in spans:
+            parent = span.parent
+            lines.append(json.dumps({
+                "trace_id": format(span.context.trace_id, "032x"),
+                "span_id": format(span.context.span_id, "016x"),
+                "parent_id": format(parent.span_id, "016x") if parent else None,
+                "name": span.name,
+                "kind": span.kind.name,
+                "service": span.resource.attributes.get("service.name"),
+                "start_ns": span.start_time,
+                "end_ns": span.end_time,
+                "duration_ms": round((span.end_time - span.start_time) / 1e6, 3),
+                "status": span.status.status_code.name,
+                "attributes": dict(span.attributes or {})
+            }, default=str))
+        try:
+            with self._lock, open(self.path, "a") as f:
+                f.write("\n".join(lines) + "\n")
+        except OSError as e:
+            logger.error(f"Failed to write spans to {self.path}: {str(e)}")
+            return SpanExportResult.FAILURE
+        return SpanExportResult.SUCCESS
+
+def _build_exporter(name: str) -> Optional[SpanExporter]:
+    if name == "file":
+        return FileSpanExporter(settings.TRACING_FILE_PATH)
+    if name == "console":
+        return ConsoleSpanExporter()
+    if name == "otlp":
+        # Optional dependency: opentelemetry-exporter-otlp-proto-http
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter(endpoint=settings.TRACING_OTLP_ENDPOINT)
+    if name == "none":
+        return None
+    raise ValueError(f"Invalid tracing exporter: {name}. Must be 'none', 'file', 'console' or 'otlp'")
+
+def setup_tracing(service_name: str) -> None:
+    """Install the tracer provider for this process; a no-op when tracing is disabled"""
+    global _configured
+    with _configure_lock:
+        if _configured:
+            return
+        _configured = True
+        exporter = _build_exporter(settings.TRACING_EXPORTER)
+        if exporter is None:
+            return
+        # Sample a fraction of new traces; children follow their parent's decision
+        provider = TracerProvider(
+            resource=Resource.create({"service.name": service_name}),
+            sampler=ParentBased(TraceIdRatioBased(settings.TRACING_SAMPLE_RATIO))
+        )
+        # The batch processor restarts its export thread in forked worker children
+        provider.add_span_processor(BatchSpanProcessor(exporter))
+        trace.set_tracer_provider(provider)
+        logger.info(f"Tracing {service_name} with {settings.TRACING_EXPORTER} exporter at ratio {settings.TRACING_SAMPLE_RATIO}")
+
+def record_exception(span: trace.Span, error: Exception) -> None:
+    """Mark a span as failed"""
+    span.record_exception(error)
+    span.set_status(Status(StatusCode.ERROR, str(error)))
+
+class _RequestGetter(Getter):
+    """Reads propagated headers from a Celery task request"""
+
+    def get(self, carrier: Any, key: str) -> Optional[list]:
+        value = getattr(carrier, key, None)
+        if value is None and isinstance(getattr(carrier, "headers", None), dict):
+            value = carrier.headers.get(key)
+        if value is None:
+            return None
+        return value if isinstance(value, list) else [value]
+
+    def keys(self, carrier: Any) -> list:
+        return []
+
+_request_getter = _RequestGetter()
+
+# Active task spans keyed by task ID between prerun and postrun
+_task_spans: Dict[str, Any] = {}
+
+def inject_task_headers(headers: Dict[str, Any]) -> None:
+    """Propagate the current trace into an outgoing Celery message"""
+    propagate.inject(headers)
+    headers[ENQUEUED_AT_HEADER] = time.time_ns()
+
+def start_task_span(task_id: str, task: Any) -> None:
+    """Continue the publisher's trace in the worker and time the queue wait"""
+    parent = propagate.extract(task.request, getter=_request_getter)
+    enqueued_at = _request_getter.get(task.request, ENQUEUED_AT_HEADER)
+    if enqueued_at:
+        queue_span = tracer.start_span("celery.queue", context=parent, kind=SpanKind.CONSUMER, start_time=int(enqueued_at[0]))
+        queue_span.set_attribute("celery.task_name", task.name)
+        queue_span.end()
+    span = tracer.start_span(f"celery.run {task.name}", context=parent, kind=SpanKind.CONSUMER)
+    span.set_attribute("celery.task_id", task_id)
+    span.set_attribute("celery.task_name", task.name)
+    token = context.attach(trace.set_span_in_context(span, parent))
+    _task_spans[task_id] = (span, token)
+
+def end_task_span(task_id: str, retval: Any = None, state: Optional[str] = None) -> None:
+    """Finish the worker span of a task"""
+    entry = _task_spans.pop(task_id, None)
+    if entry is None:
+        return
+    span, token = entry
+    span.set_attribute("celery.state", state or "UNKNOWN")
+    # Our tasks report failures as an error result rather than raising
+    if isinstance(retval, dict) and retval.get("status") == "error":
+        span.set_status(Status(StatusCode.ERROR, str(retval.get("error"))))
+    span.end()
+    context.detach(token)
+
+class TracingMiddleware:
+    """ASGI middleware opening a server span per request, continuing incoming traceparent headers"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        carrier = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope.get("headers", [])}
+        parent = propagate.extract(carrier)
+        status: Dict[str, Any] = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        with tracer.start_as_current_span(
+            f"HTTP {scope['method']}",
+            context=parent,
+            kind=SpanKind.SERVER,
+            attributes={"http.method": scope["method"], "http.target": scope["path"]}
+        ) as span:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = scope.get("route")
+                if route is not None:
+                    span.update_name(f"HTTP {scope['method']} {route.path}")
+                    span.set_attribute("http.route", route.path)
+                span.set_attribute("http.status_code", status["code"])
+                if status["code"] >= 500:
+                    span.set_status(Status(StatusCode.ERROR))
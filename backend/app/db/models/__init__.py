@@ -1,6 +1,8 @@
 from app.db.base import Base
-from app.db.models.image import Image, ImageProcessing
+from app.db.models.image import Image, ImageProcessing, AnalysisCacheEntry, StoredObject, ImageEmbedding
 from app.db.models.chat import ChatThread, ChatMessage
+from app.db.models.analytics import ProcessingRollup
+from app.db.models.job import JobResult
 
 # Import all models here for Alembic autogenerate support
-__all__ = ["Base", "Image", "ImageProcessing", "ChatThread", "ChatMessage"]
+__all__ = ["Base", "Image", "ImageProcessing", "AnalysisCacheEntry", "StoredObject", "ImageEmbedding", "ChatThread", "ChatMessage", "ProcessingRollup", "JobResult"]
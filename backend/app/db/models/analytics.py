@@ -0,0 +1,61 @@
+from sqlalchemy import Column, String, DateTime, Integer, Float, UniqueConstraint, text
+from sqlalchemy.dialects.postgresql import UUID, JSONB
+import uuid
+from typing import Dict, Any
+from app.db.base import Base
+
+class ProcessingRollup(Base):
+    """Job latency pre-aggregated per time bucket, model version and status"""
+    __tablename__ = "processing_rollups"
+    __table_args__ = (
+        UniqueConstraint("granularity", "bucket_start", "model_version", "status", name="uq_processing_rollup_key"),
+        {'schema': 'elucide'}
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, server_default=text("gen_random_uuid()"))
+    granularity = Column(String, nullable=False)  # minute, hour or day
+    bucket_start = Column(DateTime(timezone=True), nullable=False)
+    model_version = Column(String, nullable=False)
+    status = Column(String, nullable=False)
+    
+    # Totals
+    job_count = Column(Integer, nullable=False)
+    duration_sum = Column(Float)
+    api_count = Column(Integer, nullable=False)
+    api_duration_sum = Column(Float)
+    
+    # Exact percentiles within the bucket
+    duration_p50 = Column(Float)
+    duration_p95 = Column(Float)
+    duration_p99 = Column(Float)
+    api_p50 = Column(Float)
+    api_p95 = Column(Float)
+    api_p99 = Column(Float)
+    
+    # Counts per latency bin, mergeable across buckets
+    duration_histogram = Column(JSONB, nullable=False, default=dict)
+    api_histogram = Column(JSONB, nullable=False, default=dict)
+    
+    refreshed_at = Column(DateTime(timezone=True))
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert rollup bucket to dictionary"""
+        return {
+            "bucket_start": self.bucket_start.isoformat() if self.bucket_start else None,
+            "model_version": self.model_version,
+            "status": self.status,
+            "job_count": self.job_count,
+            "duration": {
+                "avg": round(self.duration_sum / self.job_count, 2) if self.job_count and self.duration_sum is not None else None,
+                "p50": self.duration_p50,
+                "p95": self.duration_p95,
+                "p99": self.duration_p99
+            },
+            "api_duration": {
+                "count": self.api_count,
+                "avg": round(self.api_duration_sum / self.api_count, 2) if self.api_count and self.api_duration_sum is not None else None,
+                "p50": self.api_p50,
+                "p95": self.api_p95,
+                "p99": self.api_p99
+            }
+        }
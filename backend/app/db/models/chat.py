@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Text, DateTime, ForeignKey, UUID, func
+from sqlalchemy import Column, String, Text, DateTime, ForeignKey, UUID, Integer, func
 from sqlalchemy.orm import relationship
 from app.db.base import Base
 import uuid
@@ -49,6 +49,11 @@ class ChatThread(Base):
         onupdate=func.now(),
     )
     
+    # Rolling summary of the thread's oldest messages, maintained in the background
+    summary = Column(Text, nullable=True)
+    summary_message_count = Column(Integer, nullable=False, default=0, server_default="0")  # Messages folded into the summary
+    summary_updated_at = Column(DateTime(timezone=True), nullable=True)
+    
     # Relationships
     messages = relationship("ChatMessage", back_populates="thread", cascade="all, delete-orphan")
     folder = relationship("ChatFolder", back_populates="threads")
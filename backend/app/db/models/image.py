@@ -1,5 +1,5 @@
-from sqlalchemy import Column, String, DateTime, Integer, Float, ForeignKey, Text
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, DateTime, Integer, Float, ForeignKey, Text, Boolean, UniqueConstraint
+from sqlalchemy.dialects.postgresql import UUID, ARRAY
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 import uuid
@@ -18,9 +18,13 @@ class Image(Base):
     user_id = Column(String, nullable=False)
     uploaded_at = Column(DateTime(timezone=True), default=utcnow_with_timezone)
     storage_path = Column(String)
+    content_hash = Column(String(64), index=True)  # SHA-256 of the image bytes
+    perceptual_hash = Column(String(16), index=True)  # Difference hash for near-duplicate lookups
+    thumbnail_path = Column(String)
     
     # Relationships
     processings = relationship("ImageProcessing", back_populates="image", cascade="all, delete-orphan")
+    embeddings = relationship("ImageEmbedding", back_populates="image", cascade="all, delete-orphan")
     
     def to_dict(self) -> Dict[str, Any]:
         """Convert image to dictionary"""
@@ -29,7 +33,10 @@ class Image(Base):
             "filename": self.filename,
             "user_id": self.user_id,
             "uploaded_at": self.uploaded_at.isoformat() if self.uploaded_at else None,
-            "storage_path": self.storage_path
+            "storage_path": self.storage_path,
+            "content_hash": self.content_hash,
+            "perceptual_hash": self.perceptual_hash,
+            "thumbnail_path": self.thumbnail_path
         }
 
 class ImageProcessing(Base):
@@ -48,7 +55,7 @@ class ImageProcessing(Base):
     
     # Timing information
     start_time = Column(DateTime(timezone=True))
-    end_time = Column(DateTime(timezone=True))
+    end_time = Column(DateTime(timezone=True), index=True)
     duration_seconds = Column(Float)
     
     # API call timing
@@ -56,6 +63,13 @@ class ImageProcessing(Base):
     api_end_time = Column(DateTime(timezone=True))
     api_duration_seconds = Column(Float)
     
+    # Analysis cache information
+    cache_hit = Column(Boolean, default=False)
+    saved_api_seconds = Column(Float)
+    
+    # Written since the latency rollups last covered this row
+    rollup_pending = Column(Boolean, nullable=False, default=True, server_default="true")
+    
     # Relationships
     image = relationship("Image", back_populates="processings")
     
@@ -74,5 +88,64 @@ class ImageProcessing(Base):
             "duration_seconds": self.duration_seconds,
             "api_start_time": self.api_start_time.isoformat() if self.api_start_time else None,
             "api_end_time": self.api_end_time.isoformat() if self.api_end_time else None,
+            "api_duration_seconds": self.api_duration_seconds,
+            "cache_hit": self.cache_hit,
+            "saved_api_seconds": self.saved_api_seconds
+        }
+
+class ImageEmbedding(Base):
+    """Vector for searching an image, embedded from its description"""
+    __tablename__ = "image_embeddings"
+    __table_args__ = (
+        UniqueConstraint("image_id", "model", name="uq_image_embeddings_image_model"),
+        {'schema': 'elucide'}
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    image_id = Column(UUID(as_uuid=True), ForeignKey("elucide.images.id", ondelete="CASCADE"), nullable=False)
+    model = Column(String, nullable=False)
+    source_hash = Column(String(64), nullable=False)  # SHA-256 of the embedded text
+    dimensions = Column(Integer, nullable=False)
+    embedding = Column(ARRAY(Float), nullable=False)
+    created_at = Column(DateTime(timezone=True), default=utcnow_with_timezone)
+    
+    # Relationships
+    image = relationship("Image", back_populates="embeddings")
+
+class StoredObject(Base):
+    """Content-addressed GCS object shared by every image with the same bytes"""
+    __tablename__ = "stored_objects"
+    __table_args__ = {'schema': 'elucide'}
+
+    content_hash = Column(String(64), primary_key=True)
+    storage_path = Column(String, nullable=False)
+    size_bytes = Column(Integer)
+    ref_count = Column(Integer, nullable=False, default=1)
+    created_at = Column(DateTime(timezone=True), default=utcnow_with_timezone)
+
+class AnalysisCacheEntry(Base):
+    __tablename__ = "analysis_cache"
+    __table_args__ = (
+        UniqueConstraint("content_hash", "prompt_hash", "model_version", name="uq_analysis_cache_key"),
+        {'schema': 'elucide'}
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    content_hash = Column(String(64), nullable=False)
+    prompt_hash = Column(String(64), nullable=False)  # SHA-256 of the normalised prompt
+    model_version = Column(String, nullable=False)
+    description = Column(Text, nullable=False)
+    api_duration_seconds = Column(Float)
+    hit_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), default=utcnow_with_timezone)
+    last_hit_at = Column(DateTime(timezone=True))
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert cache entry to dictionary"""
+        return {
+            "content_hash": self.content_hash,
+            "prompt_hash": self.prompt_hash,
+            "model_version": self.model_version,
+            "description": self.description,
             "api_duration_seconds": self.api_duration_seconds
         } 
\ No newline at end of file
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, String, DateTime, Integer
+from sqlalchemy.dialects.postgresql import JSONB
+from app.db.base import Base
+from app.db.models.image import utcnow_with_timezone
+
+class JobResult(Base):
+    """Large Celery task result kept once in Postgres; the Redis result key only points here"""
+    __tablename__ = "job_results"
+    __table_args__ = {'schema': 'elucide'}
+
+    job_id = Column(String, primary_key=True)  # Celery task ID
+    task_name = Column(String)
+    status = Column(String, nullable=False)
+    result = Column(JSONB)
+    size_bytes = Column(Integer)
+    created_at = Column(DateTime(timezone=True), default=utcnow_with_timezone)
+    expires_at = Column(DateTime(timezone=True), index=True)  # Null keeps the result forever
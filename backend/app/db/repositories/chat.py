@@ -149,6 +149,27 @@ class ChatRepository:
                     .order_by(ChatMessage.created_at)
                     .all())
 
+    async def get_messages_after(self, thread_id: uuid.UUID, offset: int) -> List[ChatMessage]:
+        """Get a thread's messages after the first `offset`, in the order the summary folds them"""
+        stmt = (select(ChatMessage)
+                .filter_by(thread_id=thread_id)
+                .order_by(ChatMessage.created_at, ChatMessage.id)
+                .offset(offset))
+        if self.is_async:
+            result = await self.db.execute(stmt)
+        else:
+            result = self.db.execute(stmt)
+        return list(result.scalars().all())
+
+    async def count_thread_messages(self, thread_id: uuid.UUID) -> int:
+        """Count the messages in a thread"""
+        stmt = select(func.count(ChatMessage.id)).filter_by(thread_id=thread_id)
+        if self.is_async:
+            result = await self.db.execute(stmt)
+        else:
+            result = self.db.execute(stmt)
+        return result.scalar_one()
+
     async def get_thread_with_messages(self, thread_id: uuid.UUID) -> Optional[Dict[str, Any]]:
         """Get a thread with all its messages"""
         thread = await self.get_thread(thread_id)
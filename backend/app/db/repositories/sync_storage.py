@@ -1,16 +1,21 @@
 from sqlalchemy.orm import Session
 from sqlalchemy.dialects.postgresql import UUID
-from typing import Optional, Dict, Any, List
+from sqlalchemy.dialects.postgresql import insert
+from typing import Optional, Dict, Any, List, Tuple
 import uuid
 import os
 from google.cloud import storage
-from app.db.models.image import Image, ImageProcessing
+from app.db.models.image import Image, ImageProcessing, StoredObject
 from app.core.logging import setup_logger
 from app.core.config import settings
 
 # Set up logging
 logger = setup_logger("sync_storage")
 
+def derivatives_prefix(storage_path: str) -> str:
+    """Derivatives (e.g. thumbnails) of an object live under this prefix and share its lifetime"""
+    return f"derivatives/{storage_path}/"
+
 class SyncStorageManager:
     def __init__(self, db_session: Session):
         self.db = db_session
@@ -103,19 +108,125 @@ class SyncStorageManager:
             
         return results
 
+    def find_user_image_by_hash(self, user_id: str, content_hash: str) -> Optional[Image]:
+        """Get a user's existing image with the same content"""
+        return (
+            self.db.query(Image)
+            .filter_by(user_id=user_id, content_hash=content_hash)
+            .order_by(Image.uploaded_at.asc())
+            .first()
+        )
+
+    def _upload_file(self, file_path: str, storage_path: str) -> None:
+        """Upload a local file to GCS with public read access"""
+        blob = self.bucket.blob(storage_path)
+        blob.content_type = "image/jpeg"
+        blob.cache_control = "public, max-age=31536000"  # Cache for 1 year
+        blob.upload_from_filename(file_path, predefined_acl='publicRead')
+
+    def _acquire_shared_object(self, file_path: str, content_hash: str) -> str:
+        """Reference the shared object for this content, uploading it only if it is new"""
+        stored = (
+            self.db.query(StoredObject)
+            .filter_by(content_hash=content_hash)
+            .with_for_update()
+            .first()
+        )
+        storage_path = stored.storage_path if stored else f"objects/{content_hash[:2]}/{content_hash}"
+        if not stored:
+            self._upload_file(file_path, storage_path)
+        
+        # Upsert so concurrent first uploads of the same content both count
+        stmt = insert(StoredObject).values(
+            content_hash=content_hash,
+            storage_path=storage_path,
+            size_bytes=os.path.getsize(file_path),
+            ref_count=1
+        ).on_conflict_do_update(
+            index_elements=[StoredObject.content_hash],
+            set_={"ref_count": StoredObject.ref_count + 1}
+        )
+        self.db.execute(stmt)
+        return storage_path
+
+    def _release_shared_object(self, image: Image) -> bool:
+        """Drop one reference to an image's object; True when the blob is no longer used"""
+        if not image.content_hash:
+            return True
+        stored = (
+            self.db.query(StoredObject)
+            .filter_by(content_hash=image.content_hash, storage_path=image.storage_path)
+            .with_for_update()
+            .first()
+        )
+        if not stored:
+            # Per-user object, owned by this image alone
+            return True
+        stored.ref_count -= 1
+        if stored.ref_count > 0:
+            logger.info(f"Object {stored.storage_path} still has {stored.ref_count} references")
+            return False
+        self.db.delete(stored)
+        return True
+
+    def store_image_file(
+        self,
+        file_path: str,
+        filename: str,
+        user_id: str,
+        content_hash: str,
+        object_name: Optional[str] = None
+    ) -> Tuple[Image, bool]:
+        """Store an uploaded image file, reusing existing content where possible.
+        Returns the image record and whether a new one was created."""
+        existing = self.find_user_image_by_hash(user_id, content_hash)
+        if existing:
+            logger.info(f"Reusing image {existing.id} for duplicate upload of {filename}")
+            return existing, False
+        
+        image_id = uuid.uuid4()
+        if settings.SHARE_STORAGE_ACROSS_USERS:
+            storage_path = self._acquire_shared_object(file_path, content_hash)
+        else:
+            storage_path = f"users/{user_id}/images/{image_id}/{object_name or os.path.basename(file_path)}"
+            self._upload_file(file_path, storage_path)
+        
+        image = Image(
+            id=image_id,
+            filename=filename,
+            storage_path=storage_path,
+            user_id=user_id,
+            content_hash=content_hash
+        )
+        self.db.add(image)
+        self.db.commit()
+        self.db.refresh(image)
+        return image, True
+
     def delete_image(self, image_id: UUID) -> bool:
         """Delete image and its processing records"""
         image = self.get_image(image_id)
         if not image:
             return False
             
-        # Delete from GCS if storage path exists
-        if image.storage_path:
-            blob = self.bucket.blob(image.storage_path)
-            if blob.exists():
-                blob.delete()
+        # The GCS object goes once no other image references it, with every derivative of it;
+        # only the image that generated a thumbnail records its path
+        storage_path = image.storage_path
+        release_object = bool(storage_path) and self._release_shared_object(image)
             
         # Database cascade will handle processing records deletion
         self.db.delete(image)
         self.db.commit()
+
+        # Only after the commit, so a failed delete never leaves a row without its content;
+        # a blob left behind is logged, not an error
+        if release_object:
+            try:
+                blob = self.bucket.blob(storage_path)
+                if blob.exists():
+                    blob.delete()
+                for derivative in self.bucket.list_blobs(prefix=derivatives_prefix(storage_path)):
+                    derivative.delete()
+            except Exception as e:
+                logger.error(f"Failed to delete stored files of image {image_id} at {storage_path}: {str(e)}")
         return True 
\ No newline at end of file
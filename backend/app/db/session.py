@@ -1,13 +1,22 @@
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Iterator, Optional
+from contextlib import contextmanager
 
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
 
-from app.core.config import settings, async_engine, AsyncSessionLocal
+from app.core.config import settings, async_engine, AsyncSessionLocal, sync_engine, sync_engine_args, SyncSessionLocal
+from app.core.metrics import instrument_engine
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
+# Pooled engine of the current Celery worker process, if any
+_worker_engine: Optional[Engine] = None
+
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     """Dependency for getting async database sessions."""
     async with AsyncSessionLocal() as session:
@@ -18,4 +27,56 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
             await session.rollback()
             raise
         finally:
-            await session.close() 
\ No newline at end of file
+            await session.close()
+
+def init_worker_engine(concurrency: int = 1) -> Engine:
+    """Give this worker process its own pooled engine and bind SyncSessionLocal to it.
+
+    Called after the fork, so no pooled connection is ever shared with the
+    parent; tasks run by the process then reuse the pool's connections.
+    """
+    global _worker_engine
+    if _worker_engine is not None:
+        return _worker_engine
+
+    # Forget connections inherited from the parent without closing its sockets
+    sync_engine.dispose(close=False)
+
+    pool_size = settings.CELERY_DB_POOL_SIZE or max(1, concurrency)
+    _worker_engine = create_engine(
+        settings.DATABASE_URL_SYNC,
+        **{
+            **sync_engine_args,
+            "poolclass": QueuePool,
+            "pool_size": pool_size,
+            "max_overflow": settings.CELERY_DB_MAX_OVERFLOW,
+            "pool_recycle": settings.CELERY_DB_POOL_RECYCLE_SECONDS,
+            "pool_pre_ping": True  # Connections sit idle between tasks
+        }
+    )
+    instrument_engine(_worker_engine, "worker")
+    SyncSessionLocal.configure(bind=_worker_engine)
+    logger.info(f"Worker process {os.getpid()} using a database pool of {pool_size} (+{settings.CELERY_DB_MAX_OVERFLOW} overflow)")
+    return _worker_engine
+
+def dispose_worker_engine() -> None:
+    """Close this worker process's pooled connections"""
+    global _worker_engine
+    if _worker_engine is None:
+        return
+    SyncSessionLocal.configure(bind=sync_engine)
+    _worker_engine.dispose()
+    _worker_engine = None
+
+@contextmanager
+def task_session() -> Iterator[Session]:
+    """Database session scoped to one task: committed on success, rolled back on error, always closed"""
+    db = SyncSessionLocal()
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
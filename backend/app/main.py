@@ -1,12 +1,23 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
+import os
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
 from app.core.logging import setup_logger
 from app.api.v1.router import api_router
+from app.core.metrics import PrometheusMiddleware, render_metrics
+from app.core.tracing import TracingMiddleware, setup_tracing
+from app.core.security import jwks_manager
+from app.core.job_events import job_event_hub
+from app.core.job_backend import local_jobs, local_beat, uses_local_jobs
+from app.core.celery_app import celery_app
+from app.services.stats_service import job_metrics
 
 # Set up logging
 logger = setup_logger("main")
 
+# Set up tracing before any spans are started
+setup_tracing(os.getenv("TRACING_SERVICE_NAME", "elucide-api"))
+
 app = FastAPI(title="Elucide API")
 
 # Add root endpoint here
@@ -14,6 +25,13 @@ app = FastAPI(title="Elucide API")
 async def root():
     return {"status": "OK", "service": "Elucide API", "version": "0.1.0"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Expose Prometheus metrics for the API and, in multiprocess mode, the workers"""
+    queues = tuple(queue.strip() for queue in settings.METRICS_CELERY_QUEUES.split(",") if queue.strip())
+    body, content_type = render_metrics(queues)
+    return Response(content=body, headers={"Content-Type": content_type})
+
 # Configure CORS with settings
 default_origins = [
     "http://localhost:3000",  # Keep local development
@@ -54,5 +72,46 @@ app.add_middleware(
     max_age=86400,  # Cache preflight requests for 24 hours
 )
 
+# Record request latency per route
+app.add_middleware(PrometheusMiddleware)
+
+# Open a server span per request; added last so it wraps everything else
+app.add_middleware(TracingMiddleware)
+
+@app.on_event("startup")
+async def start_jwks_refresh():
+    """Load Clerk's signing keys before the first request and keep them fresh"""
+    await jwks_manager.start()
+
+@app.on_event("startup")
+async def start_job_stats_flush():
+    """The API process times jobs too and flushes its own in-memory buffer"""
+    job_metrics.start_flushing()
+
+@app.on_event("shutdown")
+async def stop_jwks_refresh():
+    await jwks_manager.stop()
+
+@app.on_event("shutdown")
+async def stop_job_events():
+    await job_event_hub.stop()
+
+@app.on_event("startup")
+async def start_local_beat():
+    """With local jobs no Celery beat runs, so the API process runs the periodic tasks itself"""
+    if uses_local_jobs():
+        celery_app.loader.import_default_modules()
+        local_beat.start(celery_app.conf.beat_schedule)
+
+@app.on_event("shutdown")
+async def stop_local_jobs():
+    local_beat.stop()
+    local_jobs.shutdown()
+
+@app.on_event("shutdown")
+async def stop_job_stats_flush():
+    # After the local jobs, whose stats land in the same buffer
+    job_metrics.stop_flushing()
+
 # Include API router
 app.include_router(api_router, prefix="/api/v1") 
\ No newline at end of file
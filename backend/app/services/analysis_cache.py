@@ -0,0 +1,117 @@
+from typing import Dict, Any, Optional, List, Tuple
+from datetime import datetime, timezone
+import hashlib
+import json
+import uuid
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert
+from app.core.config import settings
+from app.core.redis_client import get_redis
+from app.core.logging import setup_logger
+from app.db.models.image import AnalysisCacheEntry
+
+# Set up logging
+logger = setup_logger("analysis_cache")
+
+CACHE_PREFIX = "analysis:cache"
+
+def normalize_prompt(prompt: str) -> str:
+    """Normalise a prompt so trivially different spellings share a cache entry"""
+    return " ".join(prompt.split()).lower()
+
+def hash_prompt(prompt: str) -> str:
+    """Hash the normalised prompt"""
+    return hashlib.sha256(normalize_prompt(prompt).encode()).hexdigest()
+
+class AnalysisCache:
+    """Two-level (Redis, Postgres) cache of vision results keyed by content hash, prompt and model"""
+
+    def __init__(self):
+        self.ttl = settings.ANALYSIS_CACHE_TTL_SECONDS
+
+    def _redis_key(self, content_hash: str, prompt_hash: str, model_version: str) -> str:
+        return f"{CACHE_PREFIX}:{model_version}:{content_hash}:{prompt_hash}"
+
+    def get(self, db: Session, content_hash: str, prompt: str, model_version: str) -> Optional[Dict[str, Any]]:
+        """Look up a cached analysis, checking Redis before Postgres"""
+        prompt_hash = hash_prompt(prompt)
+        redis_key = self._redis_key(content_hash, prompt_hash, model_version)
+        try:
+            cached = get_redis().get(redis_key)
+            if cached:
+                logger.info(f"Analysis cache hit (redis) for {content_hash[:12]}")
+                return json.loads(cached)
+        except Exception as e:
+            logger.warning(f"Analysis cache read failed: {str(e)}")
+
+        entry = (db.query(AnalysisCacheEntry)
+                .filter_by(content_hash=content_hash, prompt_hash=prompt_hash, model_version=model_version)
+                .first())
+        if not entry:
+            return None
+
+        entry.hit_count = (entry.hit_count or 0) + 1
+        entry.last_hit_at = datetime.now(timezone.utc)
+        db.commit()
+        result = entry.to_dict()
+        self._set_redis(redis_key, result)
+        logger.info(f"Analysis cache hit (postgres) for {content_hash[:12]}")
+        return result
+
+    def put(
+        self,
+        db: Session,
+        content_hash: str,
+        prompt: str,
+        model_version: str,
+        description: str,
+        api_duration_seconds: Optional[float]
+    ) -> None:
+        """Store an analysis result in both cache levels"""
+        self.put_many(db, prompt, model_version, [(content_hash, description, api_duration_seconds)])
+
+    def put_many(
+        self,
+        db: Session,
+        prompt: str,
+        model_version: str,
+        entries: List[Tuple[str, str, Optional[float]]]
+    ) -> None:
+        """Store several (content_hash, description, api_duration_seconds) results with one insert"""
+        if not entries:
+            return
+        prompt_hash = hash_prompt(prompt)
+        now = datetime.now(timezone.utc)
+        rows = [
+            {
+                "id": uuid.uuid4(),
+                "content_hash": content_hash,
+                "prompt_hash": prompt_hash,
+                "model_version": model_version,
+                "description": description,
+                "api_duration_seconds": api_duration_seconds,
+                "hit_count": 0,
+                "created_at": now
+            }
+            for content_hash, description, api_duration_seconds in entries
+        ]
+        stmt = insert(AnalysisCacheEntry).values(rows).on_conflict_do_nothing(constraint="uq_analysis_cache_key")
+        db.execute(stmt)
+        db.commit()
+        for content_hash, description, api_duration_seconds in entries:
+            self._set_redis(self._redis_key(content_hash, prompt_hash, model_version), {
+                "content_hash": content_hash,
+                "prompt_hash": prompt_hash,
+                "model_version": model_version,
+                "description": description,
+                "api_duration_seconds": api_duration_seconds
+            })
+
+    def _set_redis(self, redis_key: str, value: Dict[str, Any]) -> None:
+        try:
+            get_redis().set(redis_key, json.dumps(value), ex=self.ttl)
+        except Exception as e:
+            logger.warning(f"Analysis cache write failed: {str(e)}")
+
+# Global instance
+analysis_cache = AnalysisCache()
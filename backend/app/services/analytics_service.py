@@ -0,0 +1,266 @@
+from typing import Dict, Any, Optional, List
+from datetime import datetime, timezone, timedelta
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy import select, text
+from app.core.celery_app import celery_app
+from app.core.config import settings, SyncSessionLocal
+from app.core.logging import setup_logger
+from app.db.models.analytics import ProcessingRollup
+
+# Set up logging
+logger = setup_logger("analytics")
+
+GRANULARITIES = ("minute", "hour", "day")
+
+# Upper bounds (seconds) of the latency histogram bins; the last bin is open-ended
+LATENCY_HISTOGRAM_EDGES = [0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0]
+
+# Serialises refreshes across beat and manual runs
+ROLLUP_LOCK_ID = 7310042
+
+REFRESH_ROLLUPS_SQL = text('''
+    WITH base AS (
+        SELECT
+            date_trunc(:granularity, end_time, 'UTC') AS bucket_start,
+            COALESCE(model_version, 'unknown') AS model_version,
+            status,
+            duration_seconds,
+            api_duration_seconds
+        FROM elucide.image_processings
+        WHERE end_time IS NOT NULL
+          AND (CAST(:buckets AS timestamptz[]) IS NULL OR (
+              end_time >= CAST(:since AS timestamptz)
+              AND date_trunc(:granularity, end_time, 'UTC') = ANY(CAST(:buckets AS timestamptz[]))
+          ))
+    ),
+    duration_bins AS (
+        SELECT bucket_start, model_version, status, jsonb_object_agg(bin, n) AS histogram
+        FROM (
+            SELECT bucket_start, model_version, status,
+                   width_bucket(duration_seconds, CAST(:edges AS float8[])) AS bin, count(*) AS n
+            FROM base
+            WHERE duration_seconds IS NOT NULL
+            GROUP BY 1, 2, 3, 4
+        ) bins
+        GROUP BY 1, 2, 3
+    ),
+    api_bins AS (
+        SELECT bucket_start, model_version, status, jsonb_object_agg(bin, n) AS histogram
+        FROM (
+            SELECT bucket_start, model_version, status,
+                   width_bucket(api_duration_seconds, CAST(:edges AS float8[])) AS bin, count(*) AS n
+            FROM base
+            WHERE api_duration_seconds IS NOT NULL
+            GROUP BY 1, 2, 3, 4
+        ) bins
+        GROUP BY 1, 2, 3
+    ),
+    totals AS (
+        SELECT
+            bucket_start, model_version, status,
+            count(*) AS job_count,
+            sum(duration_seconds) AS duration_sum,
+            count(api_duration_seconds) AS api_count,
+            sum(api_duration_seconds) AS api_duration_sum,
+            percentile_cont(0.5) WITHIN GROUP (ORDER BY duration_seconds) AS duration_p50,
+            percentile_cont(0.95) WITHIN GROUP (ORDER BY duration_seconds) AS duration_p95,
+            percentile_cont(0.99) WITHIN GROUP (ORDER BY duration_seconds) AS duration_p99,
+            percentile_cont(0.5) WITHIN GROUP (ORDER BY api_duration_seconds) AS api_p50,
+            percentile_cont(0.95) WITHIN GROUP (ORDER BY api_duration_seconds) AS api_p95,
+            percentile_cont(0.99) WITHIN GROUP (ORDER BY api_duration_seconds) AS api_p99
+        FROM base
+        GROUP BY 1, 2, 3
+    )
+    INSERT INTO elucide.processing_rollups (
+        granularity, bucket_start, model_version, status,
+        job_count, duration_sum, api_count, api_duration_sum,
+        duration_p50, duration_p95, duration_p99, api_p50, api_p95, api_p99,
+        duration_histogram, api_histogram, refreshed_at
+    )
+    SELECT
+        :granularity, t.bucket_start, t.model_version, t.status,
+        t.job_count, t.duration_sum, t.api_count, t.api_duration_sum,
+        t.duration_p50, t.duration_p95, t.duration_p99, t.api_p50, t.api_p95, t.api_p99,
+        COALESCE(d.histogram, '{}'::jsonb), COALESCE(a.histogram, '{}'::jsonb), now()
+    FROM totals t
+    LEFT JOIN duration_bins d USING (bucket_start, model_version, status)
+    LEFT JOIN api_bins a USING (bucket_start, model_version, status)
+''')
+
+# Claims the rows written since the last refresh; their locks hold back rewrites until the
+# refresh commits, and a rewrite after that marks the row pending again
+CLAIM_PENDING_SQL = text('''
+    WITH claimed AS (
+        UPDATE elucide.image_processings
+        SET rollup_pending = false
+        WHERE rollup_pending AND end_time IS NOT NULL
+        RETURNING end_time
+    )
+    SELECT DISTINCT date_trunc('minute', end_time, 'UTC') FROM claimed
+''')
+
+def _bucket_start(moment: datetime, granularity: str) -> datetime:
+    moment = moment.astimezone(timezone.utc).replace(second=0, microsecond=0)
+    if granularity == "hour":
+        return moment.replace(minute=0)
+    if granularity == "day":
+        return moment.replace(hour=0, minute=0)
+    return moment
+
+def _has_rollups(db: Session, granularity: str) -> bool:
+    return db.execute(
+        text("SELECT 1 FROM elucide.processing_rollups WHERE granularity = :granularity LIMIT 1"),
+        {"granularity": granularity}
+    ).first() is not None
+
+def refresh_rollups(db: Session, now: Optional[datetime] = None) -> Dict[str, int]:
+    """Rebuild the rollup buckets that received rows since the last refresh, however late
+    those rows were written. Returns the number of buckets written per granularity."""
+    now = now or datetime.now(timezone.utc)
+    minute_cutoff = now - timedelta(days=settings.LATENCY_ROLLUP_MINUTE_RETENTION_DAYS)
+    written = {}
+    db.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": ROLLUP_LOCK_ID})
+    changed_minutes = [minute for minute, in db.execute(CLAIM_PENDING_SQL)]
+    for granularity in GRANULARITIES:
+        if _has_rollups(db, granularity):
+            buckets = sorted({_bucket_start(minute, granularity) for minute in changed_minutes})
+            if granularity == "minute":
+                buckets = [bucket for bucket in buckets if bucket >= minute_cutoff]
+            if not buckets:
+                written[granularity] = 0
+                continue
+            since = buckets[0]
+        else:
+            # First refresh: build every bucket
+            buckets = since = None
+        # Touched buckets are replaced wholesale so every row in them is reflected
+        db.execute(
+            text('''
+                DELETE FROM elucide.processing_rollups
+                WHERE granularity = :granularity
+                  AND (CAST(:buckets AS timestamptz[]) IS NULL OR bucket_start = ANY(CAST(:buckets AS timestamptz[])))
+            '''),
+            {"granularity": granularity, "buckets": buckets}
+        )
+        result = db.execute(REFRESH_ROLLUPS_SQL, {
+            "granularity": granularity,
+            "since": since,
+            "buckets": buckets,
+            "edges": LATENCY_HISTOGRAM_EDGES
+        })
+        written[granularity] = result.rowcount
+
+    # Minute buckets are only useful for recent dashboards
+    db.execute(
+        text("DELETE FROM elucide.processing_rollups WHERE granularity = 'minute' AND bucket_start < :cutoff"),
+        {"cutoff": minute_cutoff}
+    )
+    db.commit()
+    return written
+
+@celery_app.task(publish_events=False)
+def refresh_latency_rollups() -> Dict[str, int]:
+    """Periodically refresh the latency rollup table"""
+    db = SyncSessionLocal()
+    try:
+        written = refresh_rollups(db)
+        logger.info(f"Refreshed latency rollups: {written}")
+        return written
+    except Exception as e:
+        logger.error(f"Error refreshing latency rollups: {str(e)}", exc_info=True)
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def _bin_bounds(index: int) -> List[Optional[float]]:
+    """Lower and upper bound of a width_bucket bin"""
+    lower = LATENCY_HISTOGRAM_EDGES[index - 1] if index > 0 else 0.0
+    upper = LATENCY_HISTOGRAM_EDGES[index] if index < len(LATENCY_HISTOGRAM_EDGES) else None
+    return [lower, upper]
+
+def histogram_percentile(counts: Dict[int, int], quantile: float) -> Optional[float]:
+    """Approximate a percentile from merged bin counts by interpolating within the bin"""
+    total = sum(counts.values())
+    if not total:
+        return None
+    rank = quantile * total
+    seen = 0
+    for index in sorted(counts):
+        count = counts[index]
+        if seen + count >= rank:
+            lower, upper = _bin_bounds(index)
+            if upper is None:
+                # Open-ended last bin: report its lower bound
+                return lower
+            return round(lower + (upper - lower) * (rank - seen) / count, 2)
+        seen += count
+    return _bin_bounds(max(counts))[0]
+
+def _merge_histogram(target: Dict[int, int], histogram: Dict[str, int]) -> None:
+    for index, count in (histogram or {}).items():
+        target[int(index)] = target.get(int(index), 0) + count
+
+def _rollup_query(granularity: str, start: datetime, end: datetime, model_version: Optional[str], status: Optional[str]):
+    stmt = (select(ProcessingRollup)
+            .filter(ProcessingRollup.granularity == granularity)
+            .filter(ProcessingRollup.bucket_start >= start)
+            .filter(ProcessingRollup.bucket_start < end))
+    if model_version:
+        stmt = stmt.filter(ProcessingRollup.model_version == model_version)
+    if status:
+        stmt = stmt.filter(ProcessingRollup.status == status)
+    return stmt.order_by(ProcessingRollup.bucket_start, ProcessingRollup.model_version, ProcessingRollup.status)
+
+async def get_latency_series(
+    db: AsyncSession,
+    granularity: str,
+    start: datetime,
+    end: datetime,
+    model_version: Optional[str] = None,
+    status: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """Get per-bucket latency percentiles from the rollup table"""
+    result = await db.execute(_rollup_query(granularity, start, end, model_version, status))
+    return [rollup.to_dict() for rollup in result.scalars().all()]
+
+async def get_latency_histogram(
+    db: AsyncSession,
+    granularity: str,
+    start: datetime,
+    end: datetime,
+    model_version: Optional[str] = None,
+    status: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """Merge rollup histograms over a time range, per model version"""
+    result = await db.execute(_rollup_query(granularity, start, end, model_version, status))
+
+    merged: Dict[str, Dict[str, Any]] = {}
+    for rollup in result.scalars().all():
+        entry = merged.setdefault(rollup.model_version, {"job_count": 0, "duration": {}, "api_duration": {}})
+        entry["job_count"] += rollup.job_count
+        _merge_histogram(entry["duration"], rollup.duration_histogram)
+        _merge_histogram(entry["api_duration"], rollup.api_histogram)
+
+    def summarize(counts: Dict[int, int]) -> Dict[str, Any]:
+        return {
+            "count": sum(counts.values()),
+            "p50": histogram_percentile(counts, 0.5),
+            "p95": histogram_percentile(counts, 0.95),
+            "p99": histogram_percentile(counts, 0.99),
+            "bins": [
+                {"lower": _bin_bounds(index)[0], "upper": _bin_bounds(index)[1], "count": counts.get(index, 0)}
+                for index in range(len(LATENCY_HISTOGRAM_EDGES) + 1)
+            ]
+        }
+
+    return [
+        {
+            "model_version": version,
+            "job_count": entry["job_count"],
+            "duration": summarize(entry["duration"]),
+            "api_duration": summarize(entry["api_duration"])
+        }
+        for version, entry in sorted(merged.items())
+    ]
@@ -0,0 +1,253 @@
+from typing import Dict, Any, List, Optional, Callable, AsyncIterator, Tuple, TypeVar
+from collections import deque
+import asyncio
+import threading
+import time
+from app.core.config import settings
+from app.core.logging import setup_logger
+from app.core.metrics import CHAT_HEDGES, PROVIDER_CIRCUIT_OPEN
+
+# Set up logging
+logger = setup_logger("chat_hedging")
+
+T = TypeVar("T")
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+class ProviderUnavailableError(RuntimeError):
+    """Raised when every provider that could answer a chat has its circuit open"""
+
+class CircuitBreaker:
+    """Stops sending chats to a failing provider for a while, in this process.
+
+    After CHAT_BREAKER_FAILURES consecutive failures the circuit opens and
+    calls are skipped for CHAT_BREAKER_COOLDOWN_SECONDS. Then one trial call
+    is let through: success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, provider: str, failures: int = settings.CHAT_BREAKER_FAILURES, cooldown: float = settings.CHAT_BREAKER_COOLDOWN_SECONDS):
+        self.provider = provider
+        self.failures = failures
+        self.cooldown = cooldown
+        self._consecutive_failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return CLOSED
+        return HALF_OPEN if time.monotonic() - self._opened_at >= self.cooldown else OPEN
+
+    def allow(self) -> bool:
+        """Whether a call may go to the provider now; in half-open state only the first caller gets through"""
+        with self._lock:
+            state = self.state
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info(f"Circuit for {self.provider} closed")
+            self._consecutive_failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+            PROVIDER_CIRCUIT_OPEN.labels(provider=self.provider).set(0)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._consecutive_failures += 1
+            if self._trial_in_flight or self._consecutive_failures >= self.failures:
+                if self._opened_at is None or self._trial_in_flight:
+                    logger.warning(f"Circuit for {self.provider} opened after {self._consecutive_failures} failures")
+                self._opened_at = time.monotonic()
+                PROVIDER_CIRCUIT_OPEN.labels(provider=self.provider).set(1)
+            self._trial_in_flight = False
+
+    def record_cancelled(self) -> None:
+        """A call abandoned for another provider's answer tells nothing; let the next one be the trial"""
+        with self._lock:
+            self._trial_in_flight = False
+
+class TTFTTracker:
+    """Recent times to first token per model in this process, for the hedge delay"""
+
+    def __init__(self, samples: int = settings.CHAT_HEDGE_SAMPLES):
+        self.samples = samples
+        self._observed: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, model: str, seconds: float) -> None:
+        with self._lock:
+            self._observed.setdefault(model, deque(maxlen=self.samples)).append(seconds)
+
+    def quantile(self, model: str, quantile: float) -> Optional[float]:
+        with self._lock:
+            values = sorted(self._observed.get(model, ()))
+        if len(values) < settings.CHAT_HEDGE_MIN_SAMPLES:
+            return None
+        return values[min(len(values) - 1, int(quantile * len(values)))]
+
+    def models(self) -> List[str]:
+        with self._lock:
+            return list(self._observed)
+
+    def hedge_delay(self, model: str) -> float:
+        """How long to wait for a first token before hedging: the learned p95, within bounds"""
+        learned = self.quantile(model, settings.CHAT_HEDGE_QUANTILE)
+        if learned is None:
+            return settings.CHAT_HEDGE_DEFAULT_DELAY_SECONDS
+        return min(settings.CHAT_HEDGE_MAX_DELAY_SECONDS, max(settings.CHAT_HEDGE_MIN_DELAY_SECONDS, learned))
+
+class _Attempt:
+    """One provider request racing for the first chunk"""
+
+    def __init__(self, provider: str, model: str, stream: AsyncIterator[Any], reason: str):
+        self.provider = provider
+        self.model = model
+        self.stream = stream
+        self.reason = reason
+        self.started = time.perf_counter()
+        self.first_chunk: Optional[asyncio.Task] = asyncio.ensure_future(stream.__anext__())
+
+class ChatHedger:
+    """Hedged chat streams across equivalent models and providers.
+
+    A chat starts on its own model. If no token has arrived within that
+    model's learned p95 time to first token, or the request fails first, the
+    next candidate is started; whichever streams first is kept and the other
+    is cancelled. Providers whose circuit is open are skipped. Once a chunk
+    has been sent, errors are not retried elsewhere.
+    """
+
+    def __init__(self):
+        self.ttft = TTFTTracker()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, provider: str) -> CircuitBreaker:
+        breaker = self._breakers.get(provider)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(provider, CircuitBreaker(provider))
+        return breaker
+
+    async def _cancel(self, attempt: _Attempt) -> None:
+        """Stop a losing attempt and close its stream, which frees its provider slot"""
+        attempt.first_chunk.cancel()
+        await asyncio.gather(attempt.first_chunk, return_exceptions=True)
+        try:
+            await attempt.stream.aclose()
+        except Exception:
+            pass
+        self.breaker(attempt.provider).record_cancelled()
+        # Only a lower bound on this model's time to first token: it can move the
+        # p95 up when the wait already exceeded it, but a short one would pull it down
+        elapsed = time.perf_counter() - attempt.started
+        if elapsed > self.ttft.hedge_delay(attempt.model):
+            self.ttft.observe(attempt.model, elapsed)
+
+    async def stream(
+        self,
+        candidates: List[Tuple[str, str]],
+        open_stream: Callable[[str], AsyncIterator[T]],
+        on_winner: Optional[Callable[[str, str], None]] = None
+    ) -> AsyncIterator[T]:
+        """Stream from the first (provider, model) candidate that answers; open_stream(model) starts a request.
+        on_winner(provider, model) is called with the candidate whose stream is kept."""
+        pending = list(candidates)
+        primary = candidates[0][1]
+        running: List[_Attempt] = []
+        last_error: Optional[BaseException] = None
+        next_hedge_at: Optional[float] = None
+        winner: Optional[_Attempt] = None
+        first: Any = None
+        hedge_reason: Optional[str] = None
+
+        def start_next(reason: str) -> bool:
+            nonlocal next_hedge_at, hedge_reason
+            while pending:
+                provider, model = pending.pop(0)
+                if not self.breaker(provider).allow():
+                    logger.info(f"Skipping {provider} {model}: circuit open")
+                    reason = "circuit_open"
+                    continue
+                attempt = _Attempt(provider, model, open_stream(model), reason)
+                running.append(attempt)
+                if reason != "primary" and hedge_reason is None:
+                    hedge_reason = reason
+                next_hedge_at = attempt.started + self.ttft.hedge_delay(model) if pending else None
+                return True
+            next_hedge_at = None
+            return False
+
+        try:
+            start_next("primary")
+            while winner is None:
+                if not running and not start_next("error"):
+                    if last_error is not None:
+                        raise last_error
+                    raise ProviderUnavailableError(f"No provider available for {primary}: all circuits are open")
+
+                timeout = max(0.0, next_hedge_at - time.perf_counter()) if next_hedge_at is not None else None
+                done, _ = await asyncio.wait([attempt.first_chunk for attempt in running], timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Slower than this model's p95 so far: race a backup
+                    start_next("slow")
+                    continue
+
+                for attempt in [attempt for attempt in running if attempt.first_chunk in done]:
+                    running.remove(attempt)
+                    error = attempt.first_chunk.exception()
+                    if error is None or isinstance(error, StopAsyncIteration):
+                        winner, first = attempt, None if error else attempt.first_chunk.result()
+                        break
+                    logger.warning(f"Chat request to {attempt.provider} {attempt.model} failed before its first token: {str(error)}")
+                    self.breaker(attempt.provider).record_failure()
+                    last_error = error
+                if winner is None and not running:
+                    # Fail over straight away rather than waiting out the hedge delay
+                    start_next("error")
+
+            for attempt in running:
+                await self._cancel(attempt)
+            running = []
+            self.ttft.observe(winner.model, time.perf_counter() - winner.started)
+            self.breaker(winner.provider).record_success()
+            if on_winner is not None:
+                on_winner(winner.provider, winner.model)
+            if hedge_reason is not None:
+                CHAT_HEDGES.labels(
+                    model=primary,
+                    reason=hedge_reason,
+                    winner="primary" if winner.reason == "primary" else "backup"
+                ).inc()
+
+            if first is None:
+                return
+            yield first
+            try:
+                async for chunk in winner.stream:
+                    yield chunk
+            except Exception:
+                self.breaker(winner.provider).record_failure()
+                raise
+        finally:
+            # Consumer gone or the race failed: nothing may keep streaming in the background
+            for attempt in running:
+                await self._cancel(attempt)
+
+    def state(self) -> Dict[str, Any]:
+        """Circuit states and learned hedge delays in this process"""
+        return {
+            "circuits": {provider: breaker.state for provider, breaker in self._breakers.items()},
+            "hedge_delays": {model: self.ttft.hedge_delay(model) for model in self.ttft.models()}
+        }
+
+chat_hedger = ChatHedger()
@@ -1,14 +1,21 @@
 from fastapi import HTTPException
-from typing import AsyncGenerator, Dict, Any
+from typing import AsyncGenerator, Callable, Dict, Any, Optional
 import logging
+import time
 from app.core.config import settings
+from app.core.metrics import (
+    CHAT_TIME_TO_FIRST_TOKEN, CHAT_TOKENS_PER_SECOND, CHAT_STREAMED_TOKENS, record_provider_error
+)
+from app.core.tracing import tracer, record_exception
+from app.services.llm_gateway import INTERACTIVE, estimate_tokens, gateway
+from app.services.chat_hedging import chat_hedger
+from opentelemetry import trace
 
 from langchain_openai import ChatOpenAI
 from langchain_groq import ChatGroq
 from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnablePassthrough
-from langchain.memory import ConversationBufferWindowMemory
 
 logger = logging.getLogger(__name__)
 
@@ -19,41 +26,46 @@ class ChatService:
                 "name": "mixtral-8x7b-32768",
                 "context_length": 32768,
                 "streaming": True,
-                "provider": "groq"
+                "provider": "groq",
+                "fallbacks": ["llama-3.3-70b-versatile", "gpt-4o-mini"]  # Hedge and fail over to these, in order
             },
             "llama-3.3-70b-versatile": {
                 "name": "llama-3.3-70b-versatile",
                 "context_length": 8192,
                 "streaming": True,
-                "provider": "groq"
+                "provider": "groq",
+                "fallbacks": ["gpt-4o"]
             },
             "deepseek-r1-distill-llama-70b": {
                 "name": "deepseek-r1-distill-llama-70b",
                 "context_length": 8192,
                 "streaming": True,
-                "provider": "groq"
+                "provider": "groq",
+                "fallbacks": ["llama-3.3-70b-versatile", "gpt-4o"]
             },
             "gpt-4o": {
                 "name": "gpt-4o",
                 "context_length": 8192,
                 "streaming": True,
-                "provider": "openai"
+                "provider": "openai",
+                "fallbacks": ["llama-3.3-70b-versatile"]
             },
             "gpt-4o-mini": {
                 "name": "gpt-4o-mini",
                 "context_length": 4096,
                 "streaming": True,
-                "provider": "openai"
+                "provider": "openai",
+                "fallbacks": ["llama-3.3-70b-versatile"]
             },
             "agent-1": {
                 "name": "gpt-4o",  # Uses GPT-4 under the hood
                 "context_length": 8192,
                 "streaming": True,
-                "provider": "openai"
+                "provider": "openai",
+                "fallbacks": ["llama-3.3-70b-versatile"]
             }
         }
         self.models = {}
-        self.memories = {}
 
     def _get_model(self, model_name: str):
         if model_name in self.models:
@@ -70,13 +82,17 @@ class ChatService:
             model = ChatGroq(
                 model_name=model_name,
                 groq_api_key=settings.GROQ_API_KEY,
-                streaming=True
+                groq_api_base=settings.GROQ_BASE_URL,
+                streaming=True,
+                max_retries=0 if settings.PROVIDER_LIMITER_ENABLED else 2  # The provider limiter retries
             )
         elif model_config["provider"] == "openai":
             model = ChatOpenAI(
                 model_name=model_config["name"],  # Use the actual model name
                 openai_api_key=settings.OPENAI_API_KEY,
-                streaming=True
+                openai_api_base=settings.OPENAI_BASE_URL,
+                streaming=True,
+                max_retries=0 if settings.PROVIDER_LIMITER_ENABLED else 2  # The provider limiter retries
             )
         elif model_config["provider"] == "deepseek":
             # TODO: Add DeepSeek integration
@@ -93,15 +109,6 @@ class ChatService:
         self.models[model_name] = model
         return model
 
-    def _get_memory(self, thread_id: str):
-        if thread_id not in self.memories:
-            self.memories[thread_id] = ConversationBufferWindowMemory(
-                return_messages=True,
-                memory_key="chat_history",
-                k=10,  # Keep last 10 messages
-            )
-        return self.memories[thread_id]
-
     def _format_messages(self, messages: list[Dict[str, str]]):
         formatted_messages = []
         for msg in messages:
@@ -113,15 +120,32 @@ class ChatService:
                 formatted_messages.append(SystemMessage(content=msg["content"]))
         return formatted_messages
 
-    async def _combine_with_memory(self, formatted_messages: list, memory: ConversationBufferWindowMemory):
-        # Get the last user message for memory input
-        last_user_msg = next((msg for msg in reversed(formatted_messages) if isinstance(msg, HumanMessage)), None)
-        if last_user_msg:
-            # Load memory variables synchronously since the new version doesn't support async
-            history = memory.load_memory_variables({"input": last_user_msg.content})
-            chat_history = history.get("chat_history", [])
-            return chat_history + formatted_messages
-        return formatted_messages
+    def _combine_with_summary(self, formatted_messages: list, summary: Optional[str], unsummarized: Optional[list]):
+        """System messages, then the thread's rolling summary, then the stored messages it does not cover"""
+        system = [msg for msg in formatted_messages if isinstance(msg, SystemMessage)]
+        conversation = [msg for msg in formatted_messages if not isinstance(msg, SystemMessage)]
+        if summary and unsummarized is not None:
+            # The stored tail, not a slice of what the client sent, which may differ from the thread
+            conversation = self._format_messages(unsummarized)
+            system.append(SystemMessage(content=f"Summary of the earlier conversation:\n{summary}"))
+        # Bounded even while the summary is catching up
+        return system + conversation[-settings.CHAT_HISTORY_MAX_MESSAGES:]
+
+    def _open_stream(self, model: str, messages: list, max_tokens: int):
+        """Stream one model's reply through the LLM gateway"""
+        model_config = self.available_models[model]
+        chain = self._get_model(model) | StrOutputParser()
+        # Interactive lane: ahead of queued background work for the same budget, then the adaptive
+        # concurrency limit; throttled attempts are retried before the first chunk
+        return gateway.stream(
+            model_config["provider"], model_config["name"], lambda: chain.astream(messages),
+            lane=INTERACTIVE, tokens=estimate_tokens(messages, max_tokens)
+        )
+
+    def _hedge_candidates(self, model: str) -> list:
+        """The model itself, then its fallbacks, as (provider, model) pairs"""
+        models = [model] + [fallback for fallback in self.available_models[model].get("fallbacks", []) if fallback in self.available_models]
+        return [(self.available_models[name]["provider"], name) for name in models]
 
     async def stream_chat(
         self,
@@ -130,41 +154,76 @@ class ChatService:
         thread_id: str,
         temperature: float = 0.7,
         max_tokens: int = 1000,
+        summary: Optional[str] = None,
+        unsummarized: Optional[list[Dict[str, str]]] = None,
+        on_model: Optional[Callable[[str], None]] = None,
     ) -> AsyncGenerator[str, None]:
         """
-        Stream chat completions using LangChain with memory
+        Stream chat completions using LangChain, with the thread's rolling summary
+        in place of the messages it covers (`unsummarized`, the thread's stored messages after it, are sent as-is).
+        on_model is called with the model that actually answers, which is a fallback when hedging switched
         """
+        provider = self.available_models.get(model, {}).get("provider", "unknown")
+        started = time.perf_counter()
+        # Not made current: the generator is suspended between chunks
+        span = tracer.start_span("chat.stream", attributes={"chat.provider": provider, "chat.model": model})
+        span_context = trace.set_span_in_context(span)
         try:
             logger.info(f"Starting chat stream for thread {thread_id}")
-            llm = self._get_model(model)
-            formatted_messages = self._format_messages(messages)
-            memory = self._get_memory(thread_id)
-
-            # Combine memory with current messages
-            final_messages = await self._combine_with_memory(formatted_messages, memory)
+            with tracer.start_as_current_span("chat.prepare", context=span_context):
+                self._get_model(model)
+                formatted_messages = self._format_messages(messages)
+                final_messages = self._combine_with_summary(formatted_messages, summary, unsummarized)
+            span.set_attribute("chat.prompt_messages", len(final_messages))
+            span.set_attribute("chat.summarized", bool(summary))
             logger.info(f"Combined {len(final_messages)} messages for thread {thread_id}")
 
-            # Create a simple chain that just passes through the messages to the LLM
-            chain = llm | StrOutputParser()
-
-            # Stream the response and accumulate it
-            accumulated_response = ""
-            last_user_msg = messages[-1]["content"] if messages else ""
-            
-            async for chunk in chain.astream(final_messages):
-                accumulated_response += chunk
+            first_chunk_at = None
+            chunk_count = 0
+            # Metrics go to whichever provider and model answered
+            served = {"provider": provider, "model": model}
+
+            def on_winner(winner_provider: str, winner_model: str) -> None:
+                served.update(provider=winner_provider, model=winner_model)
+                span.set_attribute("chat.served_model", winner_model)
+                if on_model:
+                    on_model(winner_model)
+
+            if settings.CHAT_HEDGING_ENABLED:
+                # Races a fallback model when the first token is later than usual or the request fails
+                stream = chat_hedger.stream(
+                    self._hedge_candidates(model),
+                    lambda name: self._open_stream(name, final_messages, max_tokens),
+                    on_winner=on_winner
+                )
+            else:
+                on_winner(provider, model)
+                stream = self._open_stream(model, final_messages, max_tokens)
+            async for chunk in stream:
+                if first_chunk_at is None:
+                    first_chunk_at = time.perf_counter()
+                    CHAT_TIME_TO_FIRST_TOKEN.labels(**served).observe(first_chunk_at - started)
+                    span.add_event("first_token")
+                chunk_count += 1
                 yield chunk
 
-            # Save to memory after completion
-            memory.save_context(
-                {"input": last_user_msg},
-                {"output": accumulated_response}
-            )
-            logger.info(f"Saved context to memory for thread {thread_id}")
+            # Streaming chunks are roughly one token each
+            span.set_attribute("chat.chunks", chunk_count)
+            if first_chunk_at is not None:
+                span.set_attribute("chat.time_to_first_token_seconds", round(first_chunk_at - started, 3))
+                CHAT_STREAMED_TOKENS.labels(**served).inc(chunk_count)
+                streaming_seconds = time.perf_counter() - first_chunk_at
+                if chunk_count > 1 and streaming_seconds > 0:
+                    CHAT_TOKENS_PER_SECOND.labels(**served).observe((chunk_count - 1) / streaming_seconds)
 
         except Exception as e:
             logger.error(f"Error in stream_chat: {str(e)}")
+            if not isinstance(e, HTTPException):
+                record_provider_error(provider, "chat", e)
+            record_exception(span, e)
             raise HTTPException(status_code=500, detail=str(e))
+        finally:
+            span.end()
 
     def get_available_models(self) -> Dict[str, Any]:
         """
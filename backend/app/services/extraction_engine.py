@@ -0,0 +1,220 @@
+from firecrawl import FirecrawlApp
+from typing import List, Dict, Any, Optional, Callable
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed
+import contextvars
+import hashlib
+import json
+import threading
+import time
+from app.core.config import settings
+from app.core.redis_client import get_redis
+from app.core.logging import setup_logger
+from app.core.metrics import record_provider_error
+from app.core.tracing import tracer
+
+# Set up logging
+logger = setup_logger("extraction_engine")
+
+CACHE_PREFIX = "extraction:result"
+LOCK_PREFIX = "extraction:lock"
+
+def make_cache_key(url: str, prompt: Optional[str], schema: Optional[Dict[str, Any]], enable_web_search: bool) -> str:
+    """Build the cache key for one URL from (url, prompt, schema hash)"""
+    schema_hash = hashlib.sha256(json.dumps(schema or {}, sort_keys=True).encode()).hexdigest()
+    material = json.dumps({
+        "url": url,
+        "prompt": prompt or "",
+        "schema": schema_hash,
+        "web_search": enable_web_search
+    }, sort_keys=True)
+    return hashlib.sha256(material.encode()).hexdigest()
+
+class RateLimiter:
+    """Thread-safe limiter spacing calls evenly at a fixed rate"""
+
+    def __init__(self, rate_per_second: float):
+        self.interval = 1.0 / rate_per_second if rate_per_second > 0 else 0.0
+        self._next_slot = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        """Block until the next call slot is available"""
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next_slot, now)
+            self._next_slot = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+class ExtractionEngine:
+    """Extracts URLs concurrently with caching and coalescing of identical requests"""
+
+    def __init__(self, app: Optional[FirecrawlApp] = None):
+        api_key = settings.FIRECRAWL_API_KEY
+        if app is None and not api_key:
+            raise ValueError("FIRECRAWL_API_KEY environment variable is not set")
+
+        self.app = app or FirecrawlApp(api_key=api_key, api_url=settings.FIRECRAWL_API_URL)
+        self.redis = get_redis()
+        self.rate_limiter = RateLimiter(settings.EXTRACTION_RATE_LIMIT_PER_SECOND)
+        self.cache_ttl = settings.EXTRACTION_CACHE_TTL_SECONDS
+        self.lock_ttl = settings.EXTRACTION_LOCK_TTL_SECONDS
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+
+    def _get_cached(self, key: str) -> Optional[Dict[str, Any]]:
+        """Get a cached extraction result"""
+        try:
+            cached = self.redis.get(f"{CACHE_PREFIX}:{key}")
+            return json.loads(cached) if cached else None
+        except Exception as e:
+            logger.warning(f"Extraction cache read failed for {key}: {str(e)}")
+            return None
+
+    def _set_cached(self, key: str, data: Dict[str, Any]) -> None:
+        """Store an extraction result with TTL"""
+        try:
+            self.redis.set(f"{CACHE_PREFIX}:{key}", json.dumps(data), ex=self.cache_ttl)
+        except Exception as e:
+            logger.warning(f"Extraction cache write failed for {key}: {str(e)}")
+
+    def _acquire_lock(self, key: str) -> bool:
+        """Claim the remote extraction for a key across workers"""
+        try:
+            return bool(self.redis.set(f"{LOCK_PREFIX}:{key}", "1", nx=True, ex=self.lock_ttl))
+        except Exception as e:
+            logger.warning(f"Extraction lock failed for {key}: {str(e)}")
+            return True
+
+    def _release_lock(self, key: str) -> None:
+        try:
+            self.redis.delete(f"{LOCK_PREFIX}:{key}")
+        except Exception as e:
+            logger.warning(f"Extraction lock release failed for {key}: {str(e)}")
+
+    def _wait_for_peer(self, key: str) -> Optional[Dict[str, Any]]:
+        """Wait for another worker's extraction of the same key to land in the cache.
+        Raises if the peer's lock cannot be checked."""
+        deadline = time.monotonic() + self.lock_ttl
+        while time.monotonic() < deadline:
+            cached = self._get_cached(key)
+            if cached is not None:
+                return cached
+            if not self.redis.exists(f"{LOCK_PREFIX}:{key}"):
+                # Peer finished without caching (error) or lock expired
+                return self._get_cached(key)
+            time.sleep(0.5)
+        return None
+
+    def _fetch(self, url: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Call Firecrawl for a single URL"""
+        with tracer.start_as_current_span("extraction.rate_limit"):
+            self.rate_limiter.wait()
+        with tracer.start_as_current_span("firecrawl.extract"):
+            try:
+                result = self.app.extract([url], params)
+            except Exception as e:
+                record_provider_error("firecrawl", "extract", e)
+                raise
+        return result.get("data", {}) if isinstance(result, dict) else {}
+
+    def _extract_one(self, key: str, url: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Extract a single URL, using the cache or a peer's in-flight request when possible"""
+        with tracer.start_as_current_span("extraction.url") as span:
+            span.set_attribute("extraction.url", url)
+            while True:
+                cached = self._get_cached(key)
+                if cached is not None:
+                    span.set_attribute("extraction.cached", True)
+                    return {"url": url, "data": cached, "status": "completed", "cached": True}
+
+                if self._acquire_lock(key):
+                    try:
+                        data = self._fetch(url, params)
+                        self._set_cached(key, data)
+                        span.set_attribute("extraction.cached", False)
+                        return {"url": url, "data": data, "status": "completed", "cached": False}
+                    finally:
+                        self._release_lock(key)
+
+                logger.info(f"Waiting for in-flight extraction of {url}")
+                try:
+                    with tracer.start_as_current_span("extraction.wait_for_peer"):
+                        data = self._wait_for_peer(key)
+                except Exception as e:
+                    # No way to tell whether the peer is still working; don't wait on it
+                    logger.warning(f"Lost track of in-flight extraction of {url}, fetching it directly: {str(e)}")
+                    data = self._fetch(url, params)
+                    self._set_cached(key, data)
+                    span.set_attribute("extraction.cached", False)
+                    return {"url": url, "data": data, "status": "completed", "cached": False}
+                if data is not None:
+                    span.set_attribute("extraction.cached", True)
+                    return {"url": url, "data": data, "status": "completed", "cached": True}
+
+    def _submit(self, executor: ThreadPoolExecutor, key: str, url: str, params: Dict[str, Any]) -> Future:
+        """Submit an extraction, coalescing with identical requests in this process"""
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future
+            # Run in a copy of the caller's context so spans join the task's trace
+            future = executor.submit(contextvars.copy_context().run, self._extract_one, key, url, params)
+            self._inflight[key] = future
+        # Registered outside the lock since it runs inline if the future already finished
+        future.add_done_callback(lambda done: self._forget(key, done))
+        return future
+
+    def _forget(self, key: str, future: Future) -> None:
+        with self._inflight_lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def extract(
+        self,
+        urls: List[str],
+        prompt: Optional[str] = None,
+        schema: Optional[Dict[str, Any]] = None,
+        enable_web_search: bool = False,
+        on_result: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> List[Dict[str, Any]]:
+        """Extract all URLs concurrently, reporting each result as it completes"""
+        params: Dict[str, Any] = {'enableWebSearch': enable_web_search}
+        if prompt:
+            params['prompt'] = prompt
+        if schema:
+            params['schema'] = schema
+
+        results: Dict[str, Dict[str, Any]] = {}
+        unique_urls = list(dict.fromkeys(urls))
+        max_workers = max(1, min(settings.EXTRACTION_MAX_CONCURRENCY, len(unique_urls)))
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                self._submit(executor, make_cache_key(url, prompt, schema, enable_web_search), url, params): url
+                for url in unique_urls
+            }
+            for future in as_completed(futures):
+                url = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"Extraction failed for {url}: {str(e)}")
+                    result = {"url": url, "data": {}, "status": "error", "error": str(e)}
+                results[url] = result
+                if on_result:
+                    on_result(result)
+
+        return [results[url] for url in unique_urls]
+
+_engine: Optional[ExtractionEngine] = None
+
+def get_extraction_engine() -> ExtractionEngine:
+    """Get the per-process extraction engine"""
+    global _engine
+    if _engine is None:
+        _engine = ExtractionEngine()
+    return _engine
@@ -1,11 +1,9 @@
-from firecrawl import FirecrawlApp
 from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
 from app.core.celery_app import celery_app
-from app.core.config import settings
 from app.core.logging import setup_logger
-from sqlalchemy.orm import Session
-from app.core.config import get_sync_db
+from app.core.tracing import tracer
+from app.services.extraction_engine import get_extraction_engine
 
 # Set up logging
 logger = setup_logger("extraction_service")
@@ -16,6 +14,19 @@ class ExtractResult(BaseModel):
     data: Dict[str, Any]
     status: str
     error: Optional[str] = None
+    cached: bool = False
+
+def merge_extractions(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Merge per-URL data into one object, as a single Firecrawl call over all URLs returns it.
+    Lists are concatenated; otherwise the first URL with a value wins."""
+    merged: Dict[str, Any] = {}
+    for result in results:
+        for field, value in (result.get('data') or {}).items():
+            if isinstance(merged.get(field), list) and isinstance(value, list):
+                merged[field] = merged[field] + value
+            elif merged.get(field) in (None, "", [], {}):
+                merged[field] = value
+    return merged
 
 @celery_app.task(bind=True)
 def extract_data(
@@ -30,9 +41,8 @@ def extract_data(
     Extract data from URLs using Firecrawl
     """
     job_id = self.request.id
-    
-    # Initialize database session
-    db = next(get_sync_db())
+    # Repeated URLs are extracted once
+    total = len(dict.fromkeys(urls))
     
     try:
         logger.info(f"Starting extraction for job {job_id}")
@@ -41,43 +51,56 @@ def extract_data(
         self.update_state(state='PROGRESS', meta={
             'status': 'processing',
             'job_id': job_id,
-            'urls': urls
+            'urls': urls,
+            'completed': 0,
+            'total': total,
+            'results': []
         })
         
-        # Initialize Firecrawl client
-        api_key = settings.FIRECRAWL_API_KEY
-        if not api_key:
-            raise ValueError("FIRECRAWL_API_KEY environment variable is not set")
-        
-        app = FirecrawlApp(api_key=api_key)
-        
-        # Prepare extraction parameters
-        extract_params = {
-            'enableWebSearch': enable_web_search
-        }
-        
-        if prompt:
-            extract_params['prompt'] = prompt
-        if schema:
-            extract_params['schema'] = schema
-            
+        if not prompt and not schema:
+            raise ValueError("Either prompt or schema is required")
+
+        engine = get_extraction_engine()
+        partial_results: List[Dict[str, Any]] = []
+
+        def report_progress(result: Dict[str, Any]) -> None:
+            """Stream each finished URL into the task's PROGRESS meta"""
+            partial_results.append(ExtractResult(**result).model_dump())
+            self.update_state(state='PROGRESS', meta={
+                'status': 'processing',
+                'job_id': job_id,
+                'urls': urls,
+                'completed': len(partial_results),
+                'total': total,
+                'results': partial_results
+            })
+
         # Perform extraction
-        result = app.extract(urls, extract_params)
+        with tracer.start_as_current_span("extraction.extract") as span:
+            span.set_attribute("extraction.url_count", len(urls))
+            results = engine.extract(
+                urls,
+                prompt=prompt,
+                schema=schema,
+                enable_web_search=enable_web_search,
+                on_result=report_progress
+            )
+        results = [ExtractResult(**result).model_dump() for result in results]
         
         logger.info(f"Extraction completed for job {job_id}")
         
         return {
             'status': 'completed',
             'job_id': job_id,
-            'data': result.get('data', {}),
+            'data': merge_extractions(results),
+            'data_by_url': {result['url']: result['data'] for result in results},
+            'results': results,
             'urls': urls
         }
         
     except Exception as e:
         logger.error(f"Error in extraction job {job_id}: {str(e)}")
         raise
-    finally:
-        db.close()
 
 def create_extraction_schema(schema_dict: Dict[str, Any]) -> Dict[str, Any]:
     """Helper function to create a Pydantic schema for extraction"""
@@ -85,4 +108,4 @@ def create_extraction_schema(schema_dict: Dict[str, Any]) -> Dict[str, Any]:
         'type': 'object',
         'properties': schema_dict,
         'required': list(schema_dict.keys())
-    } 
\ No newline at end of file
+    } 
@@ -0,0 +1,276 @@
+from typing import Dict, Any, List, Optional, Callable, Tuple
+import json
+import time
+import uuid
+from celery.signals import task_prerun, task_postrun
+from app.core.celery_app import celery_app
+from app.core.config import settings
+from app.core.job_backend import send_job
+from app.core.logging import setup_logger
+from app.core.metrics import FAIR_QUEUE_WAIT_SECONDS
+from app.core.redis_client import get_redis
+
+# Set up logging
+logger = setup_logger("fair_queue")
+
+# Queues keep their state under fair:<name>:
+#   ring               users with pending jobs, visited round-robin
+#   users              set mirroring the ring, so a user is only added once
+#   pending:<user>     the user's jobs, as "job_id \t queued_at \t payload"
+#   inflight:<user>    dispatched job IDs scored by dispatch time
+#   job:<job_id>       "user \t queued_at" while the job is leased
+#   waits:<user>       recent queue waits, newest first
+
+# KEYS: ring, users, pending. ARGV: user, entry
+SUBMIT_SCRIPT = r"""
+redis.call('RPUSH', KEYS[3], ARGV[2])
+if redis.call('SADD', KEYS[2], ARGV[1]) == 1 then
+    redis.call('RPUSH', KEYS[1], ARGV[1])
+end
+return redis.call('LLEN', KEYS[3])
+"""
+
+# Pops up to ARGV[5] jobs, visiting users round-robin and skipping those at their
+# in-flight cap; stops after a full turn of the ring dispatches nothing.
+# Leases older than ARGV[4] seconds are reclaimed on the way.
+# KEYS: ring, users. ARGV: prefix, now, cap, lease, limit
+DISPATCH_SCRIPT = r"""
+local prefix, now = ARGV[1], tonumber(ARGV[2])
+local cap, lease, limit = tonumber(ARGV[3]), tonumber(ARGV[4]), tonumber(ARGV[5])
+local jobs = {}
+local users = redis.call('LLEN', KEYS[1])
+local idle = 0
+while #jobs < limit and users > 0 and idle < users do
+    local user = redis.call('RPOPLPUSH', KEYS[1], KEYS[1])
+    local pending = prefix .. 'pending:' .. user
+    local inflight = prefix .. 'inflight:' .. user
+    redis.call('ZREMRANGEBYSCORE', inflight, '-inf', now - lease)
+    if redis.call('ZCARD', inflight) >= cap then
+        idle = idle + 1
+    else
+        local entry = redis.call('LPOP', pending)
+        if entry then
+            local job_id, queued_at = string.match(entry, '^([^\t]*)\t([^\t]*)\t')
+            redis.call('ZADD', inflight, now, job_id)
+            redis.call('EXPIRE', inflight, lease)
+            redis.call('SET', prefix .. 'job:' .. job_id, user .. '\t' .. queued_at, 'EX', lease)
+            jobs[#jobs + 1] = entry
+            idle = 0
+        end
+        if redis.call('LLEN', pending) == 0 then
+            -- The user was just rotated to the head of the ring
+            redis.call('LPOP', KEYS[1])
+            redis.call('SREM', KEYS[2], user)
+            users = users - 1
+        end
+    end
+end
+return jobs
+"""
+
+# Puts an undelivered job back at the front of its user's queue.
+# KEYS: ring, users, pending, inflight, job. ARGV: user, entry, job_id
+REQUEUE_SCRIPT = r"""
+redis.call('LPUSH', KEYS[3], ARGV[2])
+if redis.call('SADD', KEYS[2], ARGV[1]) == 1 then
+    redis.call('RPUSH', KEYS[1], ARGV[1])
+end
+redis.call('ZREM', KEYS[4], ARGV[3])
+redis.call('DEL', KEYS[5])
+return 1
+"""
+
+def _percentile(values: List[float], quantile: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(quantile * len(values)))]
+
+class FairQueue:
+    """Per-user queues in Redis in front of a Celery task.
+
+    Jobs wait in their user's queue and are handed to Celery round-robin
+    across users, with at most max_in_flight of a user's jobs sent at a time,
+    so one user's bulk submission cannot push other users' jobs back. A slot
+    is freed when the task finishes, or after lease_seconds if it never does.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        task_name: str,
+        max_in_flight: int = settings.FAIR_QUEUE_MAX_IN_FLIGHT_PER_USER,
+        lease_seconds: int = settings.FAIR_QUEUE_LEASE_SECONDS,
+        send: Optional[Callable[[str, List[Any], Dict[str, Any]], None]] = None
+    ):
+        self.name = name
+        self.task_name = task_name
+        self.max_in_flight = max_in_flight
+        self.lease_seconds = lease_seconds
+        self.prefix = f"fair:{name}:"
+        self.send = send or self._send_task
+        self._scripts = None
+
+    def _send_task(self, job_id: str, args: List[Any], kwargs: Dict[str, Any]) -> None:
+        send_job(self.task_name, args, kwargs, task_id=job_id)
+
+    def _key(self, *parts: str) -> str:
+        return self.prefix + ":".join(parts)
+
+    @property
+    def scripts(self):
+        if self._scripts is None:
+            redis = get_redis()
+            self._scripts = (
+                redis.register_script(SUBMIT_SCRIPT),
+                redis.register_script(DISPATCH_SCRIPT),
+                redis.register_script(REQUEUE_SCRIPT)
+            )
+        return self._scripts
+
+    def submit(self, user_id: str, args: List[Any], kwargs: Optional[Dict[str, Any]] = None, job_id: Optional[str] = None) -> str:
+        """Queue a job for the user and return its job ID, which becomes the Celery task ID"""
+        job_id = job_id or str(uuid.uuid4())
+        kwargs = kwargs or {}
+        if not settings.FAIR_QUEUE_ENABLED:
+            self.send(job_id, args, kwargs)
+            return job_id
+
+        entry = f"{job_id}\t{time.time()}\t{json.dumps({'args': args, 'kwargs': kwargs})}"
+        submit_script = self.scripts[0]
+        try:
+            submit_script(keys=[self._key("ring"), self._key("users"), self._key("pending", user_id)], args=[user_id, entry])
+        except Exception as e:
+            # Fairness is lost rather than the job
+            logger.warning(f"Fair queue {self.name} unavailable, sending job {job_id} directly: {str(e)}")
+            self.send(job_id, args, kwargs)
+            return job_id
+        try:
+            self.dispatch()
+        except Exception as e:
+            # The job stays queued for the periodic dispatch
+            logger.warning(f"Fair queue {self.name} dispatch failed after queueing job {job_id}: {str(e)}")
+        return job_id
+
+    def dispatch(self, batch_size: int = settings.FAIR_QUEUE_DISPATCH_BATCH_SIZE) -> int:
+        """Send as many queued jobs to Celery as the per-user caps allow; returns how many were sent"""
+        dispatch_script = self.scripts[1]
+        sent = 0
+        while True:
+            entries = dispatch_script(
+                keys=[self._key("ring"), self._key("users")],
+                args=[self.prefix, time.time(), self.max_in_flight, self.lease_seconds, batch_size]
+            )
+            for index, entry in enumerate(entries):
+                job_id, _, payload = entry.split("\t", 2)
+                job = json.loads(payload)
+                try:
+                    self.send(job_id, job["args"], job["kwargs"])
+                except Exception as e:
+                    # The broker is likely down; put back everything not yet sent and let a later dispatch retry
+                    logger.error(f"Failed to send job {job_id} from fair queue {self.name}: {str(e)}")
+                    for unsent in reversed(entries[index:]):
+                        self._requeue(unsent)
+                    return sent
+                sent += 1
+            if len(entries) < batch_size:
+                return sent
+
+    def _requeue(self, entry: str) -> None:
+        """Return a dispatched but unsent job to the front of its user's queue"""
+        job_id = entry.split("\t", 1)[0]
+        user_id, _ = self._owner(job_id)
+        if user_id is None:
+            return
+        requeue_script = self.scripts[2]
+        requeue_script(
+            keys=[
+                self._key("ring"), self._key("users"), self._key("pending", user_id),
+                self._key("inflight", user_id), self._key("job", job_id)
+            ],
+            args=[user_id, entry, job_id]
+        )
+
+    def _owner(self, job_id: str) -> Tuple[Optional[str], Optional[float]]:
+        """The user and submit time of a leased job"""
+        value = get_redis().get(self._key("job", job_id))
+        if not value:
+            return None, None
+        user_id, _, queued_at = value.rpartition("\t")
+        return user_id, float(queued_at)
+
+    def started(self, job_id: str) -> None:
+        """Record how long a job waited between submission and a worker picking it up"""
+        user_id, queued_at = self._owner(job_id)
+        if user_id is None:
+            return
+        wait = max(0.0, time.time() - queued_at)
+        FAIR_QUEUE_WAIT_SECONDS.labels(queue=self.name).observe(wait)
+        waits = self._key("waits", user_id)
+        with get_redis().pipeline(transaction=False) as pipe:
+            pipe.lpush(waits, round(wait, 3))
+            pipe.ltrim(waits, 0, settings.FAIR_QUEUE_WAIT_SAMPLES - 1)
+            pipe.expire(waits, 24 * 60 * 60)
+            pipe.execute()
+
+    def finished(self, job_id: str) -> None:
+        """Free the job's in-flight slot and dispatch whatever it unblocks"""
+        user_id, _ = self._owner(job_id)
+        if user_id is None:
+            return
+        with get_redis().pipeline(transaction=False) as pipe:
+            pipe.zrem(self._key("inflight", user_id), job_id)
+            pipe.delete(self._key("job", job_id))
+            pipe.execute()
+        self.dispatch()
+
+    def user_stats(self, user_id: str) -> Dict[str, Any]:
+        """Queue depth, in-flight jobs and recent queue wait percentiles for one user"""
+        with get_redis().pipeline(transaction=False) as pipe:
+            pipe.llen(self._key("pending", user_id))
+            pipe.zcount(self._key("inflight", user_id), time.time() - self.lease_seconds, "+inf")
+            pipe.lrange(self._key("waits", user_id), 0, -1)
+            pending, in_flight, waits = pipe.execute()
+        waits = [float(wait) for wait in waits]
+        return {
+            "queue": self.name,
+            "pending": pending,
+            "in_flight": in_flight,
+            "max_in_flight": self.max_in_flight,
+            "wait_seconds": {
+                "samples": len(waits),
+                "p50": _percentile(waits, 0.5),
+                "p95": _percentile(waits, 0.95),
+                "max": max(waits) if waits else None
+            }
+        }
+
+analysis_queue = FairQueue("analysis", "app.services.image_service.analyze_image")
+
+# Fair queues by the task they feed
+FAIR_QUEUES = {queue.task_name: queue for queue in (analysis_queue,)}
+
+@task_prerun.connect
+def _record_fair_queue_wait(task_id=None, task=None, **kwargs):
+    queue = FAIR_QUEUES.get(getattr(task, "name", None))
+    if queue is None:
+        return
+    try:
+        queue.started(task_id)
+    except Exception as e:
+        logger.warning(f"Failed to record queue wait for job {task_id}: {str(e)}")
+
+@task_postrun.connect
+def _release_fair_queue_slot(task_id=None, task=None, **kwargs):
+    queue = FAIR_QUEUES.get(getattr(task, "name", None))
+    if queue is None:
+        return
+    try:
+        queue.finished(task_id)
+    except Exception as e:
+        logger.warning(f"Failed to release fair queue slot for job {task_id}: {str(e)}")
+
+@celery_app.task(publish_events=False)
+def dispatch_fair_queues() -> Dict[str, int]:
+    """Periodically reclaim expired leases and dispatch jobs they were holding back"""
+    return {queue.name: queue.dispatch() for queue in FAIR_QUEUES.values()}
@@ -1,16 +1,20 @@
-from openai import OpenAI
 import os
-import base64
-from typing import Dict, Any
-import httpx
+import asyncio
+from typing import Dict, Any, List, Optional, Callable, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
 from app.core.celery_app import celery_app
-from app.services.stats_service import sync_stats
+from app.services.stats_service import JobTimer, job_metrics
+from app.services.analysis_cache import analysis_cache
+from app.services.vision_client import VisionClient, get_vision_client
 from app.db.repositories.sync_storage import SyncStorageManager
 from sqlalchemy.orm import Session
-from app.core.config import settings, get_sync_db
-from app.utils.helpers import is_valid_image
+from app.core.config import settings
+from app.db.session import task_session
+from app.utils.helpers import is_valid_image, compute_content_hash, compute_file_hash
 from app.core.logging import setup_logger
-from app.db.models.image import ImageProcessing, Image
+from app.core.tracing import tracer
+from app.db.models.image import Image
 import uuid
 from google.cloud import storage
 from datetime import timedelta
@@ -18,269 +22,499 @@ from datetime import timedelta
 # Set up logging
 logger = setup_logger("image_service")
 
+
+def _get_bucket() -> storage.Bucket:
+    """Create a GCS client and return the configured bucket"""
+    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = str(settings.GOOGLE_APPLICATION_CREDENTIALS)
+    gcs_client = storage.Client()
+    return gcs_client.bucket(settings.GCS_BUCKET_NAME)
+
+
+def _download_image_bytes(bucket: storage.Bucket, storage_path: str) -> bytes:
+    """Download an image from GCS into memory"""
+    return bucket.blob(storage_path).download_as_bytes()
+
+
+def _record_failure(db: Session, timer: JobTimer, job_id: str) -> None:
+    """Persist a failed job's timing without masking the original error"""
+    try:
+        db.rollback()
+        if timer.user_id:
+            timer.finish(db, status="error")
+    except Exception as e:
+        logger.error(f"Failed to record error stats for job {job_id}: {str(e)}")
+    finally:
+        # Never leave the timer behind, even when nothing was recorded
+        (timer.metrics or job_metrics).discard(job_id)
+
+
+def describe_image(
+    db: Session,
+    image: Image,
+    prompt: str,
+    timer: JobTimer,
+    load_bytes: Callable[[], bytes]
+) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """Describe an image with the prompt, loading its bytes only on an analysis cache miss.
+    Returns the description and the cache entry it came from, if any."""
+    # Short-circuit the vision call when these bytes were analyzed with this prompt before
+    cached = None
+    if image.content_hash:
+        with tracer.start_as_current_span("analysis_cache.get") as span:
+            cached = analysis_cache.get(db, image.content_hash, prompt, settings.VISION_MODEL)
+            span.set_attribute("cache.hit", bool(cached))
+    
+    if cached:
+        logger.info(f"Using cached analysis for image {image.id}")
+        return cached["description"], cached
+    
+    image_bytes = load_bytes()
+    if not image.content_hash:
+        # Backfill the hash for images uploaded before hashing existed
+        image.content_hash = compute_content_hash(image_bytes)
+        db.query(Image).filter_by(id=image.id).update({"content_hash": image.content_hash})
+    # Hand the connection back to the pool while the provider answers
+    db.commit()
+    
+    # Call OpenAI Vision API with user's prompt on the process-wide pooled client
+    with timer.span("api"):
+        description = get_vision_client().analyze(prompt, image_bytes)
+    
+    with tracer.start_as_current_span("analysis_cache.put"):
+        analysis_cache.put(
+            db,
+            image.content_hash,
+            prompt,
+            settings.VISION_MODEL,
+            description,
+            timer.span_seconds("api")
+        )
+    return description, None
+
+
 @celery_app.task(bind=True)
 def upload_image(self, image_path: str, filename: str, user_id: str) -> Dict[str, Any]:
     job_id = self.request.id  # Get the Celery task ID
     
-    # Initialize database session
-    db = next(get_sync_db())  # Use sync session for Celery task
-    storage_manager = SyncStorageManager(db)  # Use sync storage manager
-    
-    try:
-        # Start timing
-        sync_stats.start_processing(db, job_id, user_id)
-        logger.info(f"Starting image upload for job {job_id}")
-        
-        # Update initial state
-        self.update_state(state='PROGRESS', meta={
-            'status': 'processing',
-            'job_id': job_id,
-            'filename': filename
-        })
-        
-        # Verify the image exists
-        if not os.path.exists(image_path):
-            raise FileNotFoundError(f"Image file not found: {image_path}")
+    # Task-scoped session from this worker process's connection pool
+    with task_session() as db:
+        storage_manager = SyncStorageManager(db)  # Use sync storage manager
         
-        # Validate image
-        if not is_valid_image(image_path):
-            raise ValueError(f"Invalid or corrupted image file: {filename}")
-            
         try:
-            # Generate GCS key first
-            image_id = uuid.uuid4()
-            gcs_key = f"users/{user_id}/images/{image_id}/{filename}"
+            # Start timing in memory; the job row is written once when it ends
+            timer = job_metrics.start(job_id, user_id)
+            logger.info(f"Starting image upload for job {job_id}")
+            
+            # Update initial state
+            self.update_state(state='PROGRESS', meta={
+                'status': 'processing',
+                'job_id': job_id,
+                'filename': filename
+            })
+            
+            with tracer.start_as_current_span("upload.validate"):
+                # Verify the image exists
+                if not os.path.exists(image_path):
+                    raise FileNotFoundError(f"Image file not found: {image_path}")
+                
+                # Validate image
+                if not is_valid_image(image_path):
+                    raise ValueError(f"Invalid or corrupted image file: {filename}")
+                
+            try:
+                with tracer.start_as_current_span("upload.hash"):
+                    content_hash = compute_file_hash(image_path)
+                
+                # Upload to GCS and create the database record, reusing identical content
+                with tracer.start_as_current_span("upload.store") as span:
+                    image, created = storage_manager.store_image_file(
+                        image_path,
+                        filename,
+                        user_id,
+                        content_hash,
+                        object_name=filename
+                    )
+                    span.set_attribute("upload.duplicate", not created)
+                if created:
+                    logger.info(f"Created database record for image {image.id}")
+                else:
+                    logger.info(f"Duplicate upload, reusing image {image.id}")
+                
+                # Get the public URL
+                public_url = f"https://storage.googleapis.com/elucide/{image.storage_path}"
+                logger.info(f"Image available at public URL: {public_url}")
+                
+                # Get processing stats
+                processing_stats = timer.finish(db, status="completed", image_id=image.id)
+                
+                # Get complete image data and include public URL
+                with tracer.start_as_current_span("db.load_result"):
+                    result = storage_manager.get_image_with_analysis(image.id)
+                result.update({
+                    "status": "completed",
+                    "job_id": job_id,
+                    "stats": processing_stats,
+                    "error": None,
+                    "public_url": public_url,  # Include the public URL in the response
+                    "duplicate": not created
+                })
+                
+                logger.info(f"Successfully uploaded and stored image {image.id}")
+                
+                # Update final state
+                self.update_state(state='SUCCESS', meta=result)
+                return result
+                
+            finally:
+                # Always clean up the temporary file
+                try:
+                    if os.path.exists(image_path):
+                        os.remove(image_path)
+                        logger.info(f"Cleaned up temporary file: {image_path}")
+                except Exception as e:
+                    logger.error(f"Failed to clean up temporary file {image_path}: {str(e)}")
+                    
+        except Exception as e:
+            error_msg = f"Error uploading image: {str(e)}"
+            logger.error(f"Error in job {job_id}: {error_msg}", exc_info=True)
+            
+            # Record error in stats
+            _record_failure(db, timer, job_id)
             
-            # Initialize GCS client and upload
-            os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = str(settings.GOOGLE_APPLICATION_CREDENTIALS)
-            gcs_client = storage.Client()
-            bucket = gcs_client.bucket(settings.GCS_BUCKET_NAME)
-            blob = bucket.blob(gcs_key)
+            # Clean up the temporary file on error
+            try:
+                if os.path.exists(image_path):
+                    os.remove(image_path)
+                    logger.info(f"Cleaned up temporary file after error: {image_path}")
+            except Exception as cleanup_error:
+                logger.error(f"Failed to clean up temporary file {image_path}: {str(cleanup_error)}")
+                
+            error_result = {
+                "status": "error",
+                "job_id": job_id,
+                "filename": filename,
+                "error": error_msg,
+                "exc_type": type(e).__name__,
+                "exc_message": str(e),
+                "exc_module": e.__class__.__module__
+            }
             
-            # Set blob metadata and upload
-            blob.content_type = "image/jpeg"
-            blob.cache_control = "public, max-age=31536000"  # Cache for 1 year
+            # Update error state with proper exception info
+            self.update_state(state='FAILURE', meta=error_result)
+            return error_result
+
+
+@celery_app.task(bind=True)
+def analyze_image(self, image_id: str, prompt: str, user_id: Optional[str] = None) -> Dict[str, Any]:
+    job_id = self.request.id  # Get the Celery task ID
+    
+    # Task-scoped session from this worker process's connection pool
+    with task_session() as db:
+        storage_manager = SyncStorageManager(db)  # Use sync storage manager
+        
+        # Start timing in memory; the job row is written once when it ends
+        timer = job_metrics.start(job_id, user_id)
+        
+        try:
+            logger.info(f"Starting image analysis for job {job_id}")
             
-            # Upload the file with public read access
-            blob.upload_from_filename(image_path, predefined_acl='publicRead')
+            # Update initial state
+            self.update_state(state='PROGRESS', meta={
+                'status': 'processing',
+                'job_id': job_id,
+                'image_id': image_id
+            })
             
-            # Make sure the blob is public
-            blob.make_public()
+            # Get the image from the database
+            with tracer.start_as_current_span("db.load_image"):
+                image = db.query(Image).filter_by(id=image_id).first()
+            if not image:
+                raise ValueError(f"Image not found with ID: {image_id}")
+            timer.user_id = timer.user_id or image.user_id
+                
+            # Get the image data from GCS, unless the analysis cache answers first
+            def load_bytes() -> bytes:
+                with tracer.start_as_current_span("gcs.download") as span:
+                    image_bytes = _download_image_bytes(_get_bucket(), image.storage_path)
+                    span.set_attribute("image.bytes", len(image_bytes))
+                return image_bytes
             
-            # Get the public URL
-            public_url = f"https://storage.googleapis.com/elucide/{gcs_key}"
-            logger.info(f"Image available at public URL: {public_url}")
+            description, cached = describe_image(db, image, prompt, timer, load_bytes)
             
-            # Create database record with GCS key
-            image = Image(
-                id=image_id,
-                filename=filename,
-                storage_path=gcs_key,
-                user_id=user_id
+            # Write the processing record with timing and analysis results in one statement
+            processing_stats = timer.finish(
+                db,
+                status="completed",
+                image_id=image_id,
+                description=description,
+                model_version=settings.VISION_MODEL,  # Current model version
+                cache_hit=bool(cached),
+                saved_api_seconds=cached["api_duration_seconds"] if cached else None
             )
-            db.add(image)
-            db.commit()
-            db.refresh(image)
-            logger.info(f"Created database record for image {image.id}")
-            
-            # Get processing stats
-            processing_stats = sync_stats.end_processing(db, job_id, status="completed", image_id=image.id)
             
-            # Get complete image data and include public URL
-            result = storage_manager.get_image_with_analysis(image.id)
+            # Get complete image data
+            with tracer.start_as_current_span("db.load_result"):
+                result = storage_manager.get_image_with_analysis(image_id)
             result.update({
                 "status": "completed",
                 "job_id": job_id,
                 "stats": processing_stats,
                 "error": None,
-                "public_url": public_url  # Include the public URL in the response
+                "processing_details": {
+                    "description": description,
+                    "model_version": settings.VISION_MODEL,
+                    "cache_hit": bool(cached)
+                }
             })
             
-            logger.info(f"Successfully uploaded and stored image {image.id}")
+            logger.info(f"Successfully analyzed image {image_id}")
             
             # Update final state
             self.update_state(state='SUCCESS', meta=result)
             return result
+                    
+        except Exception as e:
+            error_msg = f"Error analyzing image: {str(e)}"
+            logger.error(f"Error in job {job_id}: {error_msg}", exc_info=True)
             
-        finally:
-            # Always clean up the temporary file
-            try:
-                if os.path.exists(image_path):
-                    os.remove(image_path)
-                    logger.info(f"Cleaned up temporary file: {image_path}")
-            except Exception as e:
-                logger.error(f"Failed to clean up temporary file {image_path}: {str(e)}")
+            # Record error in stats
+            _record_failure(db, timer, job_id)
                 
-    except Exception as e:
-        error_msg = f"Error uploading image: {str(e)}"
-        logger.error(f"Error in job {job_id}: {error_msg}", exc_info=True)
-        
-        # Record error in stats
-        sync_stats.end_processing(db, job_id, status="error")
-        
-        # Clean up the temporary file on error
-        try:
-            if os.path.exists(image_path):
-                os.remove(image_path)
-                logger.info(f"Cleaned up temporary file after error: {image_path}")
-        except Exception as cleanup_error:
-            logger.error(f"Failed to clean up temporary file {image_path}: {str(cleanup_error)}")
+            error_result = {
+                "status": "error",
+                "job_id": job_id,
+                "image_id": image_id,
+                "error": error_msg,
+                "exc_type": type(e).__name__,
+                "exc_message": str(e),
+                "exc_module": e.__class__.__module__
+            }
             
-        error_result = {
-            "status": "error",
-            "job_id": job_id,
-            "filename": filename,
-            "error": error_msg,
-            "exc_type": type(e).__name__,
-            "exc_message": str(e),
-            "exc_module": e.__class__.__module__
-        }
-        
-        # Update error state with proper exception info
-        self.update_state(state='FAILURE', meta=error_result)
-        return error_result
-    finally:
-        # Always close the database session
-        db.close()
+            # Update error state with proper exception info
+            self.update_state(state='FAILURE', meta=error_result)
+            return error_result
+
+
+def _new_batch_item(image: Image) -> Dict[str, Any]:
+    return {
+        "image_id": str(image.id),
+        "start_time": datetime.now(timezone.utc),
+        "api_start_time": None,
+        "api_end_time": None,
+        "description": None,
+        "content_hash": image.content_hash,
+        "cache_hit": False,
+        "saved_api_seconds": None,
+        "error": None
+    }
+
+
+def _analyze_batch_item(bucket: storage.Bucket, vision_client: VisionClient, image: Image, prompt: str) -> Dict[str, Any]:
+    """Download and analyze a single image of a batch, capturing timing and errors"""
+    item = _new_batch_item(image)
+    try:
+        image_bytes = _download_image_bytes(bucket, image.storage_path)
+        if not item["content_hash"]:
+            item["content_hash"] = compute_content_hash(image_bytes)
+        item["api_start_time"] = datetime.now(timezone.utc)
+        item["description"] = vision_client.analyze(prompt, image_bytes)
+        item["api_end_time"] = datetime.now(timezone.utc)
+        item["status"] = "completed"
+    except Exception as e:
+        logger.error(f"Error analyzing image {image.id} in batch: {str(e)}")
+        item["status"] = "error"
+        item["error"] = str(e)
+    item["end_time"] = datetime.now(timezone.utc)
+    return item
+
+
+async def _analyze_batch_item_async(bucket: storage.Bucket, vision_client: VisionClient, image: Image, prompt: str) -> Dict[str, Any]:
+    """_analyze_batch_item as a coroutine on the vision client's loop; only the download takes a thread"""
+    item = _new_batch_item(image)
+    try:
+        image_bytes = await asyncio.to_thread(_download_image_bytes, bucket, image.storage_path)
+        if not item["content_hash"]:
+            item["content_hash"] = compute_content_hash(image_bytes)
+        item["api_start_time"] = datetime.now(timezone.utc)
+        item["description"] = await vision_client.analyze_async(prompt, image_bytes)
+        item["api_end_time"] = datetime.now(timezone.utc)
+        item["status"] = "completed"
+    except Exception as e:
+        logger.error(f"Error analyzing image {image.id} in batch: {str(e)}")
+        item["status"] = "error"
+        item["error"] = str(e)
+    item["end_time"] = datetime.now(timezone.utc)
+    return item
+
+
+def _cached_batch_item(image: Image, cached: Dict[str, Any]) -> Dict[str, Any]:
+    """Build a completed batch item from a cached analysis"""
+    now = datetime.now(timezone.utc)
+    return {
+        "image_id": str(image.id),
+        "start_time": now,
+        "end_time": now,
+        "api_start_time": None,
+        "api_end_time": None,
+        "description": cached["description"],
+        "content_hash": image.content_hash,
+        "cache_hit": True,
+        "saved_api_seconds": cached["api_duration_seconds"],
+        "status": "completed",
+        "error": None
+    }
+
+
+def _build_batch_processing(job_id: str, user_id: str, item: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the image_processings row for one batch item"""
+    api_duration = None
+    if item["api_start_time"] and item["api_end_time"]:
+        api_duration = round((item["api_end_time"] - item["api_start_time"]).total_seconds(), 2)
+    return {
+        "job_id": f"{job_id}:{item['image_id']}",
+        "user_id": user_id,
+        "image_id": uuid.UUID(item["image_id"]),
+        "status": item["status"],
+        "model_version": settings.VISION_MODEL,
+        "description": item["description"],
+        "start_time": item["start_time"],
+        "end_time": item["end_time"],
+        "duration_seconds": round((item["end_time"] - item["start_time"]).total_seconds(), 2),
+        "api_start_time": item["api_start_time"],
+        "api_end_time": item["api_end_time"],
+        "api_duration_seconds": api_duration,
+        "cache_hit": item["cache_hit"],
+        "saved_api_seconds": item["saved_api_seconds"]
+    }
+
 
 @celery_app.task(bind=True)
-def analyze_image(self, image_id: str, prompt: str) -> Dict[str, Any]:
+def analyze_images_batch(self, image_ids: List[str], prompt: str, user_id: str) -> Dict[str, Any]:
+    """Analyze many images with one prompt, sharing clients and writing all results at once"""
     job_id = self.request.id  # Get the Celery task ID
+    total = len(image_ids)
     
-    # Initialize database session
-    db = next(get_sync_db())  # Use sync session for Celery task
-    storage_manager = SyncStorageManager(db)  # Use sync storage manager
-    
-    try:
-        # Start timing
-        sync_stats.start_processing(db, job_id, None)  # No user_id needed for analysis
-        logger.info(f"Starting image analysis for job {job_id}")
-        
-        # Update initial state
-        self.update_state(state='PROGRESS', meta={
-            'status': 'processing',
-            'job_id': job_id,
-            'image_id': image_id
-        })
-        
-        # Get the image from the database
-        image = db.query(Image).filter_by(id=image_id).first()
-        if not image:
-            raise ValueError(f"Image not found with ID: {image_id}")
-            
-        # Get the image data from GCS
-        os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = str(settings.GOOGLE_APPLICATION_CREDENTIALS)
-        gcs_client = storage.Client()
-        bucket = gcs_client.bucket(settings.GCS_BUCKET_NAME)
-        blob = bucket.blob(image.storage_path)
-        
-        # Download the image to a temporary file
-        temp_path = f"/tmp/{image.filename}"
-        blob.download_to_filename(temp_path)
+    # Task-scoped session from this worker process's connection pool
+    with task_session() as db:
         
         try:
-            # Read and encode the image
-            with open(temp_path, "rb") as image_file:
-                base64_image = base64.b64encode(image_file.read()).decode('utf-8')
+            logger.info(f"Starting batch analysis of {total} images for job {job_id}")
             
-            # Start timing API call
-            sync_stats.start_api_call(db, job_id)
+            progress = {
+                "status": "processing",
+                "job_id": job_id,
+                "total": total,
+                "completed": 0,
+                "failed": 0,
+                "results": []
+            }
+            self.update_state(state='PROGRESS', meta=progress)
             
-            # Create OpenAI client with synchronous HTTP client
-            with httpx.Client() as http_client:
-                client = OpenAI(
-                    api_key=settings.OPENAI_API_KEY,
-                    http_client=http_client,
-                    base_url="https://api.openai.com/v1"
-                )
-                # Call OpenAI Vision API with user's prompt
-                response = client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": [
-                                {"type": "text", "text": prompt},
-                                {
-                                    "type": "image_url",
-                                    "image_url": {
-                                        "url": f"data:image/jpeg;base64,{base64_image}",
-                                        "detail": "low"
-                                    }
-                                }
-                            ]
-                        }
-                    ],
-                    max_tokens=500
-                )
-                
-                # End timing API call
-                sync_stats.end_api_call(db, job_id)
-                
-                # Extract the response content
-                description = response.choices[0].message.content if response and response.choices else "No description available"
-                
-                # Update the processing record with analysis results
-                processing = ImageProcessing(
-                    job_id=job_id,
-                    image_id=image_id,
-                    description=description,
-                    model_version="gpt-4o-mini"  # Current model version
-                )
-                db.add(processing)
-                db.commit()
-                
-                # Get processing stats
-                processing_stats = sync_stats.end_processing(db, job_id, status="completed", image_id=image_id)
-                
-                # Get complete image data
-                result = storage_manager.get_image_with_analysis(image_id)
-                result.update({
-                    "status": "completed",
-                    "job_id": job_id,
-                    "stats": processing_stats,
-                    "error": None,
-                    "processing_details": {
-                        "description": description,
-                        "model_version": "gpt-4o-mini"
-                    }
+            images = db.query(Image).filter(Image.id.in_(image_ids), Image.user_id == user_id).all()
+            found_ids = {str(image.id) for image in images}
+            for image_id in image_ids:
+                if image_id not in found_ids:
+                    progress["failed"] += 1
+                    progress["results"].append({
+                        "image_id": image_id,
+                        "status": "error",
+                        "description": None,
+                        "cache_hit": False,
+                        "error": "Image not found"
+                    })
+            
+            items: List[Dict[str, Any]] = []
+            
+            def record(item: Dict[str, Any]) -> None:
+                """Add a finished item to the batch and publish progress"""
+                items.append(item)
+                if item["status"] == "completed":
+                    progress["completed"] += 1
+                else:
+                    progress["failed"] += 1
+                progress["results"].append({
+                    "image_id": item["image_id"],
+                    "status": item["status"],
+                    "description": item["description"],
+                    "cache_hit": item["cache_hit"],
+                    "error": item["error"]
                 })
-                
-                logger.info(f"Successfully analyzed image {image_id}")
-                
-                # Update final state
-                self.update_state(state='SUCCESS', meta=result)
-                return result
-                
-        finally:
-            # Always clean up the temporary file
-            try:
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
-                    logger.info(f"Cleaned up temporary file: {temp_path}")
-            except Exception as e:
-                logger.error(f"Failed to clean up temporary file {temp_path}: {str(e)}")
-                
-    except Exception as e:
-        error_msg = f"Error analyzing image: {str(e)}"
-        logger.error(f"Error in job {job_id}: {error_msg}", exc_info=True)
-        
-        # Record error in stats
-        sync_stats.end_processing(db, job_id, status="error")
+                self.update_state(state='PROGRESS', meta=progress)
             
-        error_result = {
-            "status": "error",
-            "job_id": job_id,
-            "image_id": image_id,
-            "error": error_msg,
-            "exc_type": type(e).__name__,
-            "exc_message": str(e),
-            "exc_module": e.__class__.__module__
-        }
-        
-        # Update error state with proper exception info
-        self.update_state(state='FAILURE', meta=error_result)
-        return error_result
-    finally:
-        # Always close the database session
-        db.close() 
\ No newline at end of file
+            # Serve repeated (content, prompt, model) combinations from the analysis cache
+            pending: List[Image] = []
+            for image in images:
+                cached = None
+                if image.content_hash:
+                    cached = analysis_cache.get(db, image.content_hash, prompt, settings.VISION_MODEL)
+                if cached:
+                    record(_cached_batch_item(image, cached))
+                else:
+                    pending.append(image)
+            
+            # One GCS client and the pooled vision client shared by every image in the batch
+            if pending:
+                bucket = _get_bucket()
+                vision_client = get_vision_client()
+                max_workers = max(1, min(settings.VISION_MAX_CONCURRENCY, len(pending)))
+                if vision_client.mode == "async":
+                    # Coroutines gathered on the client's loop rather than a thread per image
+                    for item in vision_client.run_many(
+                        [_analyze_batch_item_async(bucket, vision_client, image, prompt) for image in pending],
+                        limit=max_workers
+                    ):
+                        record(item)
+                else:
+                    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                        futures = [
+                            executor.submit(_analyze_batch_item, bucket, vision_client, image, prompt)
+                            for image in pending
+                        ]
+                        for future in as_completed(futures):
+                            record(future.result())
+            
+            # Backfill content hashes and populate the analysis cache with fresh results
+            images_by_id = {str(image.id): image for image in images}
+            fresh_results = []
+            for item in items:
+                image = images_by_id[item["image_id"]]
+                if item["content_hash"] and not image.content_hash:
+                    image.content_hash = item["content_hash"]
+                if item["status"] == "completed" and not item["cache_hit"]:
+                    fresh_results.append((
+                        item["content_hash"],
+                        item["description"],
+                        round((item["api_end_time"] - item["api_start_time"]).total_seconds(), 2)
+                    ))
+            analysis_cache.put_many(db, prompt, settings.VISION_MODEL, fresh_results)
+            db.commit()
+            
+            # Hand all processing records to the stats sink in a single batch
+            job_metrics.record([_build_batch_processing(job_id, user_id, item) for item in items], db)
+            
+            result = {**progress, "status": "completed", "error": None}
+            
+            logger.info(f"Batch job {job_id} finished: {result['completed']} completed, {result['failed']} failed")
+            
+            # Update final state
+            self.update_state(state='SUCCESS', meta=result)
+            return result
+            
+        except Exception as e:
+            error_msg = f"Error analyzing image batch: {str(e)}"
+            logger.error(f"Error in job {job_id}: {error_msg}", exc_info=True)
+            db.rollback()
+            
+            error_result = {
+                "status": "error",
+                "job_id": job_id,
+                "image_ids": image_ids,
+                "error": error_msg,
+                "exc_type": type(e).__name__,
+                "exc_message": str(e),
+                "exc_module": e.__class__.__module__
+            }
+            
+            # Update error state with proper exception info
+            self.update_state(state='FAILURE', meta=error_result)
+            return error_result
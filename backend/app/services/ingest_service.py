@@ -0,0 +1,356 @@
+from typing import Dict, Any, List, Optional, Callable
+import json
+import os
+import time
+import uuid
+from celery import chain, chord, group
+from sqlalchemy.dialects.postgresql import insert
+from app.core.celery_app import celery_app
+from app.core.config import settings, SyncSessionLocal
+from app.core.job_backend import submit_job, store_job_state
+from app.core.job_events import publish_job_event
+from app.core.logging import setup_logger
+from app.core.redis_client import get_redis, get_binary_redis
+from app.core.tracing import tracer
+from app.db.models.image import Image, ImageEmbedding
+from app.db.repositories.sync_storage import SyncStorageManager, derivatives_prefix
+from app.db.session import task_session
+from app.services.image_service import describe_image, _get_bucket, _download_image_bytes, _record_failure
+from app.services.stats_service import job_metrics
+from app.services.vision_client import get_vision_client
+from app.utils.helpers import is_valid_image, compute_content_hash, compute_perceptual_hash, make_thumbnail
+
+# Set up logging
+logger = setup_logger("ingest_service")
+
+# A workflow keeps its state under ingest:<job_id>:
+#   (hash)   filename, user_id and stage:<name> -> JSON outcome of the stage
+#   blob     the uploaded bytes, read by every stage instead of downloading the object
+INGEST_STAGES = ("upload", "derivatives", "perceptual_hash", "analysis", "embedding")
+
+# Without these the image is not usable; the other stages only add to it
+REQUIRED_STAGES = ("upload", "analysis")
+
+def _blob_key(job_id: str) -> str:
+    return f"ingest:{job_id}:blob"
+
+def stash_blob(job_id: str, data: bytes) -> Optional[str]:
+    """Share the uploaded bytes with the workflow's stages; returns the reference they pass around"""
+    if len(data) > settings.INGEST_BLOB_MAX_BYTES:
+        # Not worth the Redis memory; the stages download it from storage instead
+        return None
+    key = _blob_key(job_id)
+    try:
+        get_binary_redis().set(key, data, ex=settings.INGEST_BLOB_TTL_SECONDS)
+        return key
+    except Exception as e:
+        logger.warning(f"Failed to stash upload for job {job_id}, stages will download it: {str(e)}")
+        return None
+
+def load_blob(ref: Dict[str, Any]) -> bytes:
+    """The uploaded bytes: from Redis while the workflow runs, from storage once they have expired"""
+    if ref.get("blob_key"):
+        try:
+            data = get_binary_redis().get(ref["blob_key"])
+            if data is not None:
+                return data
+        except Exception as e:
+            logger.warning(f"Failed to read stashed upload for job {ref['job_id']}: {str(e)}")
+    with tracer.start_as_current_span("gcs.download") as span:
+        data = _download_image_bytes(_get_bucket(), ref["storage_path"])
+        span.set_attribute("image.bytes", len(data))
+    return data
+
+def release_blob(job_id: str) -> None:
+    try:
+        get_binary_redis().delete(_blob_key(job_id))
+    except Exception as e:
+        logger.warning(f"Failed to release stashed upload for job {job_id}: {str(e)}")
+
+class IngestTracker:
+    """Aggregated status of ingest workflows.
+
+    Every stage records its outcome in the workflow's Redis hash, and the
+    merged view is stored as the PROGRESS state of the workflow's job ID (the
+    ID of its final task), so GET /jobs/{job_id} and the job's event stream
+    follow the whole workflow rather than one of its tasks.
+    """
+
+    def _key(self, job_id: str) -> str:
+        return f"ingest:{job_id}"
+
+    def start(self, job_id: str, user_id: str, filename: str) -> None:
+        key = self._key(job_id)
+        fields = {f"stage:{stage}": json.dumps({"status": "pending"}) for stage in INGEST_STAGES}
+        with get_redis().pipeline() as pipe:
+            pipe.hset(key, mapping={"filename": filename, "user_id": user_id, **fields})
+            pipe.expire(key, settings.INGEST_STATE_TTL_SECONDS)
+            pipe.execute()
+
+    def record(self, job_id: str, stage: str, outcome: Dict[str, Any]) -> None:
+        """Record a stage's outcome and publish the workflow's merged status"""
+        try:
+            with get_redis().pipeline() as pipe:
+                pipe.hset(self._key(job_id), f"stage:{stage}", json.dumps(outcome, default=str))
+                pipe.hgetall(self._key(job_id))
+                _, fields = pipe.execute()
+            status = self._merge(job_id, fields)
+            store_job_state(job_id, "PROGRESS", status)
+            publish_job_event(job_id, "PROGRESS", status)
+        except Exception as e:
+            logger.warning(f"Failed to record ingest stage {stage} for job {job_id}: {str(e)}")
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        fields = get_redis().hgetall(self._key(job_id))
+        return self._merge(job_id, fields) if fields else None
+
+    def clear(self, job_id: str) -> None:
+        get_redis().delete(self._key(job_id))
+
+    def _merge(self, job_id: str, fields: Dict[str, str]) -> Dict[str, Any]:
+        stages = {
+            name.split(":", 1)[1]: json.loads(value)
+            for name, value in fields.items()
+            if name.startswith("stage:")
+        }
+        return {
+            "status": "processing",
+            "job_id": job_id,
+            "filename": fields.get("filename"),
+            "image_id": stages.get("upload", {}).get("image_id"),
+            "stages": stages
+        }
+
+ingest_tracker = IngestTracker()
+
+def _run_stage(ref: Dict[str, Any], stage: str, run: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+    """Run one stage and record its outcome; a stage whose input failed is skipped"""
+    job_id = ref["job_id"]
+    if ref.get("status") in ("error", "skipped"):
+        outcome = {"status": "skipped"}
+    else:
+        started = time.perf_counter()
+        try:
+            outcome = {"status": "completed", **run()}
+        except Exception as e:
+            logger.error(f"Ingest stage {stage} failed for job {job_id}: {str(e)}", exc_info=True)
+            outcome = {"status": "error", "error": str(e), "exc_type": type(e).__name__}
+        outcome["duration_seconds"] = round(time.perf_counter() - started, 3)
+    ingest_tracker.record(job_id, stage, outcome)
+    return {**outcome, "stage": stage, "job_id": job_id, "user_id": ref.get("user_id"), "image_id": ref.get("image_id")}
+
+@celery_app.task(bind=True, publish_events=False)
+def ingest_upload(self, job_id: str, image_path: str, filename: str, user_id: str) -> Dict[str, Any]:
+    """Store the upload once and hand the stages a reference to its bytes"""
+    ref = {"job_id": job_id, "user_id": user_id, "filename": filename}
+    started = time.perf_counter()
+    try:
+        if not os.path.exists(image_path):
+            raise FileNotFoundError(f"Image file not found: {image_path}")
+        if os.path.getsize(image_path) > settings.MAX_UPLOAD_SIZE:
+            raise ValueError(f"Image file is larger than {settings.MAX_UPLOAD_SIZE} bytes: {filename}")
+        if not is_valid_image(image_path):
+            raise ValueError(f"Invalid or corrupted image file: {filename}")
+
+        with open(image_path, "rb") as f:
+            data = f.read()
+        content_hash = compute_content_hash(data)
+        with task_session() as db:
+            image, created = SyncStorageManager(db).store_image_file(
+                image_path,
+                filename,
+                user_id,
+                content_hash,
+                object_name=filename
+            )
+            ref.update({
+                "image_id": str(image.id),
+                "storage_path": image.storage_path,
+                "content_hash": content_hash,
+                "duplicate": not created
+            })
+        ref["blob_key"] = stash_blob(job_id, data)
+        ref["status"] = "completed"
+        logger.info(f"Stored image {ref['image_id']} for ingest job {job_id}")
+    except Exception as e:
+        logger.error(f"Ingest upload failed for job {job_id}: {str(e)}", exc_info=True)
+        ref.update({"status": "error", "error": f"Error uploading image: {str(e)}", "exc_type": type(e).__name__})
+    finally:
+        try:
+            if os.path.exists(image_path):
+                os.remove(image_path)
+        except Exception as e:
+            logger.error(f"Failed to clean up temporary file {image_path}: {str(e)}")
+
+    outcome = {key: ref.get(key) for key in ("status", "image_id", "duplicate", "error") if key in ref}
+    outcome["duration_seconds"] = round(time.perf_counter() - started, 3)
+    ingest_tracker.record(job_id, "upload", outcome)
+    return ref
+
+@celery_app.task(bind=True, publish_events=False)
+def ingest_derivatives(self, ref: Dict[str, Any]) -> Dict[str, Any]:
+    """Generate the thumbnail next to the original, which it shares a lifetime with"""
+
+    def run() -> Dict[str, Any]:
+        thumbnail_path = f"{derivatives_prefix(ref['storage_path'])}thumb_{settings.INGEST_THUMBNAIL_SIZE}.jpg"
+        blob = _get_bucket().blob(thumbnail_path)
+        # Duplicate uploads of shared content already have one
+        if not blob.exists():
+            blob.cache_control = "public, max-age=31536000"
+            blob.upload_from_string(
+                make_thumbnail(load_blob(ref), settings.INGEST_THUMBNAIL_SIZE),
+                content_type="image/jpeg",
+                predefined_acl='publicRead'
+            )
+        with task_session() as db:
+            db.query(Image).filter_by(id=ref["image_id"]).update({"thumbnail_path": thumbnail_path})
+        return {"thumbnail_path": thumbnail_path}
+
+    return _run_stage(ref, "derivatives", run)
+
+@celery_app.task(bind=True, publish_events=False)
+def ingest_perceptual_hash(self, ref: Dict[str, Any]) -> Dict[str, Any]:
+    """Hash what the image looks like, for finding near-duplicates the content hash misses"""
+
+    def run() -> Dict[str, Any]:
+        perceptual_hash = compute_perceptual_hash(load_blob(ref))
+        with task_session() as db:
+            db.query(Image).filter_by(id=ref["image_id"]).update({"perceptual_hash": perceptual_hash})
+        return {"perceptual_hash": perceptual_hash}
+
+    return _run_stage(ref, "perceptual_hash", run)
+
+@celery_app.task(bind=True, publish_events=False)
+def ingest_analysis(self, ref: Dict[str, Any], prompt: str) -> Dict[str, Any]:
+    """Describe the image; timing is recorded under the workflow's job ID"""
+
+    def run() -> Dict[str, Any]:
+        job_id = ref["job_id"]
+        with task_session() as db:
+            image = db.query(Image).filter_by(id=ref["image_id"]).first()
+            if not image:
+                raise ValueError(f"Image not found with ID: {ref['image_id']}")
+
+        # The row stays readable after its session closed; describe_image only
+        # borrows a connection for the cache lookups around the vision call
+        db = SyncSessionLocal()
+        timer = job_metrics.start(job_id, ref["user_id"])
+        try:
+            description, cached = describe_image(db, image, prompt, timer, lambda: load_blob(ref))
+            processing_stats = timer.finish(
+                db,
+                status="completed",
+                image_id=image.id,
+                description=description,
+                model_version=settings.VISION_MODEL,
+                cache_hit=bool(cached),
+                saved_api_seconds=cached["api_duration_seconds"] if cached else None
+            )
+        except Exception:
+            _record_failure(db, timer, job_id)
+            raise
+        finally:
+            db.close()
+        return {
+            "description": description,
+            "model_version": settings.VISION_MODEL,
+            "cache_hit": bool(cached),
+            "stats": processing_stats
+        }
+
+    return _run_stage(ref, "analysis", run)
+
+@celery_app.task(bind=True, publish_events=False)
+def ingest_embedding(self, analysis: Dict[str, Any]) -> Dict[str, Any]:
+    """Embed the description for search, unless this text was already embedded with the model"""
+
+    def run() -> Dict[str, Any]:
+        description = analysis["description"]
+        source_hash = compute_content_hash(description.encode("utf-8"))
+        with task_session() as db:
+            existing = (
+                db.query(ImageEmbedding)
+                .filter_by(image_id=analysis["image_id"], model=settings.EMBEDDING_MODEL)
+                .first()
+            )
+            if existing and existing.source_hash == source_hash:
+                return {"model": existing.model, "dimensions": existing.dimensions, "reused": True}
+
+        # No connection is held while the provider answers
+        vector = get_vision_client().embed(description)
+        with task_session() as db:
+            stmt = insert(ImageEmbedding).values(
+                id=uuid.uuid4(),
+                image_id=analysis["image_id"],
+                model=settings.EMBEDDING_MODEL,
+                source_hash=source_hash,
+                dimensions=len(vector),
+                embedding=vector
+            ).on_conflict_do_update(
+                constraint="uq_image_embeddings_image_model",
+                set_={"source_hash": source_hash, "dimensions": len(vector), "embedding": vector}
+            )
+            db.execute(stmt)
+        return {"model": settings.EMBEDDING_MODEL, "dimensions": len(vector), "reused": False}
+
+    return _run_stage(analysis, "embedding", run)
+
+@celery_app.task(bind=True)
+def finalize_ingest(self, results: List[Dict[str, Any]], job_id: str) -> Dict[str, Any]:
+    """Merge the stage outcomes into the workflow's result and drop the shared bytes"""
+    # The tracker also holds the stages whose results were consumed within the workflow
+    stages = {result["stage"]: result for result in results if isinstance(result, dict) and "stage" in result}
+    try:
+        tracked = ingest_tracker.status(job_id)
+    except Exception as e:
+        logger.warning(f"Failed to read ingest state for job {job_id}: {str(e)}")
+        tracked = None
+    if tracked:
+        stages.update(tracked["stages"])
+    stages = {stage: stages[stage] for stage in INGEST_STAGES if stage in stages}
+    image_id = next((result.get("image_id") for result in results if result.get("image_id")), None)
+    image_id = image_id or (tracked or {}).get("image_id")
+
+    failed = [stage for stage in REQUIRED_STAGES if stages.get(stage, {}).get("status") in ("error", "skipped")]
+    result = {}
+    if image_id:
+        with task_session() as db:
+            result = SyncStorageManager(db).get_image_with_analysis(image_id) or {}
+    result.update({
+        "status": "error" if failed else "completed",
+        "job_id": job_id,
+        "stages": stages,
+        "error": "; ".join(stages[stage]["error"] for stage in failed if stages[stage].get("error")) or None
+    })
+
+    release_blob(job_id)
+    try:
+        ingest_tracker.clear(job_id)
+    except Exception as e:
+        logger.warning(f"Failed to clear ingest state for job {job_id}: {str(e)}")
+
+    if failed:
+        logger.error(f"Ingest job {job_id} failed: {result['error']}")
+        self.update_state(state='FAILURE', meta=result)
+    else:
+        logger.info(f"Ingest job {job_id} completed for image {image_id}")
+    return result
+
+def start_ingest(image_path: str, filename: str, user_id: str, prompt: Optional[str] = None) -> str:
+    """Start the ingest workflow for an uploaded file; the returned job ID reports on all of it.
+
+    upload -> (derivatives | perceptual_hash | analysis -> embedding) -> finalize
+    """
+    job_id = str(uuid.uuid4())
+    ingest_tracker.start(job_id, user_id, filename)
+    stages = group(
+        ingest_derivatives.s(),
+        ingest_perceptual_hash.s(),
+        chain(ingest_analysis.s(prompt or settings.INGEST_DEFAULT_PROMPT), ingest_embedding.s())
+    )
+    workflow = chain(
+        ingest_upload.si(job_id, image_path, filename, user_id),
+        chord(stages, finalize_ingest.s(job_id).set(task_id=job_id))
+    )
+    submit_job(workflow, task_id=job_id)
+    return job_id
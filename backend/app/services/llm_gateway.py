@@ -0,0 +1,365 @@
+from typing import Dict, Any, List, Optional, Callable, Awaitable, AsyncIterator, Tuple, TypeVar
+import asyncio
+import random
+import threading
+import time
+import uuid
+from app.core.config import settings
+from app.core.logging import setup_logger
+from app.core.metrics import LLM_GATEWAY_QUEUE_DEPTH, LLM_GATEWAY_WAIT_SECONDS, LLM_GATEWAY_TOKENS
+from app.core.redis_client import get_redis
+from app.services.provider_limiter import ProviderBusyError, get_provider_limiter
+
+# Set up logging
+logger = setup_logger("llm_gateway")
+
+T = TypeVar("T")
+
+# interactive: a user is waiting on the answer (chat streams)
+# background:  jobs (analysis, embeddings, extraction, summaries); yields to interactive calls
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+LANES = (INTERACTIVE, BACKGROUND)
+
+# Queued callers re-register on every poll; entries of crashed processes expire after this
+WAITER_TTL_SECONDS = 5
+
+# Tokens a low-detail image costs in a vision prompt
+IMAGE_TOKENS = 85
+
+# Request and token buckets refilled continuously over a minute.
+# KEYS: bucket, interactive waiters, own lane waiters, own lane waits.
+# ARGV: now, waiter, lane, rpm, tpm, tokens, reserve, waiter_ttl, waited, wait_samples
+# Returns {1, 0} when admitted, else {0, seconds until the budgets could allow the call}
+ADMIT_SCRIPT = r"""
+local now = tonumber(ARGV[1])
+local rpm, tpm = tonumber(ARGV[4]), tonumber(ARGV[5])
+local background = ARGV[3] == 'background'
+local reserve = background and tonumber(ARGV[7]) or 0
+local tokens = tonumber(ARGV[6])
+if tpm > 0 then
+    tokens = math.min(tokens, tpm * (1 - reserve))
+end
+local state = redis.call('HMGET', KEYS[1], 'requests', 'tokens', 'updated_at')
+local elapsed = math.max(0, now - (tonumber(state[3]) or now))
+local requests = math.min(rpm, (tonumber(state[1]) or rpm) + elapsed * rpm / 60)
+local token_level = math.min(tpm, (tonumber(state[2]) or tpm) + elapsed * tpm / 60)
+
+local wait = 0
+if rpm > 0 then
+    wait = math.max(wait, (1 + reserve * rpm - requests) * 60 / rpm)
+end
+if tpm > 0 then
+    wait = math.max(wait, (tokens + reserve * tpm - token_level) * 60 / tpm)
+end
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', now)
+if background and wait <= 0 and redis.call('ZCARD', KEYS[2]) > 0 then
+    -- Interactive calls are queued: let them take the budget first
+    wait = 0.05
+end
+
+local admitted = wait <= 0
+if admitted then
+    if rpm > 0 then
+        requests = requests - 1
+    end
+    if tpm > 0 then
+        token_level = token_level - tokens
+    end
+    redis.call('ZREM', KEYS[3], ARGV[2])
+    redis.call('LPUSH', KEYS[4], ARGV[9])
+    redis.call('LTRIM', KEYS[4], 0, tonumber(ARGV[10]) - 1)
+    redis.call('EXPIRE', KEYS[4], 86400)
+else
+    redis.call('ZADD', KEYS[3], now + tonumber(ARGV[8]), ARGV[2])
+    redis.call('EXPIRE', KEYS[3], math.ceil(tonumber(ARGV[8])))
+end
+redis.call('HSET', KEYS[1], 'requests', tostring(requests), 'tokens', tostring(token_level), 'updated_at', tostring(now))
+redis.call('EXPIRE', KEYS[1], 120)
+return {admitted and 1 or 0, tostring(math.max(wait, 0))}
+"""
+
+def _parse_model_limits(value: str) -> Dict[Tuple[str, str], Tuple[int, int]]:
+    """Parse "openai:gpt-4o=500/30000,groq:llama-3.3-70b-versatile=30/6000" into (rpm, tpm) per provider and model"""
+    limits = {}
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        try:
+            name, budget = entry.split("=")
+            provider, model = name.split(":", 1)
+            rpm, tpm = budget.split("/")
+            limits[(provider.strip(), model.strip())] = (int(rpm), int(tpm))
+        except ValueError:
+            raise ValueError(f"Invalid LLM_MODEL_RATE_LIMITS entry: {entry}. Expected provider:model=rpm/tpm")
+    return limits
+
+MODEL_RATE_LIMITS = _parse_model_limits(settings.LLM_MODEL_RATE_LIMITS)
+
+PROVIDER_RATE_LIMITS = {
+    "openai": (settings.OPENAI_REQUESTS_PER_MINUTE, settings.OPENAI_TOKENS_PER_MINUTE),
+    "groq": (settings.GROQ_REQUESTS_PER_MINUTE, settings.GROQ_TOKENS_PER_MINUTE)
+}
+
+def rate_limits(provider: str, model: str) -> Tuple[int, int]:
+    """Requests and tokens per minute allowed for a provider and model; 0 means unlimited"""
+    return MODEL_RATE_LIMITS.get((provider, model)) or PROVIDER_RATE_LIMITS.get(provider, (0, 0))
+
+def lane_timeout(lane: str) -> float:
+    """Longest a call in this lane waits for budget, and then again for a concurrency slot"""
+    return settings.LLM_INTERACTIVE_QUEUE_TIMEOUT_SECONDS if lane == INTERACTIVE else settings.PROVIDER_QUEUE_TIMEOUT_SECONDS
+
+def _content_tokens(content: Any) -> int:
+    if isinstance(content, str):
+        return len(content) // 4
+    tokens = 0
+    for part in content or []:
+        if isinstance(part, dict) and part.get("type") == "image_url":
+            tokens += IMAGE_TOKENS
+        elif isinstance(part, dict):
+            tokens += len(part.get("text") or "") // 4
+        else:
+            tokens += len(str(part)) // 4
+    return tokens
+
+def estimate_tokens(messages: List[Any], max_tokens: int = 0) -> int:
+    """Tokens a call counts against the provider's budget: the prompt, roughly, plus max_tokens,
+    which providers reserve up front. Takes OpenAI-style dicts or LangChain messages."""
+    prompt = 0
+    for message in messages:
+        content = message.get("content") if isinstance(message, dict) else getattr(message, "content", "")
+        prompt += 4 + _content_tokens(content)
+    return prompt + max_tokens
+
+def _percentile(values: List[float], quantile: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(quantile * len(values)))]
+
+class RateBudget:
+    """Requests- and tokens-per-minute buckets for one provider and model, shared through Redis.
+
+    Calls take one request and their estimated tokens from the buckets, or
+    queue until the buckets refill. Background calls leave the last
+    LLM_BACKGROUND_RESERVE of each budget to interactive calls and hold back
+    while any interactive call is queued, so a backlog of jobs never sits in
+    front of a user's chat.
+    """
+
+    def __init__(self, provider: str, model: str, rpm: int, tpm: int):
+        self.provider = provider
+        self.model = model
+        self.rpm = rpm
+        self.tpm = tpm
+        self.key = f"gateway:{provider}:{model}"
+        self._script = None
+        self._depth = {lane: 0 for lane in LANES}
+        self._depth_lock = threading.Lock()
+
+    @property
+    def script(self):
+        if self._script is None:
+            self._script = get_redis().register_script(ADMIT_SCRIPT)
+        return self._script
+
+    def _waiters_key(self, lane: str) -> str:
+        return f"{self.key}:waiting:{lane}"
+
+    def _waits_key(self, lane: str) -> str:
+        return f"{self.key}:waits:{lane}"
+
+    def _try_admit(self, waiter: str, lane: str, tokens: int, waited: float) -> Tuple[bool, float]:
+        admitted, wait = self.script(
+            keys=[self.key, self._waiters_key(INTERACTIVE), self._waiters_key(lane), self._waits_key(lane)],
+            args=[
+                time.time(), waiter, lane, self.rpm, self.tpm, tokens, settings.LLM_BACKGROUND_RESERVE,
+                WAITER_TTL_SECONDS, round(waited, 3), settings.LLM_GATEWAY_WAIT_SAMPLES
+            ]
+        )
+        return bool(admitted), float(wait)
+
+    def _queued(self, lane: str, delta: int) -> None:
+        with self._depth_lock:
+            self._depth[lane] += delta
+            LLM_GATEWAY_QUEUE_DEPTH.labels(provider=self.provider, model=self.model, lane=lane).set(self._depth[lane])
+
+    def _poll_delay(self, wait: float) -> float:
+        # Jittered so queued callers do not all retry at the same instant
+        return min(max(wait, 0.02), 1.0) * random.uniform(0.5, 1.0)
+
+    def _admitted(self, lane: str, tokens: int, started: float) -> None:
+        LLM_GATEWAY_WAIT_SECONDS.labels(provider=self.provider, model=self.model, lane=lane).observe(time.monotonic() - started)
+        LLM_GATEWAY_TOKENS.labels(provider=self.provider, model=self.model, lane=lane).inc(tokens)
+
+    def _give_up(self, waiter: str, lane: str) -> None:
+        try:
+            get_redis().zrem(self._waiters_key(lane), waiter)
+        except Exception:
+            pass
+        raise ProviderBusyError(f"Timed out queueing for the {self.provider} {self.model} {lane} budget")
+
+    def admit(self, lane: str, tokens: int) -> None:
+        """Block until the budgets allow the call"""
+        waiter = uuid.uuid4().hex
+        started = time.monotonic()
+        self._queued(lane, 1)
+        try:
+            while True:
+                waited = time.monotonic() - started
+                try:
+                    admitted, wait = self._try_admit(waiter, lane, tokens, waited)
+                except Exception as e:
+                    # Calls go out unbudgeted rather than not at all
+                    logger.warning(f"LLM gateway budget {self.key} unavailable: {str(e)}")
+                    return
+                if admitted:
+                    self._admitted(lane, tokens, started)
+                    return
+                if waited > lane_timeout(lane):
+                    self._give_up(waiter, lane)
+                time.sleep(self._poll_delay(wait))
+        finally:
+            self._queued(lane, -1)
+
+    async def admit_async(self, lane: str, tokens: int) -> None:
+        """admit() for coroutines; Redis round trips run in a thread"""
+        waiter = uuid.uuid4().hex
+        started = time.monotonic()
+        self._queued(lane, 1)
+        try:
+            while True:
+                waited = time.monotonic() - started
+                try:
+                    admitted, wait = await asyncio.to_thread(self._try_admit, waiter, lane, tokens, waited)
+                except Exception as e:
+                    logger.warning(f"LLM gateway budget {self.key} unavailable: {str(e)}")
+                    return
+                if admitted:
+                    self._admitted(lane, tokens, started)
+                    return
+                if waited > lane_timeout(lane):
+                    await asyncio.to_thread(self._give_up, waiter, lane)
+                await asyncio.sleep(self._poll_delay(wait))
+        finally:
+            self._queued(lane, -1)
+
+    def state(self) -> Dict[str, Any]:
+        """Budget levels, queued calls and recent queue waits per lane, across all processes"""
+        redis = get_redis()
+        now = time.time()
+        with redis.pipeline(transaction=False) as pipe:
+            pipe.hmget(self.key, "requests", "tokens", "updated_at")
+            for lane in LANES:
+                pipe.zcount(self._waiters_key(lane), now, "+inf")
+                pipe.lrange(self._waits_key(lane), 0, -1)
+            results = pipe.execute()
+        requests, tokens, updated_at = results[0]
+        elapsed = max(0.0, now - float(updated_at)) if updated_at else 0.0
+        lanes = {}
+        for index, lane in enumerate(LANES):
+            queued, waits = results[1 + 2 * index], [float(wait) for wait in results[2 + 2 * index]]
+            lanes[lane] = {
+                "queued": queued,
+                "wait_seconds": {
+                    "samples": len(waits),
+                    "p50": _percentile(waits, 0.5),
+                    "p95": _percentile(waits, 0.95),
+                    "max": max(waits) if waits else None
+                }
+            }
+        return {
+            "provider": self.provider,
+            "model": self.model,
+            "requests_per_minute": self.rpm,
+            "tokens_per_minute": self.tpm,
+            "requests_available": min(self.rpm, float(requests) + elapsed * self.rpm / 60) if requests else self.rpm,
+            "tokens_available": min(self.tpm, float(tokens) + elapsed * self.tpm / 60) if tokens else self.tpm,
+            "lanes": lanes
+        }
+
+class LLMGateway:
+    """The one way out to the LLM providers for chat, analysis, embeddings and summaries.
+
+    Each call is admitted by its provider and model's rate budget, in its
+    lane, and then runs within the adaptive concurrency limit, which retries
+    throttled attempts. Disabled (LLM_GATEWAY_ENABLED=false), calls only go
+    through the concurrency limit. Retries after a throttle response are
+    admitted again, as every attempt counts against the provider's limits,
+    and the lane's queue timeout applies to the slot wait as well.
+    """
+
+    def __init__(self):
+        self._budgets: Dict[Tuple[str, str], RateBudget] = {}
+        self._lock = threading.Lock()
+
+    def budget(self, provider: str, model: str) -> Optional[RateBudget]:
+        """The shared budget for a provider and model; None when neither requests nor tokens are limited"""
+        key = (provider, model)
+        budget = self._budgets.get(key)
+        if budget is None:
+            rpm, tpm = rate_limits(provider, model)
+            if not rpm and not tpm:
+                return None
+            with self._lock:
+                budget = self._budgets.setdefault(key, RateBudget(provider, model, rpm, tpm))
+        return budget
+
+    def _check_lane(self, lane: str) -> None:
+        if lane not in LANES:
+            raise ValueError(f"Invalid LLM gateway lane: {lane}. Must be one of {', '.join(LANES)}")
+
+    def call(self, provider: str, model: str, fn: Callable[[], T], lane: str = BACKGROUND, tokens: int = 0) -> T:
+        """Run a blocking provider call once its budget allows"""
+        self._check_lane(lane)
+        budget = self.budget(provider, model) if settings.LLM_GATEWAY_ENABLED else None
+        if budget is not None:
+            budget.admit(lane, tokens)
+        return get_provider_limiter(provider, model).call(
+            fn, timeout=lane_timeout(lane),
+            before_retry=(lambda: budget.admit(lane, tokens)) if budget is not None else None
+        )
+
+    async def call_async(self, provider: str, model: str, fn: Callable[[], Awaitable[T]], lane: str = BACKGROUND, tokens: int = 0) -> T:
+        """call() for coroutines"""
+        self._check_lane(lane)
+        budget = self.budget(provider, model) if settings.LLM_GATEWAY_ENABLED else None
+        if budget is not None:
+            await budget.admit_async(lane, tokens)
+        return await get_provider_limiter(provider, model).call_async(
+            fn, timeout=lane_timeout(lane),
+            before_retry=(lambda: budget.admit_async(lane, tokens)) if budget is not None else None
+        )
+
+    async def stream(
+        self,
+        provider: str,
+        model: str,
+        open_stream: Callable[[], AsyncIterator[T]],
+        lane: str = INTERACTIVE,
+        tokens: int = 0
+    ) -> AsyncIterator[T]:
+        """Stream a provider response once its budget allows"""
+        self._check_lane(lane)
+        budget = self.budget(provider, model) if settings.LLM_GATEWAY_ENABLED else None
+        if budget is not None:
+            await budget.admit_async(lane, tokens)
+        limiter = get_provider_limiter(provider, model)
+        async for chunk in limiter.stream(
+            open_stream, timeout=lane_timeout(lane),
+            before_retry=(lambda: budget.admit_async(lane, tokens)) if budget is not None else None
+        ):
+            yield chunk
+
+    def state(self) -> List[Dict[str, Any]]:
+        """State of the background models' budgets, those configured per model, and any other this process has used"""
+        models = [
+            ("openai", settings.VISION_MODEL),
+            ("openai", settings.EMBEDDING_MODEL),
+            ("openai", settings.CHAT_SUMMARY_MODEL),
+            *MODEL_RATE_LIMITS,
+            *list(self._budgets)
+        ]
+        budgets = [self.budget(provider, model) for provider, model in dict.fromkeys(models)]
+        return [budget.state() for budget in budgets if budget is not None]
+
+gateway = LLMGateway()
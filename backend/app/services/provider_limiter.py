@@ -0,0 +1,352 @@
+from typing import Dict, Any, Optional, Callable, Awaitable, AsyncIterator, Mapping, Tuple, TypeVar
+import asyncio
+import random
+import re
+import threading
+import time
+import uuid
+from app.core.config import settings
+from app.core.logging import setup_logger
+from app.core.metrics import PROVIDER_CONCURRENCY_LIMIT, PROVIDER_LIMITER_WAIT_SECONDS, PROVIDER_THROTTLED
+from app.core.redis_client import get_redis
+
+# Set up logging
+logger = setup_logger("provider_limiter")
+
+T = TypeVar("T")
+
+# Responses that mean "slow down" rather than "this request is wrong"
+THROTTLE_STATUSES = (429, 503)
+
+# KEYS: state, leases. ARGV: now, token, lease_seconds, initial_limit
+# Returns {1, limit} when a slot was taken, else {0, seconds to wait if blocked}
+ACQUIRE_SCRIPT = r"""
+local now = tonumber(ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+local state = redis.call('HMGET', KEYS[1], 'limit', 'blocked_until')
+local limit = tonumber(state[1]) or tonumber(ARGV[4])
+local blocked_until = tonumber(state[2]) or 0
+if now < blocked_until then
+    return {0, tostring(blocked_until - now)}
+end
+if redis.call('ZCARD', KEYS[2]) >= math.floor(limit) then
+    return {0, '0'}
+end
+redis.call('ZADD', KEYS[2], now + tonumber(ARGV[3]), ARGV[2])
+redis.call('EXPIRE', KEYS[2], math.ceil(tonumber(ARGV[3])))
+return {1, tostring(limit)}
+"""
+
+# Additive increase on success, multiplicative decrease (at most once per window) when throttled.
+# KEYS: state, leases. ARGV: now, token, outcome, min, max, initial, factor, window, block_seconds
+RELEASE_SCRIPT = r"""
+local now = tonumber(ARGV[1])
+redis.call('ZREM', KEYS[2], ARGV[2])
+local state = redis.call('HMGET', KEYS[1], 'limit', 'last_decrease', 'blocked_until')
+local limit = tonumber(state[1]) or tonumber(ARGV[6])
+local min_limit, max_limit = tonumber(ARGV[4]), tonumber(ARGV[5])
+if ARGV[3] == 'success' then
+    limit = math.min(max_limit, limit + 1 / limit)
+elseif ARGV[3] == 'throttled' then
+    if now - (tonumber(state[2]) or 0) >= tonumber(ARGV[8]) then
+        limit = math.max(min_limit, limit * tonumber(ARGV[7]))
+        redis.call('HSET', KEYS[1], 'last_decrease', tostring(now))
+    end
+end
+local block_seconds = tonumber(ARGV[9])
+if block_seconds > 0 then
+    local blocked_until = math.max(tonumber(state[3]) or 0, now + block_seconds)
+    redis.call('HSET', KEYS[1], 'blocked_until', tostring(blocked_until))
+end
+redis.call('HSET', KEYS[1], 'limit', tostring(limit))
+redis.call('EXPIRE', KEYS[1], 86400)
+return tostring(limit)
+"""
+
+class ProviderBusyError(RuntimeError):
+    """Raised when a call waited longer than its queue timeout (PROVIDER_QUEUE_TIMEOUT_SECONDS by default) for a slot"""
+
+def _parse_duration(value: Optional[str]) -> Optional[float]:
+    """Parse provider reset durations such as "1.5", "20ms", "1s" or "6m0s" into seconds"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = re.findall(r"([\d.]+)(ms|h|m|s)", value)
+    if not parts:
+        return None
+    scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(amount) * scale[unit] for amount, unit in parts)
+
+def block_seconds_from_headers(headers: Optional[Mapping[str, str]]) -> float:
+    """How long the provider asks callers to hold off, from Retry-After or exhausted rate-limit headers"""
+    if not headers:
+        return 0.0
+    retry_after_ms = _parse_duration(headers.get("retry-after-ms"))
+    if retry_after_ms is not None:
+        return retry_after_ms / 1000
+    retry_after = _parse_duration(headers.get("retry-after"))
+    if retry_after is not None:
+        return retry_after
+    block = 0.0
+    for budget in ("requests", "tokens"):
+        remaining = headers.get(f"x-ratelimit-remaining-{budget}")
+        if remaining is not None and remaining.strip() in ("0", "0.0"):
+            block = max(block, _parse_duration(headers.get(f"x-ratelimit-reset-{budget}")) or 0.0)
+    return block
+
+def throttle_headers(error: Exception) -> Tuple[bool, Optional[Mapping[str, str]]]:
+    """Whether an SDK or HTTP error is a throttle response, and its headers"""
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    return status in THROTTLE_STATUSES, getattr(response, "headers", None)
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit for one provider and model, shared by every process through Redis.
+
+    Calls wait for a slot instead of failing, so a rate-limited provider means
+    slower jobs rather than failed ones. Each success raises the limit by
+    1/limit (about one slot per round of calls); a throttle response cuts it by
+    PROVIDER_LIMIT_BACKOFF_FACTOR, blocks new calls for as long as the provider
+    asks, and the call is retried with jittered exponential backoff. Leases
+    expire, so slots held by a crashed process come back.
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        model: str,
+        initial_limit: float = settings.PROVIDER_LIMIT_INITIAL,
+        min_limit: float = settings.PROVIDER_LIMIT_MIN,
+        max_limit: float = settings.PROVIDER_LIMIT_MAX
+    ):
+        self.provider = provider
+        self.model = model
+        self.initial_limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.key = f"limiter:{provider}:{model}"
+        self._scripts = None
+        # Wakes this process's waiting threads as soon as one of its calls frees a slot
+        self._slot_freed = threading.Condition()
+
+    @property
+    def scripts(self):
+        if self._scripts is None:
+            redis = get_redis()
+            self._scripts = (redis.register_script(ACQUIRE_SCRIPT), redis.register_script(RELEASE_SCRIPT))
+        return self._scripts
+
+    def _try_acquire(self, token: str) -> Tuple[bool, float]:
+        """Take a slot if one is free; otherwise return how long the provider asked to wait"""
+        acquire_script = self.scripts[0]
+        acquired, value = acquire_script(
+            keys=[self.key, f"{self.key}:leases"],
+            args=[time.time(), token, settings.PROVIDER_LEASE_SECONDS, self.initial_limit]
+        )
+        if acquired:
+            PROVIDER_CONCURRENCY_LIMIT.labels(provider=self.provider, model=self.model).set(float(value))
+            return True, 0.0
+        return False, float(value)
+
+    def _poll_delay(self, blocked_for: float) -> float:
+        # Jittered so waiting callers do not stampede a freed slot
+        return min(max(blocked_for, 0.05), 1.0) * random.uniform(0.5, 1.5)
+
+    def _release(self, token: Optional[str], outcome: str, block_seconds: float = 0.0) -> None:
+        if token is None:
+            return
+        release_script = self.scripts[1]
+        try:
+            limit = release_script(
+                keys=[self.key, f"{self.key}:leases"],
+                args=[
+                    time.time(), token, outcome, self.min_limit, self.max_limit, self.initial_limit,
+                    settings.PROVIDER_LIMIT_BACKOFF_FACTOR, settings.PROVIDER_LIMIT_DECREASE_WINDOW_SECONDS,
+                    block_seconds
+                ]
+            )
+            PROVIDER_CONCURRENCY_LIMIT.labels(provider=self.provider, model=self.model).set(float(limit))
+        except Exception as e:
+            logger.warning(f"Failed to release {self.key} slot: {str(e)}")
+        with self._slot_freed:
+            self._slot_freed.notify()
+
+    def acquire(self, timeout: Optional[float] = None) -> Optional[str]:
+        """Block until a slot is free and return its token; None when limiting is unavailable"""
+        timeout = settings.PROVIDER_QUEUE_TIMEOUT_SECONDS if timeout is None else timeout
+        token = uuid.uuid4().hex
+        started = time.monotonic()
+        while True:
+            try:
+                acquired, blocked_for = self._try_acquire(token)
+            except Exception as e:
+                # Calls go out unlimited rather than not at all
+                logger.warning(f"Provider limiter {self.key} unavailable: {str(e)}")
+                return None
+            if acquired:
+                PROVIDER_LIMITER_WAIT_SECONDS.labels(provider=self.provider, model=self.model).observe(time.monotonic() - started)
+                return token
+            if time.monotonic() - started > timeout:
+                raise ProviderBusyError(f"Timed out waiting for a {self.provider} {self.model} slot")
+            # Slots freed by other processes are only seen by polling
+            with self._slot_freed:
+                self._slot_freed.wait(self._poll_delay(blocked_for))
+
+    async def acquire_async(self, timeout: Optional[float] = None) -> Optional[str]:
+        """acquire() for coroutines; Redis round trips run in a thread"""
+        timeout = settings.PROVIDER_QUEUE_TIMEOUT_SECONDS if timeout is None else timeout
+        token = uuid.uuid4().hex
+        started = time.monotonic()
+        while True:
+            try:
+                acquired, blocked_for = await asyncio.to_thread(self._try_acquire, token)
+            except Exception as e:
+                logger.warning(f"Provider limiter {self.key} unavailable: {str(e)}")
+                return None
+            if acquired:
+                PROVIDER_LIMITER_WAIT_SECONDS.labels(provider=self.provider, model=self.model).observe(time.monotonic() - started)
+                return token
+            if time.monotonic() - started > timeout:
+                raise ProviderBusyError(f"Timed out waiting for a {self.provider} {self.model} slot")
+            await asyncio.sleep(self._poll_delay(blocked_for))
+
+    def _after_error(self, token: Optional[str], error: Exception, attempt: int) -> Optional[float]:
+        """Release a failed call's slot; returns the backoff before retrying, or None to give up"""
+        throttled, headers = throttle_headers(error)
+        if not throttled:
+            self._release(token, "error")
+            return None
+        PROVIDER_THROTTLED.labels(provider=self.provider, model=self.model).inc()
+        self._release(token, "throttled", block_seconds_from_headers(headers))
+        if attempt >= settings.PROVIDER_MAX_RETRIES:
+            return None
+        # Full jitter; the provider's own Retry-After is enforced by the acquire that follows
+        ceiling = min(settings.PROVIDER_RETRY_MAX_SECONDS, settings.PROVIDER_RETRY_BASE_SECONDS * 2 ** attempt)
+        logger.info(f"{self.provider} {self.model} throttled, retry {attempt + 1} of {settings.PROVIDER_MAX_RETRIES}")
+        return random.uniform(0, ceiling)
+
+    def call(self, fn: Callable[[], T], timeout: Optional[float] = None, before_retry: Optional[Callable[[], None]] = None) -> T:
+        """Run a provider call within the limit, retrying throttled attempts.
+
+        If the result has rate-limit headers (an SDK raw response), exhausted
+        budgets hold back other callers until they reset. Each wait for a slot
+        gives up after timeout seconds; before_retry runs ahead of every retry,
+        so a caller can charge it to its own budget.
+        """
+        attempt = 0
+        while True:
+            if attempt and before_retry is not None:
+                before_retry()
+            token = self.acquire(timeout)
+            try:
+                result = fn()
+            except Exception as e:
+                backoff = self._after_error(token, e, attempt)
+                if backoff is None:
+                    raise
+                time.sleep(backoff)
+                attempt += 1
+                continue
+            self._release(token, "success", block_seconds_from_headers(getattr(result, "headers", None)))
+            return result
+
+    async def call_async(
+        self,
+        fn: Callable[[], Awaitable[T]],
+        timeout: Optional[float] = None,
+        before_retry: Optional[Callable[[], Awaitable[None]]] = None
+    ) -> T:
+        """call() for coroutines"""
+        attempt = 0
+        while True:
+            if attempt and before_retry is not None:
+                await before_retry()
+            token = await self.acquire_async(timeout)
+            try:
+                result = await fn()
+            except Exception as e:
+                backoff = await asyncio.to_thread(self._after_error, token, e, attempt)
+                if backoff is None:
+                    raise
+                await asyncio.sleep(backoff)
+                attempt += 1
+                continue
+            await asyncio.to_thread(self._release, token, "success", block_seconds_from_headers(getattr(result, "headers", None)))
+            return result
+
+    async def stream(
+        self,
+        open_stream: Callable[[], AsyncIterator[T]],
+        timeout: Optional[float] = None,
+        before_retry: Optional[Callable[[], Awaitable[None]]] = None
+    ) -> AsyncIterator[T]:
+        """Hold a slot for the whole stream; only attempts that fail before the first chunk are retried"""
+        attempt = 0
+        while True:
+            if attempt and before_retry is not None:
+                await before_retry()
+            token = await self.acquire_async(timeout)
+            started = False
+            try:
+                async for chunk in open_stream():
+                    started = True
+                    yield chunk
+            except Exception as e:
+                if started:
+                    await asyncio.to_thread(self._release, token, "error")
+                    raise
+                backoff = await asyncio.to_thread(self._after_error, token, e, attempt)
+                if backoff is None:
+                    raise
+                await asyncio.sleep(backoff)
+                attempt += 1
+                continue
+            except BaseException:
+                # Cancelled or closed early by the consumer
+                await asyncio.to_thread(self._release, token, "error")
+                raise
+            await asyncio.to_thread(self._release, token, "success")
+            return
+
+    def state(self) -> Dict[str, Any]:
+        """Current shared limit, leases and block for this provider and model"""
+        redis = get_redis()
+        now = time.time()
+        limit, blocked_until = redis.hmget(self.key, "limit", "blocked_until")
+        return {
+            "provider": self.provider,
+            "model": self.model,
+            "limit": float(limit) if limit else self.initial_limit,
+            "in_flight": redis.zcount(f"{self.key}:leases", now, "+inf"),
+            "blocked_for": max(0.0, float(blocked_until) - now) if blocked_until else 0.0
+        }
+
+class _Unlimited:
+    """Stand-in used when PROVIDER_LIMITER_ENABLED is off: calls go straight through"""
+
+    def call(self, fn, timeout=None, before_retry=None):
+        return fn()
+
+    async def call_async(self, fn, timeout=None, before_retry=None):
+        return await fn()
+
+    async def stream(self, open_stream, timeout=None, before_retry=None):
+        async for chunk in open_stream():
+            yield chunk
+
+_limiters: Dict[Tuple[str, str], AdaptiveLimiter] = {}
+_limiters_lock = threading.Lock()
+
+def get_provider_limiter(provider: str, model: str):
+    """Get the shared limiter for a provider and model"""
+    if not settings.PROVIDER_LIMITER_ENABLED:
+        return _Unlimited()
+    key = (provider, model)
+    limiter = _limiters.get(key)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.setdefault(key, AdaptiveLimiter(provider, model))
+    return limiter
@@ -0,0 +1,40 @@
+from typing import Dict
+from collections import Counter
+from datetime import datetime, timezone
+from kombu.utils.encoding import bytes_to_str
+from sqlalchemy import delete
+from app.core.celery_app import celery_app
+from app.core.config import settings, SyncSessionLocal
+from app.core.logging import setup_logger
+from app.db.models.job import JobResult
+
+# Set up logging
+logger = setup_logger("result_service")
+
+def compact_results(batch_size: int = settings.RESULT_COMPACTION_BATCH_SIZE) -> Dict[str, int]:
+    """Apply the retention policy to every stored result and purge expired rows from job_results"""
+    backend = celery_app.backend
+    now = datetime.now(timezone.utc)
+    actions = Counter()
+    for key in backend.client.scan_iter(match=f"{bytes_to_str(backend.task_keyprefix)}*", count=batch_size):
+        try:
+            actions[backend.compact_key(key, now)] += 1
+        except Exception as e:
+            logger.warning(f"Failed to compact result {key!r}: {str(e)}")
+            actions["failed"] += 1
+
+    db = SyncSessionLocal()
+    try:
+        purged = db.execute(delete(JobResult).where(JobResult.expires_at < now))
+        db.commit()
+        actions["purged"] = purged.rowcount
+    finally:
+        db.close()
+    return dict(actions)
+
+@celery_app.task(publish_events=False)
+def compact_task_results() -> Dict[str, int]:
+    """Periodically expire and compact Celery results"""
+    actions = compact_results()
+    logger.info(f"Compacted task results: {actions}")
+    return actions
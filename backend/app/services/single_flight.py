@@ -0,0 +1,124 @@
+from typing import Optional
+from celery.signals import task_postrun
+from app.core.config import settings
+from app.core.logging import setup_logger
+from app.core.redis_client import get_redis
+from app.services.analysis_cache import hash_prompt
+
+# Set up logging
+logger = setup_logger("single_flight")
+
+ANALYZE_TASK = "app.services.image_service.analyze_image"
+
+# KEYS: flight[, idempotency]. ARGV: job_id, flight_ttl, idempotency_ttl
+# Returns the job already answering the request, {"conflict", job} when the idempotency
+# key was used for different work, or false after claiming it for ARGV[1]
+CLAIM_SCRIPT = r"""
+if KEYS[2] and redis.call('TYPE', KEYS[2]).ok == 'hash' then
+    local claimed = redis.call('HMGET', KEYS[2], 'flight', 'job')
+    if claimed[1] ~= KEYS[1] then
+        return {'conflict', claimed[2]}
+    end
+    return claimed[2]
+end
+local job_id = redis.call('GET', KEYS[1])
+if not job_id then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+end
+if KEYS[2] then
+    -- The key remembers the work it was used for, so reusing it for other work is refused
+    redis.call('DEL', KEYS[2])
+    redis.call('HSET', KEYS[2], 'flight', KEYS[1], 'job', job_id or ARGV[1])
+    redis.call('EXPIRE', KEYS[2], ARGV[3])
+end
+return job_id
+"""
+
+# Deletes each key that still points at the job. KEYS: flight[, idempotency]. ARGV: job_id
+RELEASE_SCRIPT = r"""
+local released = 0
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    released = released + redis.call('DEL', KEYS[1])
+end
+if KEYS[2] and redis.call('HGET', KEYS[2], 'job') == ARGV[1] then
+    released = released + redis.call('DEL', KEYS[2])
+end
+return released
+"""
+
+class IdempotencyKeyReusedError(ValueError):
+    """Raised when an idempotency key is sent again with a different request"""
+
+    def __init__(self, job_id: str):
+        super().__init__(f"Idempotency key was already used for a different request (job {job_id})")
+        self.job_id = job_id
+
+class SingleFlight:
+    """Collapses identical job submissions onto the one already in flight.
+
+    A flight key names the work (e.g. image, prompt and model) and points at
+    the job doing it until that job finishes. An optional client idempotency
+    key keeps pointing at its job for IDEMPOTENCY_KEY_TTL_SECONDS, finished
+    or not, and stays bound to the work it was first sent with. Both are
+    claimed in one Redis script, so concurrent API workers agree on a single
+    job.
+    """
+
+    def __init__(self, name: str, ttl: int = settings.SINGLE_FLIGHT_TTL_SECONDS):
+        self.name = name
+        self.ttl = ttl
+        self._scripts = None
+
+    @property
+    def scripts(self):
+        if self._scripts is None:
+            redis = get_redis()
+            self._scripts = (redis.register_script(CLAIM_SCRIPT), redis.register_script(RELEASE_SCRIPT))
+        return self._scripts
+
+    def flight_key(self, *parts: str) -> str:
+        return f"single-flight:{self.name}:" + ":".join(parts)
+
+    def idempotency_key(self, user_id: str, key: str) -> str:
+        return f"idempotency:{self.name}:{user_id}:{key}"
+
+    def claim(self, flight_key: str, job_id: str, idempotency_key: Optional[str] = None) -> Optional[str]:
+        """Claim the work for job_id; returns the existing job's ID instead if there is one.
+        Raises IdempotencyKeyReusedError if the idempotency key was used for other work."""
+        claim_script = self.scripts[0]
+        keys = [flight_key] + ([idempotency_key] if idempotency_key else [])
+        try:
+            existing = claim_script(keys=keys, args=[job_id, self.ttl, settings.IDEMPOTENCY_KEY_TTL_SECONDS])
+        except Exception as e:
+            # Duplicates are cheaper than refusing the request
+            logger.warning(f"Single-flight {self.name} unavailable, not deduplicating: {str(e)}")
+            return None
+        if isinstance(existing, list):
+            raise IdempotencyKeyReusedError(existing[1])
+        return existing or None
+
+    def release(self, flight_key: str, job_id: str, idempotency_key: Optional[str] = None) -> None:
+        """Let new requests for the work start a new job, if job_id still holds the flight.
+        Pass the idempotency key only when the job was never queued."""
+        release_script = self.scripts[1]
+        keys = [flight_key] + ([idempotency_key] if idempotency_key else [])
+        try:
+            release_script(keys=keys, args=[job_id])
+        except Exception as e:
+            logger.warning(f"Failed to release single-flight key {flight_key}: {str(e)}")
+
+analysis_flights = SingleFlight("analysis")
+
+def analysis_flight_key(image_id: str, prompt: str) -> str:
+    """Identical analyses share the image, the normalised prompt and the model"""
+    return analysis_flights.flight_key(settings.VISION_MODEL, str(image_id), hash_prompt(prompt))
+
+@task_postrun.connect
+def _release_analysis_flight(task_id=None, task=None, args=None, kwargs=None, **extra):
+    if getattr(task, "name", None) != ANALYZE_TASK:
+        return
+    args, kwargs = list(args or []), kwargs or {}
+    image_id = args[0] if args else kwargs.get("image_id")
+    prompt = args[1] if len(args) > 1 else kwargs.get("prompt")
+    if image_id and prompt:
+        analysis_flights.release(analysis_flight_key(image_id, prompt), task_id)
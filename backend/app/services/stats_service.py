@@ -1,220 +1,495 @@
-from typing import Dict, Any, Optional, List
-from datetime import datetime, timezone
+from typing import Dict, Any, Optional, List, Iterator
+from datetime import datetime, timezone, timedelta
+from contextlib import contextmanager
+import json
+import threading
+import time
+import uuid
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import Session
-from sqlalchemy import select
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.postgresql import insert
+from celery.signals import worker_init, worker_shutdown, worker_process_init, worker_process_shutdown
+from celery.concurrency import get_implementation
+from app.core.celery_app import celery_app
+from app.core.config import settings, SyncSessionLocal
+from app.core.redis_client import get_redis
 from app.db.models.image import ImageProcessing, Image
 from app.core.logging import setup_logger
+from app.core.tracing import tracer
 
 # Set up logging
 logger = setup_logger("stats")
 
-class ProcessingStats:
-    def __init__(self):
-        """Initialize ProcessingStats"""
-        pass
-    
-    def _get_utc_now(self) -> datetime:
-        """Get current UTC timestamp"""
-        return datetime.now(timezone.utc)
-    
-    async def start_processing(self, db: AsyncSession, job_id: str, user_id: str) -> None:
-        """Record the start of processing for a job"""
-        processing = ImageProcessing(
-            job_id=job_id,
-            user_id=user_id,
-            start_time=self._get_utc_now(),
-            status="processing"
-        )
-        db.add(processing)
-        await db.commit()
-        logger.info(f"Started processing job {job_id}")
-    
-    async def start_api_call(self, db: AsyncSession, job_id: str) -> None:
-        """Record the start of the API call"""
-        stmt = select(ImageProcessing).filter_by(job_id=job_id)
-        result = await db.execute(stmt)
-        processing = result.scalar_one_or_none()
-        if processing:
-            processing.api_start_time = self._get_utc_now()
-            await db.commit()
-            logger.info(f"Started API call for job {job_id}")
-    
-    async def end_api_call(self, db: AsyncSession, job_id: str) -> None:
-        """Record the end of the API call"""
-        stmt = select(ImageProcessing).filter_by(job_id=job_id)
-        result = await db.execute(stmt)
-        processing = result.scalar_one_or_none()
-        if processing and processing.api_start_time:
-            api_end_time = self._get_utc_now()
-            # Ensure both timestamps are timezone-aware
-            if processing.api_start_time.tzinfo is None:
-                processing.api_start_time = processing.api_start_time.replace(tzinfo=timezone.utc)
-            
-            api_duration = (api_end_time - processing.api_start_time).total_seconds()
-            
-            processing.api_end_time = api_end_time
-            processing.api_duration_seconds = round(api_duration, 2)
-            await db.commit()
-            logger.info(f"Ended API call for job {job_id}, duration: {api_duration:.2f}s")
-    
-    async def end_processing(self, db: AsyncSession, job_id: str, status: str = "completed", image_id: Optional[str] = None) -> Dict[str, Any]:
-        """Record the end of processing and return the stats"""
-        stmt = select(ImageProcessing).filter_by(job_id=job_id)
-        result = await db.execute(stmt)
-        processing = result.scalar_one_or_none()
-        if processing:
-            end_time = self._get_utc_now()
-            # Ensure both timestamps are timezone-aware
-            if processing.start_time.tzinfo is None:
-                processing.start_time = processing.start_time.replace(tzinfo=timezone.utc)
-            
-            # Calculate total duration from start to end
-            duration = (end_time - processing.start_time).total_seconds()
-            
-            processing.end_time = end_time
-            processing.duration_seconds = round(duration, 2)
-            processing.status = status
-            if image_id:
-                processing.image_id = image_id
-            
-            await db.commit()
-            logger.info(f"Completed job {job_id} in {duration:.2f}s with status {status}")
-            return processing.to_dict()
-        logger.warning(f"No processing record found for job {job_id}")
+PENDING_STATS_KEY = "stats:pending"
+ROW_DATETIME_COLUMNS = ("start_time", "end_time", "api_start_time", "api_end_time")
+ROW_UUID_COLUMNS = ("id", "image_id")
+
+class JobTimer:
+    """Collects a job's timing in process and persists it with a single upsert.
+
+    Durations come from the monotonic clock; wall-clock timestamps are derived
+    from one UTC anchor taken when the timer starts.
+    """
+
+    def __init__(self, job_id: str, user_id: Optional[str] = None, metrics: Optional["JobMetrics"] = None):
+        self.job_id = job_id
+        self.user_id = user_id
+        self.metrics = metrics
+        self._start_wall = datetime.now(timezone.utc)
+        self._start_mono = time.monotonic()
+        self._spans: Dict[str, List[Optional[float]]] = {}
+
+    def _to_wall(self, mono: Optional[float]) -> Optional[datetime]:
+        if mono is None:
+            return None
+        return self._start_wall + timedelta(seconds=mono - self._start_mono)
+
+    def start_span(self, name: str) -> None:
+        """Mark the start of a named span (e.g. "api")"""
+        self._spans[name] = [time.monotonic(), None]
+
+    def end_span(self, name: str) -> None:
+        """Mark the end of a named span"""
+        if name in self._spans:
+            self._spans[name][1] = time.monotonic()
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """Time the enclosed block as a named span"""
+        self.start_span(name)
+        try:
+            yield
+        finally:
+            self.end_span(name)
+
+    def span_seconds(self, name: str) -> Optional[float]:
+        """Get the duration of a finished span"""
+        start, end = self._spans.get(name, [None, None])
+        if start is None or end is None:
+            return None
+        return round(end - start, 2)
+
+    def values(self, status: str, image_id: Optional[str] = None, **fields: Any) -> Dict[str, Any]:
+        """Build the image_processings row for this job as of now"""
+        end_mono = time.monotonic()
+        api_start, api_end = self._spans.get("api", [None, None])
+        row = {
+            "id": uuid.uuid4(),
+            "job_id": self.job_id,
+            "user_id": self.user_id,
+            "status": status,
+            "start_time": self._start_wall,
+            "end_time": self._to_wall(end_mono),
+            "duration_seconds": round(end_mono - self._start_mono, 2),
+            "api_start_time": self._to_wall(api_start),
+            "api_end_time": self._to_wall(api_end),
+            "api_duration_seconds": self.span_seconds("api")
+        }
+        if image_id:
+            row["image_id"] = image_id
+        row.update(fields)
+        return row
+
+    def finish(self, db: Optional[Session], status: str = "completed", image_id: Optional[str] = None, **fields: Any) -> Dict[str, Any]:
+        """Hand the job's timing to the metrics sink and return the stats"""
+        return (self.metrics or job_metrics).finish(self, db, status, image_id, **fields)
+
+def persist_job_timings(db: Session, rows: List[Dict[str, Any]]) -> Dict[str, uuid.UUID]:
+    """Upsert processing rows keyed by job_id in a single statement.
+    Returns the record id for each job_id."""
+    if not rows:
         return {}
-    
-    async def get_stats(self, db: AsyncSession, job_id: str) -> Dict[str, Any]:
-        """Get stats for a job"""
-        stmt = select(ImageProcessing).filter_by(job_id=job_id)
-        result = await db.execute(stmt)
-        processing = result.scalar_one_or_none()
-        if processing:
-            return processing.to_dict()
+    # A statement may only touch each job_id once; the latest row wins
+    rows = list({row["job_id"]: row for row in rows}.values())
+    columns = set().union(*(row.keys() for row in rows)) | {"id", "rollup_pending"}
+    rows = [{column: row.get(column) for column in columns} for row in rows]
+    for row in rows:
+        row["id"] = row["id"] or uuid.uuid4()
+        # New and rewritten rows are picked up by the next latency rollup refresh
+        row["rollup_pending"] = True
+    stmt = insert(ImageProcessing).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ImageProcessing.job_id],
+        set_={column: stmt.excluded[column] for column in columns if column not in ("id", "job_id")}
+    ).returning(ImageProcessing.job_id, ImageProcessing.id)
+    ids = {job_id: record_id for job_id, record_id in db.execute(stmt).all()}
+    db.commit()
+    return ids
+
+def _encode_row(row: Dict[str, Any]) -> str:
+    return json.dumps(row, default=lambda value: value.isoformat() if isinstance(value, datetime) else str(value))
+
+def _decode_row(raw: str) -> Dict[str, Any]:
+    row = json.loads(raw)
+    for column in ROW_DATETIME_COLUMNS:
+        if row.get(column):
+            row[column] = datetime.fromisoformat(row[column])
+    for column in ROW_UUID_COLUMNS:
+        if row.get(column):
+            row[column] = uuid.UUID(row[column])
+    return row
+
+class StatsSink:
+    """Destination for finished job rows"""
+
+    # Deferred sinks buffer rows on the hot path and write the database in flush()
+    deferred = False
+    # Buffers held in this process can only be flushed by this process
+    process_local = False
+
+    def write(self, rows: List[Dict[str, Any]], db: Optional[Session] = None) -> Dict[str, uuid.UUID]:
+        """Accept finished rows; returns the stored record ids when known"""
+        raise NotImplementedError
+
+    def flush(self) -> int:
+        """Bulk-write buffered rows and return how many were written"""
+        return 0
+
+class DatabaseSink(StatsSink):
+    """Writes rows straight to image_processings"""
+
+    def write(self, rows: List[Dict[str, Any]], db: Optional[Session] = None) -> Dict[str, uuid.UUID]:
+        if db is not None:
+            return persist_job_timings(db, rows)
+        session = SyncSessionLocal()
+        try:
+            return persist_job_timings(session, rows)
+        finally:
+            session.close()
+
+class MemorySink(StatsSink):
+    """Buffers rows in process and bulk-writes them to a target sink.
+    Without a target the rows are only kept in memory."""
+
+    deferred = True
+    process_local = True
+
+    def __init__(self, target: Optional[StatsSink] = None, batch_size: int = settings.STATS_FLUSH_BATCH_SIZE):
+        self.target = target
+        self.batch_size = batch_size
+        self._rows: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def rows(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._rows)
+
+    def write(self, rows: List[Dict[str, Any]], db: Optional[Session] = None) -> Dict[str, uuid.UUID]:
+        with self._lock:
+            self._rows.extend(rows)
+            full = len(self._rows) >= self.batch_size
+        if full and self.target is not None:
+            self.flush()
         return {}
 
-    async def get_image_stats(self, db: AsyncSession, image_id: str) -> Dict[str, Any]:
-        """Get all stats for an image, including all processing records"""
-        stmt = select(Image).filter_by(id=image_id)
-        result = await db.execute(stmt)
-        image = result.scalar_one_or_none()
-        if not image:
+    def flush(self) -> int:
+        if self.target is None:
+            return 0
+        with self._lock:
+            rows, self._rows = self._rows, []
+        try:
+            for offset in range(0, len(rows), self.batch_size):
+                self.target.write(rows[offset:offset + self.batch_size])
+        except Exception:
+            # Keep the rows for the next flush
+            with self._lock:
+                self._rows[:0] = rows[offset:]
+            raise
+        return len(rows)
+
+class RedisSink(StatsSink):
+    """Queues rows in Redis so any worker's flush can bulk-write them"""
+
+    deferred = True
+
+    def __init__(self, target: Optional[StatsSink] = None, batch_size: int = settings.STATS_FLUSH_BATCH_SIZE, key: str = PENDING_STATS_KEY):
+        self.target = target or DatabaseSink()
+        self.batch_size = batch_size
+        self.key = key
+
+    def write(self, rows: List[Dict[str, Any]], db: Optional[Session] = None) -> Dict[str, uuid.UUID]:
+        if rows:
+            get_redis().rpush(self.key, *[_encode_row(row) for row in rows])
+        return {}
+
+    def flush(self) -> int:
+        redis_client = get_redis()
+        total = 0
+        while True:
+            batch = redis_client.lpop(self.key, self.batch_size)
+            if not batch:
+                break
+            try:
+                self.target.write([_decode_row(raw) for raw in batch])
+            except Exception:
+                # Requeue the batch so the rows are not lost
+                redis_client.lpush(self.key, *reversed(batch))
+                raise
+            total += len(batch)
+            if len(batch) < self.batch_size:
+                break
+        return total
+
+def build_sink(name: str) -> StatsSink:
+    """Build the sink configured by STATS_SINK"""
+    if name == "db":
+        return DatabaseSink()
+    if name == "redis":
+        return RedisSink()
+    if name == "memory":
+        return MemorySink(target=DatabaseSink())
+    raise ValueError(f"Invalid stats sink: {name}. Must be 'db', 'redis' or 'memory'")
+
+class JobMetrics:
+    """Single job-metrics core shared by the sync and async facades"""
+
+    def __init__(self, sink: Optional[StatsSink] = None):
+        self.sink = sink or build_sink(settings.STATS_SINK)
+        self._timers: Dict[str, JobTimer] = {}
+        self._lock = threading.Lock()
+        self._flusher: Optional[threading.Thread] = None
+        self._stop_flushing = threading.Event()
+
+    def start(self, job_id: str, user_id: Optional[str] = None) -> JobTimer:
+        """Start timing a job in memory"""
+        timer = JobTimer(job_id, user_id, metrics=self)
+        with self._lock:
+            self._timers[job_id] = timer
+        logger.info(f"Started processing job {job_id}")
+        return timer
+
+    def get_timer(self, job_id: str) -> Optional[JobTimer]:
+        """Get the timer of a job still running in this process"""
+        with self._lock:
+            return self._timers.get(job_id)
+
+    def discard(self, job_id: str) -> None:
+        """Forget a job's timer without recording it"""
+        with self._lock:
+            self._timers.pop(job_id, None)
+
+    def record(self, rows: List[Dict[str, Any]], db: Optional[Session] = None) -> Dict[str, uuid.UUID]:
+        """Hand finished rows to the sink; deferred sinks never touch the session"""
+        return self.sink.write(rows, None if self.sink.deferred else db)
+
+    def finish(self, timer: JobTimer, db: Optional[Session], status: str = "completed", image_id: Optional[str] = None, **fields: Any) -> Dict[str, Any]:
+        """Record a finished job and return its stats"""
+        self.discard(timer.job_id)
+        row = timer.values(status, image_id, **fields)
+        with tracer.start_as_current_span("stats.record") as span:
+            span.set_attribute("stats.sink", type(self.sink).__name__)
+            row["id"] = self.record([row], db).get(timer.job_id, row["id"])
+        logger.info(f"Completed job {timer.job_id} in {row['duration_seconds']:.2f}s with status {status}")
+        return ImageProcessing(**row).to_dict()
+
+    def flush(self) -> int:
+        """Bulk-write whatever the sink has buffered"""
+        written = self.sink.flush()
+        if written:
+            logger.info(f"Flushed {written} job stats rows")
+        return written
+
+    def _flush_periodically(self, interval: float) -> None:
+        while not self._stop_flushing.wait(interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Failed to flush job stats: {str(e)}")
+
+    def start_flushing(self, interval: float = settings.STATS_FLUSH_INTERVAL_SECONDS) -> None:
+        """Flush an in-process buffer on a timer; the beat task cannot reach another process's memory"""
+        if not self.sink.process_local or (self._flusher and self._flusher.is_alive()):
+            return
+        self._stop_flushing.clear()
+        self._flusher = threading.Thread(target=self._flush_periodically, args=(interval,), name="stats-flush", daemon=True)
+        self._flusher.start()
+
+    def stop_flushing(self) -> None:
+        """Stop the flush timer and write out what is left"""
+        self._stop_flushing.set()
+        if self._flusher is not None:
+            self._flusher.join(timeout=5)
+            self._flusher = None
+        self.flush()
+
+    def live_stats(self, job_id: str) -> Dict[str, Any]:
+        """Get stats for a job still running in this process"""
+        timer = self.get_timer(job_id)
+        if not timer:
             return {}
-        
+        return ImageProcessing(**timer.values("processing")).to_dict()
+
+    @staticmethod
+    def job_query(job_id: str):
+        return select(ImageProcessing).filter_by(job_id=job_id)
+
+    @staticmethod
+    def image_query(image_id: str):
+        return select(Image).options(selectinload(Image.processings)).filter_by(id=image_id)
+
+    @staticmethod
+    def cleanup_statement(job_id: str):
+        return delete(ImageProcessing).where(ImageProcessing.job_id == job_id)
+
+    @staticmethod
+    def image_stats(image: Image) -> Dict[str, Any]:
+        """Get all stats for an image, including all processing records"""
         return {
             "image_id": str(image.id),
             "filename": image.filename,
             "uploaded_at": image.uploaded_at.isoformat() if image.uploaded_at else None,
             "processings": [proc.to_dict() for proc in image.processings]
         }
-    
-    async def cleanup_stats(self, db: AsyncSession, job_id: str) -> None:
-        """Remove stats for completed job"""
-        stmt = select(ImageProcessing).filter_by(job_id=job_id)
-        result = await db.execute(stmt)
-        processing = result.scalar_one_or_none()
-        if processing:
-            await db.delete(processing)
-            await db.commit()
-            logger.info(f"Cleaned up stats for job {job_id}")
 
 class SyncProcessingStats:
-    def __init__(self):
-        """Initialize ProcessingStats"""
-        pass
-    
-    def _get_utc_now(self) -> datetime:
-        """Get current UTC timestamp"""
-        return datetime.now(timezone.utc)
-    
+    """Blocking facade over the job-metrics core"""
+
+    def __init__(self, metrics: "JobMetrics"):
+        self.metrics = metrics
+
     def start_processing(self, db: Session, job_id: str, user_id: str) -> None:
         """Record the start of processing for a job"""
-        processing = ImageProcessing(
-            job_id=job_id,
-            user_id=user_id,
-            start_time=self._get_utc_now(),
-            status="processing"
-        )
-        db.add(processing)
-        db.commit()
-        logger.info(f"Started processing job {job_id}")
-    
+        self.metrics.start(job_id, user_id)
+
     def start_api_call(self, db: Session, job_id: str) -> None:
         """Record the start of the API call"""
-        processing = db.query(ImageProcessing).filter_by(job_id=job_id).first()
-        if processing:
-            processing.api_start_time = self._get_utc_now()
-            db.commit()
-            logger.info(f"Started API call for job {job_id}")
-    
+        timer = self.metrics.get_timer(job_id)
+        if timer:
+            timer.start_span("api")
+
     def end_api_call(self, db: Session, job_id: str) -> None:
         """Record the end of the API call"""
-        processing = db.query(ImageProcessing).filter_by(job_id=job_id).first()
-        if processing and processing.api_start_time:
-            api_end_time = self._get_utc_now()
-            # Ensure both timestamps are timezone-aware
-            if processing.api_start_time.tzinfo is None:
-                processing.api_start_time = processing.api_start_time.replace(tzinfo=timezone.utc)
-            
-            api_duration = (api_end_time - processing.api_start_time).total_seconds()
-            
-            processing.api_end_time = api_end_time
-            processing.api_duration_seconds = round(api_duration, 2)
-            db.commit()
-            logger.info(f"Ended API call for job {job_id}, duration: {api_duration:.2f}s")
-    
+        timer = self.metrics.get_timer(job_id)
+        if timer:
+            timer.end_span("api")
+            logger.info(f"Ended API call for job {job_id}, duration: {timer.span_seconds('api'):.2f}s")
+
     def end_processing(self, db: Session, job_id: str, status: str = "completed", image_id: Optional[str] = None) -> Dict[str, Any]:
         """Record the end of processing and return the stats"""
-        processing = db.query(ImageProcessing).filter_by(job_id=job_id).first()
-        if processing:
-            end_time = self._get_utc_now()
-            # Ensure both timestamps are timezone-aware
-            if processing.start_time.tzinfo is None:
-                processing.start_time = processing.start_time.replace(tzinfo=timezone.utc)
-            
-            # Calculate total duration from start to end
-            duration = (end_time - processing.start_time).total_seconds()
-            
-            processing.end_time = end_time
-            processing.duration_seconds = round(duration, 2)
-            processing.status = status
-            if image_id:
-                processing.image_id = image_id
-            
-            db.commit()
-            logger.info(f"Completed job {job_id} in {duration:.2f}s with status {status}")
-            return processing.to_dict()
-        logger.warning(f"No processing record found for job {job_id}")
-        return {}
-    
+        timer = self.metrics.get_timer(job_id)
+        if not timer:
+            logger.warning(f"No processing record found for job {job_id}")
+            return {}
+        return self.metrics.finish(timer, db, status, image_id)
+
     def get_stats(self, db: Session, job_id: str) -> Dict[str, Any]:
         """Get stats for a job"""
-        processing = db.query(ImageProcessing).filter_by(job_id=job_id).first()
+        processing = db.execute(self.metrics.job_query(job_id)).scalar_one_or_none()
         if processing:
             return processing.to_dict()
-        return {}
+        return self.metrics.live_stats(job_id)
 
     def get_image_stats(self, db: Session, image_id: str) -> Dict[str, Any]:
         """Get all stats for an image, including all processing records"""
-        image = db.query(Image).filter_by(id=image_id).first()
-        if not image:
-            return {}
-        
-        return {
-            "image_id": str(image.id),
-            "filename": image.filename,
-            "uploaded_at": image.uploaded_at.isoformat() if image.uploaded_at else None,
-            "processings": [proc.to_dict() for proc in image.processings]
-        }
-    
+        image = db.execute(self.metrics.image_query(image_id)).scalar_one_or_none()
+        return self.metrics.image_stats(image) if image else {}
+
     def cleanup_stats(self, db: Session, job_id: str) -> None:
         """Remove stats for completed job"""
-        processing = db.query(ImageProcessing).filter_by(job_id=job_id).first()
+        result = db.execute(self.metrics.cleanup_statement(job_id))
+        db.commit()
+        if result.rowcount:
+            logger.info(f"Cleaned up stats for job {job_id}")
+
+    def flush(self) -> int:
+        """Bulk-write buffered stats"""
+        return self.metrics.flush()
+
+class ProcessingStats:
+    """Async facade over the job-metrics core"""
+
+    def __init__(self, metrics: "JobMetrics"):
+        self.metrics = metrics
+
+    async def start_processing(self, db: AsyncSession, job_id: str, user_id: str) -> None:
+        """Record the start of processing for a job"""
+        self.metrics.start(job_id, user_id)
+
+    async def start_api_call(self, db: AsyncSession, job_id: str) -> None:
+        """Record the start of the API call"""
+        timer = self.metrics.get_timer(job_id)
+        if timer:
+            timer.start_span("api")
+
+    async def end_api_call(self, db: AsyncSession, job_id: str) -> None:
+        """Record the end of the API call"""
+        timer = self.metrics.get_timer(job_id)
+        if timer:
+            timer.end_span("api")
+            logger.info(f"Ended API call for job {job_id}, duration: {timer.span_seconds('api'):.2f}s")
+
+    async def end_processing(self, db: AsyncSession, job_id: str, status: str = "completed", image_id: Optional[str] = None) -> Dict[str, Any]:
+        """Record the end of processing and return the stats"""
+        timer = self.metrics.get_timer(job_id)
+        if not timer:
+            logger.warning(f"No processing record found for job {job_id}")
+            return {}
+        if self.metrics.sink.deferred:
+            return self.metrics.finish(timer, None, status, image_id)
+        return await db.run_sync(lambda session: self.metrics.finish(timer, session, status, image_id))
+
+    async def get_stats(self, db: AsyncSession, job_id: str) -> Dict[str, Any]:
+        """Get stats for a job"""
+        result = await db.execute(self.metrics.job_query(job_id))
+        processing = result.scalar_one_or_none()
         if processing:
-            db.delete(processing)
-            db.commit()
+            return processing.to_dict()
+        return self.metrics.live_stats(job_id)
+
+    async def get_image_stats(self, db: AsyncSession, image_id: str) -> Dict[str, Any]:
+        """Get all stats for an image, including all processing records"""
+        result = await db.execute(self.metrics.image_query(image_id))
+        image = result.scalar_one_or_none()
+        return self.metrics.image_stats(image) if image else {}
+
+    async def cleanup_stats(self, db: AsyncSession, job_id: str) -> None:
+        """Remove stats for completed job"""
+        result = await db.execute(self.metrics.cleanup_statement(job_id))
+        await db.commit()
+        if result.rowcount:
             logger.info(f"Cleaned up stats for job {job_id}")
 
+    def flush(self) -> int:
+        """Bulk-write buffered stats"""
+        return self.metrics.flush()
+
+@celery_app.task(publish_events=False)
+def flush_job_stats() -> int:
+    """Periodically bulk-write stats buffered by deferred sinks"""
+    return job_metrics.flush()
+
+def _worker_pool(worker) -> str:
+    return get_implementation(worker.pool_cls).__module__.rsplit('.', 1)[-1]
+
+@worker_process_init.connect
+def _start_job_stats_flush(**kwargs) -> None:
+    """Each worker process flushes its own in-memory buffer"""
+    job_metrics.start_flushing()
+
+@worker_process_shutdown.connect
+def _flush_job_stats_on_shutdown(**kwargs) -> None:
+    """Write out buffered stats before a worker process exits"""
+    try:
+        job_metrics.stop_flushing()
+    except Exception as e:
+        logger.error(f"Failed to flush job stats on shutdown: {str(e)}")
+
+# Thread and green pools run tasks in the main process, which never signals
+# worker_process_init; only prefork signals worker_process_shutdown
+@worker_init.connect
+def _start_thread_pool_job_stats_flush(sender=None, **kwargs) -> None:
+    if _worker_pool(sender) not in ('prefork', 'solo'):
+        job_metrics.start_flushing()
+
+@worker_shutdown.connect
+def _flush_thread_pool_job_stats_on_shutdown(sender=None, **kwargs) -> None:
+    if sender is not None and _worker_pool(sender) == 'prefork':
+        return
+    _flush_job_stats_on_shutdown()
+
 # Global instances
-stats = ProcessingStats()
-sync_stats = SyncProcessingStats() 
\ No newline at end of file
+job_metrics = JobMetrics()
+stats = ProcessingStats(job_metrics)
+sync_stats = SyncProcessingStats(job_metrics)
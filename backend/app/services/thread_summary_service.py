@@ -0,0 +1,126 @@
+from typing import Dict, Any, List, Optional
+from datetime import datetime, timezone
+import uuid
+from app.core.celery_app import celery_app
+from app.core.config import settings
+from app.core.job_backend import submit_job
+from app.core.logging import setup_logger
+from app.db.models.chat import ChatThread, ChatMessage
+from app.db.session import task_session
+from app.services.single_flight import SingleFlight
+from app.services.vision_client import get_vision_client
+
+# Set up logging
+logger = setup_logger("thread_summary_service")
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a user and an assistant. "
+    "Update the summary with the new messages below. Keep facts, names, numbers, decisions, "
+    "the user's preferences and any open questions; drop greetings and repetition. "
+    "Write plain prose in the third person and reply with the updated summary only."
+)
+
+# One summary update per thread at a time
+summary_flights = SingleFlight("thread-summary")
+
+def summary_backlog(message_count: int, summarized_count: int) -> int:
+    """Messages old enough to fold into the summary, beyond the ones always sent verbatim"""
+    return message_count - summarized_count - settings.CHAT_SUMMARY_KEEP_RECENT
+
+def request_summary(thread_id: str, message_count: int, summarized_count: int) -> Optional[str]:
+    """Queue a summary update when enough messages have built up; returns the job ID if one was queued"""
+    if not settings.CHAT_SUMMARY_ENABLED:
+        return None
+    if summary_backlog(message_count, summarized_count) < settings.CHAT_SUMMARY_EVERY_MESSAGES:
+        return None
+
+    job_id = str(uuid.uuid4())
+    flight_key = summary_flights.flight_key(str(thread_id))
+    if summary_flights.claim(flight_key, job_id):
+        return None
+    try:
+        submit_job(summarize_thread, [str(thread_id)], task_id=job_id)
+    except Exception as e:
+        # The next reply will try again
+        summary_flights.release(flight_key, job_id)
+        logger.warning(f"Failed to queue summary for thread {thread_id}: {str(e)}")
+        return None
+    logger.info(f"Queued summary {job_id} for thread {thread_id}")
+    return job_id
+
+def _transcript(messages: List[Dict[str, str]]) -> str:
+    limit = settings.CHAT_SUMMARY_MESSAGE_CHARS
+    lines = []
+    for message in messages:
+        content = message["content"] or ""
+        if len(content) > limit:
+            content = content[:limit] + " [...]"
+        lines.append(f"{message['role']}: {content}")
+    return "\n\n".join(lines)
+
+def fold_summary(summary: Optional[str], messages: List[Dict[str, str]]) -> str:
+    """Fold messages into the previous summary with one short completion"""
+    previous = summary or "(no summary yet)"
+    prompt = [
+        {"role": "system", "content": SUMMARY_PROMPT},
+        {"role": "user", "content": f"Current summary:\n{previous}\n\nNew messages:\n{_transcript(messages)}"}
+    ]
+    return get_vision_client().complete(
+        prompt,
+        model=settings.CHAT_SUMMARY_MODEL,
+        max_tokens=settings.CHAT_SUMMARY_MAX_TOKENS
+    ).strip()
+
+@celery_app.task(bind=True, publish_events=False)
+def summarize_thread(self, thread_id: str) -> Dict[str, Any]:
+    """Fold a thread's older messages into its rolling summary"""
+    try:
+        with task_session() as db:
+            thread = db.query(ChatThread).filter_by(id=uuid.UUID(thread_id)).first()
+            if not thread:
+                return {"status": "skipped", "thread_id": thread_id, "reason": "thread not found"}
+            summarized_count = thread.summary_message_count or 0
+            previous = thread.summary
+            # Only the messages not yet in the summary, oldest first
+            pending = (db.query(ChatMessage)
+                    .filter_by(thread_id=thread.id)
+                    .order_by(ChatMessage.created_at, ChatMessage.id)
+                    .offset(summarized_count)
+                    .all())
+            messages = [{"role": message.role, "content": message.content} for message in pending]
+
+        fold = messages[:max(0, len(messages) - settings.CHAT_SUMMARY_KEEP_RECENT)]
+        if len(fold) < settings.CHAT_SUMMARY_EVERY_MESSAGES:
+            return {"status": "skipped", "thread_id": thread_id, "reason": "not enough new messages"}
+
+        # No session is held open during the provider call
+        summary = fold_summary(previous, fold)
+        if not summary:
+            raise ValueError("Summary model returned an empty summary")
+
+        with task_session() as db:
+            # Only if no other update landed meanwhile; updated_at is kept so the thread list order does not change
+            updated = (db.query(ChatThread)
+                    .filter_by(id=uuid.UUID(thread_id), summary_message_count=summarized_count)
+                    .update({
+                        ChatThread.summary: summary,
+                        ChatThread.summary_message_count: summarized_count + len(fold),
+                        ChatThread.summary_updated_at: datetime.now(timezone.utc),
+                        ChatThread.updated_at: ChatThread.updated_at
+                    }, synchronize_session=False))
+        if not updated:
+            return {"status": "skipped", "thread_id": thread_id, "reason": "summary changed concurrently"}
+
+        logger.info(f"Folded {len(fold)} messages into the summary of thread {thread_id}")
+        return {
+            "status": "completed",
+            "thread_id": thread_id,
+            "summarized_messages": summarized_count + len(fold),
+            "summary_chars": len(summary)
+        }
+    except Exception as e:
+        logger.error(f"Error summarizing thread {thread_id}: {str(e)}", exc_info=True)
+        self.update_state(state='FAILURE', meta={'error': str(e)})
+        return {"status": "error", "thread_id": thread_id, "error": str(e)}
+    finally:
+        summary_flights.release(summary_flights.flight_key(thread_id), self.request.id)
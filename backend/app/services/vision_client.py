@@ -0,0 +1,281 @@
+from openai import OpenAI, AsyncOpenAI
+from typing import Dict, Any, List, Optional, Awaitable, Iterator, Tuple, TypeVar
+import asyncio
+import base64
+import concurrent.futures
+import os
+import queue
+import threading
+import time
+import httpx
+from app.core.config import settings
+from app.core.metrics import VISION_API_DURATION, record_provider_error
+from app.core.tracing import tracer
+from app.core.logging import setup_logger
+from app.services.llm_gateway import BACKGROUND, estimate_tokens, gateway
+
+# Set up logging
+logger = setup_logger("vision_client")
+
+T = TypeVar("T")
+
+def build_vision_messages(prompt: str, image_bytes: bytes) -> List[Dict[str, Any]]:
+    """Build the chat messages for a vision request"""
+    base64_image = base64.b64encode(image_bytes).decode('utf-8')
+    return [
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": prompt},
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": f"data:image/jpeg;base64,{base64_image}",
+                        "detail": "low"
+                    }
+                }
+            ]
+        }
+    ]
+
+def _sdk_max_retries() -> int:
+    """The provider limiter retries throttled calls itself, so the SDK must not retry them first"""
+    return 0 if settings.PROVIDER_LIMITER_ENABLED else 2
+
+def _extract_description(response: Any) -> str:
+    return response.choices[0].message.content if response and response.choices else "No description available"
+
+class VisionClient:
+    """Long-lived, pooled OpenAI vision client for one worker process.
+
+    In "sync" mode calls go through a pooled blocking client. In "async" mode
+    they are scheduled on a background event loop, so every thread of a
+    threads/gevent worker shares one connection pool with many calls in flight,
+    and a batch runs its calls as coroutines on that loop (run_many).
+    """
+
+    def __init__(self, mode: str = "sync"):
+        if mode not in ("sync", "async"):
+            raise ValueError(f"Invalid vision client mode: {mode}. Must be 'sync' or 'async'")
+        self.mode = mode
+        self.pid = os.getpid()
+        self._client: Optional[OpenAI] = None
+        self._async_client: Optional[AsyncOpenAI] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=settings.VISION_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.VISION_MAX_CONNECTIONS,
+            keepalive_expiry=settings.VISION_KEEPALIVE_SECONDS
+        )
+
+    def _get_client(self) -> OpenAI:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    http_client = httpx.Client(
+                        http2=settings.VISION_HTTP2,
+                        limits=self._limits(),
+                        timeout=settings.VISION_TIMEOUT_SECONDS
+                    )
+                    self._client = OpenAI(
+                        api_key=settings.OPENAI_API_KEY,
+                        http_client=http_client,
+                        base_url=settings.OPENAI_BASE_URL,
+                        max_retries=_sdk_max_retries()
+                    )
+                    logger.info(f"Created pooled vision client for process {self.pid}")
+        return self._client
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    thread = threading.Thread(target=loop.run_forever, name="vision-client-loop", daemon=True)
+                    thread.start()
+                    self._async_client = AsyncOpenAI(
+                        api_key=settings.OPENAI_API_KEY,
+                        http_client=httpx.AsyncClient(
+                            http2=settings.VISION_HTTP2,
+                            limits=self._limits(),
+                            timeout=settings.VISION_TIMEOUT_SECONDS
+                        ),
+                        base_url=settings.OPENAI_BASE_URL,
+                        max_retries=_sdk_max_retries()
+                    )
+                    self._loop = loop
+                    logger.info(f"Started async vision client loop for process {self.pid}")
+        return self._loop
+
+    async def _complete_async(self, messages: List[Dict[str, Any]]) -> Any:
+        # Raw responses carry the rate-limit headers the provider limiter reads
+        return await self._async_client.chat.completions.with_raw_response.create(
+            model=settings.VISION_MODEL,
+            messages=messages,
+            max_tokens=500
+        )
+
+    def _complete(self, messages: List[Dict[str, Any]]) -> Any:
+        if self.mode == "async":
+            loop = self._get_loop()
+            future = asyncio.run_coroutine_threadsafe(self._complete_async(messages), loop)
+            try:
+                return future.result(timeout=settings.VISION_TIMEOUT_SECONDS * 2)
+            except concurrent.futures.TimeoutError:
+                # Free the stream and the limiter slot rather than leave the request running under a retry
+                future.cancel()
+                raise
+        return self._get_client().chat.completions.with_raw_response.create(
+            model=settings.VISION_MODEL,
+            messages=messages,
+            max_tokens=500
+        )
+
+    async def analyze_async(self, prompt: str, image_bytes: bytes) -> str:
+        """analyze() for coroutines running on the client's loop; see run_many"""
+        if asyncio.get_running_loop() is not self._loop:
+            # The async HTTP client is bound to that loop
+            raise RuntimeError("analyze_async must run on the vision client's loop")
+        messages = build_vision_messages(prompt, image_bytes)
+
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            response = await gateway.call_async(
+                "openai", settings.VISION_MODEL, lambda: self._complete_async(messages),
+                lane=BACKGROUND, tokens=estimate_tokens(messages, 500)
+            )
+            description = _extract_description(response.parse())
+            outcome = "success"
+            return description
+        except Exception as e:
+            record_provider_error("openai", "vision", e)
+            raise
+        finally:
+            VISION_API_DURATION.labels(
+                model=settings.VISION_MODEL,
+                mode=self.mode,
+                outcome=outcome
+            ).observe(time.perf_counter() - started)
+
+    def run_many(self, coroutines: List[Awaitable[T]], limit: int) -> Iterator[T]:
+        """Gather coroutines that await analyze_async on the client's loop, at most `limit`
+        at a time, and yield their results in the calling thread as they finish"""
+        loop = self._get_loop()
+        finished: "queue.Queue[Tuple[Optional[T], Optional[BaseException]]]" = queue.Queue()
+
+        async def gather() -> None:
+            semaphore = asyncio.Semaphore(limit)
+
+            async def run(coroutine: Awaitable[T]) -> None:
+                async with semaphore:
+                    try:
+                        finished.put((await coroutine, None))
+                    except Exception as e:
+                        finished.put((None, e))
+
+            await asyncio.gather(*(run(coroutine) for coroutine in coroutines))
+
+        done = asyncio.run_coroutine_threadsafe(gather(), loop)
+        for _ in coroutines:
+            result, error = finished.get()
+            if error is not None:
+                raise error
+            yield result
+        done.result()
+
+    def analyze(self, prompt: str, image_bytes: bytes) -> str:
+        """Call the vision API with the user's prompt and return the description"""
+        with tracer.start_as_current_span("vision.encode") as span:
+            span.set_attribute("image.bytes", len(image_bytes))
+            messages = build_vision_messages(prompt, image_bytes)
+
+        started = time.perf_counter()
+        outcome = "error"
+        with tracer.start_as_current_span("vision.request") as span:
+            span.set_attribute("vision.model", settings.VISION_MODEL)
+            span.set_attribute("vision.client_mode", self.mode)
+            try:
+                # Waits for budget and a slot, and retries throttled calls instead of failing the job
+                response = gateway.call(
+                    "openai", settings.VISION_MODEL, lambda: self._complete(messages),
+                    lane=BACKGROUND, tokens=estimate_tokens(messages, 500)
+                )
+                description = _extract_description(response.parse())
+                outcome = "success"
+                return description
+            except Exception as e:
+                record_provider_error("openai", "vision", e)
+                raise
+            finally:
+                VISION_API_DURATION.labels(
+                    model=settings.VISION_MODEL,
+                    mode=self.mode,
+                    outcome=outcome
+                ).observe(time.perf_counter() - started)
+
+    def embed(self, text: str, model: str = settings.EMBEDDING_MODEL) -> List[float]:
+        """Embed text, such as an image description, on the same pooled client"""
+        with tracer.start_as_current_span("embedding.request") as span:
+            span.set_attribute("embedding.model", model)
+            try:
+                response = gateway.call(
+                    "openai", model,
+                    lambda: self._get_client().embeddings.with_raw_response.create(model=model, input=text),
+                    lane=BACKGROUND, tokens=len(text) // 4
+                )
+                return response.parse().data[0].embedding
+            except Exception as e:
+                record_provider_error("openai", "embedding", e)
+                raise
+
+    def complete(self, messages: List[Dict[str, Any]], model: str, max_tokens: int = 500, lane: str = BACKGROUND) -> str:
+        """Text-only completion, such as a thread summary, on the same pooled client"""
+        with tracer.start_as_current_span("completion.request") as span:
+            span.set_attribute("completion.model", model)
+            try:
+                response = gateway.call(
+                    "openai", model,
+                    lambda: self._get_client().chat.completions.with_raw_response.create(
+                        model=model,
+                        messages=messages,
+                        max_tokens=max_tokens,
+                        temperature=0
+                    ),
+                    lane=lane, tokens=estimate_tokens(messages, max_tokens)
+                )
+                completion = response.parse()
+                return (completion.choices[0].message.content or "") if completion.choices else ""
+            except Exception as e:
+                record_provider_error("openai", "completion", e)
+                raise
+
+    def close(self) -> None:
+        """Close pooled connections and stop the background loop"""
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+        if self._loop is not None:
+            if self._async_client is not None:
+                asyncio.run_coroutine_threadsafe(self._async_client.close(), self._loop).result(timeout=5)
+                self._async_client = None
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = None
+
+_vision_client: Optional[VisionClient] = None
+_vision_client_lock = threading.Lock()
+
+def get_vision_client() -> VisionClient:
+    """Get this process's vision client, rebuilding it after a fork"""
+    global _vision_client
+    client = _vision_client
+    if client is None or client.pid != os.getpid():
+        with _vision_client_lock:
+            if _vision_client is None or _vision_client.pid != os.getpid():
+                # Connections and loop threads inherited from the parent are unusable
+                _vision_client = VisionClient(settings.VISION_CLIENT_MODE)
+            client = _vision_client
+    return client
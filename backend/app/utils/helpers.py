@@ -1,6 +1,7 @@
 import os
 import imghdr
 import uuid
+import hashlib
 from typing import Optional, Dict, Any
 from celery.result import AsyncResult
 from PIL import Image
@@ -18,6 +19,38 @@ def is_valid_file(filename: str) -> bool:
     valid_extensions = {'.jpg', '.jpeg', '.png', '.gif'}
     return os.path.splitext(filename)[1].lower() in valid_extensions
 
+def compute_content_hash(data: bytes) -> str:
+    """Compute the SHA-256 content hash of image bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+def compute_file_hash(fpath: str, chunk_size: int = 1024 * 1024) -> str:
+    """Compute the SHA-256 content hash of a file without loading it at once."""
+    digest = hashlib.sha256()
+    with open(fpath, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def compute_perceptual_hash(data: bytes) -> str:
+    """Compute a 64-bit difference hash of image bytes; near-duplicates differ in few bits."""
+    with Image.open(io.BytesIO(data)) as img:
+        pixels = list(img.convert("L").resize((9, 8), Image.LANCZOS).getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (pixels[row * 9 + col] < pixels[row * 9 + col + 1])
+    return f"{bits:016x}"
+
+def make_thumbnail(data: bytes, size: int) -> bytes:
+    """Downscale image bytes to fit a size x size box, as JPEG."""
+    with Image.open(io.BytesIO(data)) as img:
+        if img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        img.thumbnail((size, size))
+        output = io.BytesIO()
+        img.save(output, format='JPEG', quality=85, optimize=True)
+        return output.getvalue()
+
 def is_valid_image(fpath: str) -> bool:
     """Check if the file is a valid image using both imghdr and PIL."""
     try:
@@ -37,9 +70,41 @@ def is_valid_image(fpath: str) -> bool:
     except Exception:
         return False
 
+def format_job_state(job_id: str, state: str, info: Any = None) -> Dict[str, Any]:
+    """
+    Format a task state and its result or meta into the job status response format.
+    """
+    if state == "SUCCESS":
+        return info  # Our tasks already return properly formatted results
+    elif state == "FAILURE":
+        return {
+            "status": "error",
+            "job_id": job_id,
+            "error": str(info) if info else "Task failed"
+        }
+    elif state == "STARTED":
+        return {
+            "status": "processing",
+            "job_id": job_id,
+            "state": "started"
+        }
+    elif state == "PENDING":
+        return {
+            "status": "pending",
+            "job_id": job_id
+        }
+    else:  # PROGRESS or other states
+        if isinstance(info, dict):
+            return info
+        return {
+            "status": "processing",
+            "job_id": job_id,
+            "state": state.lower()
+        }
+
 def parse_celery_result(job_id: str, result: AsyncResult) -> Dict[str, Any]:
     """
-    Parse a Celery AsyncResult into a standardized response format.
+    Parse a Celery AsyncResult, or a local job's LocalResult, into a standardized response format.
     """
     try:
         # Check if task exists
@@ -55,32 +120,7 @@ def parse_celery_result(job_id: str, result: AsyncResult) -> Dict[str, Any]:
         
         if state == "SUCCESS":
             return result.get()  # Our tasks already return properly formatted results
-        elif state == "FAILURE":
-            return {
-                "status": "error",
-                "job_id": job_id,
-                "error": str(result.result) if result.result else "Task failed"
-            }
-        elif state == "STARTED":
-            return {
-                "status": "processing",
-                "job_id": job_id,
-                "state": "started"
-            }
-        elif state == "PENDING":
-            return {
-                "status": "pending",
-                "job_id": job_id
-            }
-        else:  # PROGRESS or other states
-            info = result.info
-            if isinstance(info, dict):
-                return info
-            return {
-                "status": "processing",
-                "job_id": job_id,
-                "state": state.lower()
-            }
+        return format_job_state(job_id, state, result.info)
     except Exception as e:
         return {
             "status": "error",
@@ -0,0 +1,141 @@
+"""Benchmark chat time to first token against a flaky provider, with and without hedging.
+
+Starts two stub providers: a flaky "groq" (usually fast, but --slow-rate of
+requests stall for --slow-latency and --error-rate fail) and a steady
+"openai". Streams --chats chats on llama-3.3-70b-versatile, whose fallback
+is gpt-4o, first with CHAT_HEDGING_ENABLED off and then on, and reports time
+to first token, failed chats, hedges and the extra requests they cost:
+
+    python scripts/bench_chat_hedging.py --chats 200 --slow-rate 0.04 --error-rate 0.02
+
+Without --redis-url the LLM gateway and provider limiter are turned off, so
+only the providers and hedging are measured.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+MODEL = "llama-3.3-70b-versatile"
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def start_stub(latency: float, slow_rate: float = 0.0, slow_latency: float = 0.0, error_rate: float = 0.0):
+    """Serve a stub provider from a background thread; returns its root URL and stats"""
+    from scripts.stub_vision_server import StubVisionHandler
+
+    stats = {"requests": 0, "connections": 0, "throttled": 0, "errors": 0}
+    handler = type("Handler", (StubVisionHandler,), {
+        "latency": latency,
+        "slow_rate": slow_rate,
+        "slow_latency": slow_latency,
+        "error_rate": error_rate,
+        "stats": stats
+    })
+    server_class = type("Server", (ThreadingHTTPServer,), {"request_queue_size": 256, "daemon_threads": True})
+    server = server_class(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}", stats
+
+def hedge_counts():
+    from app.core.metrics import CHAT_HEDGES
+    counts = {}
+    for metric in CHAT_HEDGES.collect():
+        for sample in metric.samples:
+            if sample.name.endswith("_total"):
+                key = f"{sample.labels['reason']}/{sample.labels['winner']}"
+                counts[key] = counts.get(key, 0) + int(sample.value)
+    return counts
+
+async def run_chats(chat_service, chats: int, concurrency: int):
+    """Stream the chats, a few at a time, on one event loop"""
+    ttfts, failed = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def chat():
+        nonlocal failed
+        async with semaphore:
+            started = time.perf_counter()
+            first_chunk = None
+            try:
+                async for _ in chat_service.stream_chat(
+                    messages=[{"role": "user", "content": "Say hello"}],
+                    model=MODEL,
+                    thread_id="bench",
+                    max_tokens=50
+                ):
+                    if first_chunk is None:
+                        first_chunk = time.perf_counter() - started
+                ttfts.append(first_chunk)
+            except Exception:
+                failed += 1
+
+    await asyncio.gather(*(chat() for _ in range(chats)))
+    return ttfts, failed
+
+def main():
+    parser = argparse.ArgumentParser(description="Chat hedging benchmark")
+    parser.add_argument("--redis-url", default=None, help="Keep the LLM gateway and limiter on, sharing state here; use a scratch database")
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4, help="Chats in flight at once")
+    parser.add_argument("--latency", type=float, default=0.3, help="Flaky provider's usual time to first token")
+    parser.add_argument("--slow-rate", type=float, default=0.04, help="Stalls beyond the p95 delay; above 5%% the p95 itself is a stall")
+    parser.add_argument("--slow-latency", type=float, default=4.0)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--backup-latency", type=float, default=0.5, help="Steady provider's time to first token")
+    parser.add_argument("--mode", choices=("off", "hedged", "both"), default="both")
+    args = parser.parse_args()
+
+    flaky_url, flaky_stats = start_stub(args.latency, args.slow_rate, args.slow_latency, args.error_rate)
+    steady_url, steady_stats = start_stub(args.backup_latency)
+    os.environ.update({
+        "GROQ_BASE_URL": flaky_url,
+        "GROQ_API_KEY": "stub",
+        "OPENAI_BASE_URL": f"{steady_url}/v1",
+        "OPENAI_API_KEY": "stub",
+        # A short warm-up is enough for the benchmark to start from a learned delay
+        "CHAT_HEDGE_MIN_SAMPLES": "10"
+    })
+    if args.redis_url:
+        os.environ["REDIS_URL"] = args.redis_url
+    else:
+        os.environ.update({"LLM_GATEWAY_ENABLED": "false", "PROVIDER_LIMITER_ENABLED": "false"})
+    import logging
+    logging.disable(logging.CRITICAL)
+
+    from app.core.config import settings
+    from app.services.chat_service import ChatService
+    from app.services.chat_hedging import chat_hedger
+
+    print(f"{args.chats} chats on {MODEL}: {args.slow_rate:.0%} stall for {args.slow_latency:g}s, "
+          f"{args.error_rate:.0%} fail; fallback answers in {args.backup_latency:g}s")
+    for mode in (("off", "hedged") if args.mode == "both" else (args.mode,)):
+        settings.CHAT_HEDGING_ENABLED = mode == "hedged"
+        for stats in (flaky_stats, steady_stats):
+            stats.update({"requests": 0, "errors": 0})
+        before = hedge_counts()
+        started = time.perf_counter()
+        ttfts, failed = asyncio.run(run_chats(ChatService(), args.chats, args.concurrency))
+        elapsed = time.perf_counter() - started
+        hedges = {key: count - before.get(key, 0) for key, count in hedge_counts().items() if count - before.get(key, 0)}
+        extra = flaky_stats["requests"] + flaky_stats["errors"] + steady_stats["requests"] - args.chats
+
+        print(mode)
+        print(f"  TTFT  p50 {percentile(ttfts, 0.5):6.2f}s  p95 {percentile(ttfts, 0.95):6.2f}s  "
+              f"p99 {percentile(ttfts, 0.99):6.2f}s  max {max(ttfts) if ttfts else float('nan'):6.2f}s  in {elapsed:5.1f}s")
+        print(f"  failed chats {failed}  extra provider requests {extra} ({extra / args.chats:.0%})")
+        if settings.CHAT_HEDGING_ENABLED:
+            print(f"  hedges {hedges or '{}'}  circuits {chat_hedger.state()['circuits']}  "
+                  f"learned delay {chat_hedger.ttft.hedge_delay(MODEL):.2f}s")
+
+if __name__ == "__main__":
+    main()
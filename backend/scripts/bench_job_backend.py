@@ -0,0 +1,124 @@
+"""Benchmark job latency on the Celery and local job backends.
+
+Submits the same short jobs through submit_job() on each backend, one at a time
+(dispatch latency of an idle backend) and then all at once (a burst), and
+reports enqueue-to-start latency, enqueue-to-finish time and throughput. For
+the Celery backend a worker consuming the benchmark queue is started as a
+subprocess, so Redis must be reachable:
+
+    python scripts/bench_job_backend.py --redis-url redis://localhost:6379/15 --jobs 500 --concurrency 4
+    python scripts/bench_job_backend.py --backend local --jobs 500 --concurrency 4
+
+Both backends run the jobs with the same number of threads.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.core.celery_app import celery_app
+from app.core.config import settings
+
+BENCH_QUEUE = "bench"
+
+@celery_app.task(bind=True, name="bench.job_backend.work", publish_events=False)
+def bench_work(self, seconds: float) -> dict:
+    """Report when the job started, work for a while, and report when it finished"""
+    started_at = time.time()
+    self.update_state(state="PROGRESS", meta={"started_at": started_at})
+    if seconds:
+        time.sleep(seconds)
+    return {"started_at": started_at, "finished_at": time.time()}
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def start_worker(concurrency: int) -> subprocess.Popen:
+    """A Celery worker for the benchmark queue, using threads like the local executor"""
+    worker = subprocess.Popen(
+        [
+            sys.executable, "-m", "celery", "-A", "scripts.bench_job_backend:celery_app", "worker",
+            "-Q", BENCH_QUEUE, "-P", "threads", "-c", str(concurrency), "--loglevel", "WARNING",
+            "--without-mingle", "--without-gossip", "--without-heartbeat"
+        ],
+        env=dict(os.environ, PYTHONPATH=os.path.join(os.path.dirname(__file__), "..")),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    # Wait until the worker answers before timing anything
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if celery_app.control.ping(timeout=1.0):
+            return worker
+    worker.terminate()
+    raise RuntimeError("Celery worker did not start within 60s")
+
+def measure(submit_job, jobs: int, work_seconds: float, burst: bool):
+    """Enqueue-to-start and enqueue-to-finish times of jobs submitted all at once, or one at a time"""
+    handles, to_start, to_finish = [], [], []
+
+    def collect(enqueued_at, handle):
+        result = handle.get(timeout=600)
+        to_start.append(result["started_at"] - enqueued_at)
+        to_finish.append(result["finished_at"] - enqueued_at)
+
+    began = time.time()
+    for _ in range(jobs):
+        enqueued_at = time.time()
+        handle = submit_job(bench_work, [work_seconds], queue=BENCH_QUEUE)
+        if burst:
+            handles.append((enqueued_at, handle))
+        else:
+            collect(enqueued_at, handle)
+    for enqueued_at, handle in handles:
+        collect(enqueued_at, handle)
+    return time.time() - began, to_start, to_finish
+
+def report(label: str, jobs: int, elapsed: float, to_start, to_finish) -> None:
+    print(f"  {label:<5} {jobs} jobs in {elapsed:6.2f}s ({jobs / elapsed:7.1f} jobs/s)")
+    print(f"    enqueue->start   p50 {percentile(to_start, 0.5) * 1000:8.2f}ms  p95 {percentile(to_start, 0.95) * 1000:8.2f}ms")
+    print(f"    enqueue->finish  p50 {percentile(to_finish, 0.5) * 1000:8.2f}ms  p95 {percentile(to_finish, 0.95) * 1000:8.2f}ms")
+
+def run(backend: str, args) -> None:
+    from app.core.job_backend import submit_job, local_jobs
+
+    settings.JOB_BACKEND = backend
+    worker = start_worker(args.concurrency) if backend == "celery" else None
+    local_jobs.max_workers = args.concurrency
+    try:
+        # Warm up connections and threads outside the measurement
+        submit_job(bench_work, [0], queue=BENCH_QUEUE).get(timeout=60)
+        print(backend)
+        # One at a time: dispatch latency on an idle backend
+        report("idle", args.idle_jobs, *measure(submit_job, args.idle_jobs, args.work_seconds, burst=False))
+        # All at once: includes waiting behind the rest of the batch
+        report("burst", args.jobs, *measure(submit_job, args.jobs, args.work_seconds, burst=True))
+    finally:
+        if worker is not None:
+            worker.terminate()
+            worker.wait()
+        local_jobs.shutdown(wait=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Job backend latency benchmark")
+    parser.add_argument("--redis-url", default=None, help="Broker and result backend for the Celery run; use a scratch database")
+    parser.add_argument("--backend", choices=("celery", "local", "both"), default="both")
+    parser.add_argument("--jobs", type=int, default=500, help="Jobs submitted at once")
+    parser.add_argument("--idle-jobs", type=int, default=100, help="Jobs submitted one at a time")
+    parser.add_argument("--concurrency", type=int, default=4, help="Worker threads on either backend")
+    parser.add_argument("--work-seconds", type=float, default=0.01, help="Time each job spends working")
+    args = parser.parse_args()
+
+    if args.redis_url:
+        celery_app.conf.broker_url = args.redis_url
+        celery_app.conf.result_backend = args.redis_url
+        os.environ["REDIS_URL"] = args.redis_url
+    for backend in (("celery", "local") if args.backend == "both" else (args.backend,)):
+        run(backend, args)
+
+if __name__ == "__main__":
+    main()
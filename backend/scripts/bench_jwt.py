@@ -0,0 +1,75 @@
+"""Benchmark per-request JWT verification cost.
+
+Signs an RS256 token with a throwaway key and times verifying it with the
+python-jose verifier (from a JWK dict, as before keys were parsed once, and
+from a parsed key), the PyJWT verifier when PyJWT is installed, and a
+verified-token cache hit.
+
+    python scripts/bench_jwt.py --iterations 2000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+from app.core.security import CLERK_ISSUER, JoseVerifier, PyJWTVerifier, VerifiedTokenCache
+
+def build_token():
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption()
+    ).decode()
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode()
+    key_data = jwk.construct(public_pem, "RS256").to_dict()
+    key_data["kid"] = "bench"
+
+    claims = {"sub": "user_bench", "email": "bench@example.com", "exp": int(time.time()) + 3600}
+    if CLERK_ISSUER:
+        claims["iss"] = CLERK_ISSUER
+    token = jwt.encode(claims, private_pem, algorithm="RS256", headers={"kid": "bench"})
+    return token, key_data
+
+def run(name: str, fn, iterations: int) -> None:
+    fn()  # Warm up and fail fast
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - started
+    print(f"{name:<16} {elapsed / iterations * 1e6:9.1f} us/token  ->  {iterations / elapsed:9.0f} tokens/s")
+
+def main():
+    parser = argparse.ArgumentParser(description="JWT verification benchmark")
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    token, key_data = build_token()
+    parsed_key = jwk.construct(key_data, "RS256")
+    jose_verifier = JoseVerifier()
+
+    run("jose-jwk-dict", lambda: jose_verifier.decode(token, key_data), args.iterations)
+    run("jose-parsed-key", lambda: jose_verifier.decode(token, parsed_key), args.iterations)
+
+    try:
+        pyjwt_verifier = PyJWTVerifier()
+    except ImportError:
+        print(f"{'pyjwt':<16} skipped (pip install 'PyJWT[crypto]')")
+    else:
+        run("pyjwt", lambda: pyjwt_verifier.decode(token, parsed_key), args.iterations)
+
+    cache = VerifiedTokenCache()
+    payload = jose_verifier.decode(token, parsed_key)
+    cache.put(cache.digest(token), {"user_id": payload["sub"]}, payload, "bench")
+    run("cache-hit", lambda: cache.get(cache.digest(token), lambda kid: True), args.iterations)
+
+if __name__ == "__main__":
+    main()
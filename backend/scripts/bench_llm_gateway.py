@@ -0,0 +1,151 @@
+"""Benchmark interactive chat latency while background jobs saturate the same provider budget.
+
+Starts the rate-limited stub provider, keeps it busy with background vision
+calls from many threads, and streams a chat completion every --probe-interval
+seconds on the same model. Runs twice: with the LLM gateway off (the adaptive
+concurrency limit only, so chat queues behind the backlog and 429s) and on
+(rate budget plus priority lanes). Reports chat time to first token, queue
+waits per lane, background goodput and the 429s the provider sent:
+
+    python scripts/bench_llm_gateway.py --redis-url redis://localhost:6379/15 \\
+        --rpm 300 --background-threads 32 --probes 20
+
+Use a scratch Redis database; the gateway's and limiter's keys are cleared before each run.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+MODEL = "gpt-4o-mini"
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def clear_keys(redis) -> None:
+    for pattern in ("gateway:*", "limiter:*"):
+        keys = list(redis.scan_iter(pattern))
+        if keys:
+            redis.delete(*keys)
+
+async def probe(chat_service) -> float:
+    """Time to the first streamed chunk of one short chat"""
+    started = time.perf_counter()
+    stream = chat_service.stream_chat(
+        messages=[{"role": "user", "content": "Say hello"}],
+        model=MODEL,
+        thread_id="bench",
+        max_tokens=50
+    )
+    first_chunk = None
+    async for _ in stream:
+        if first_chunk is None:
+            first_chunk = time.perf_counter() - started
+    return first_chunk
+
+async def run_probes(chat_service, probes: int, interval: float):
+    """Chats one after another on one event loop, which the model's async client is bound to"""
+    ttfts, failed = [], 0
+    for _ in range(probes):
+        try:
+            ttfts.append(await probe(chat_service))
+        except Exception:
+            failed += 1
+        await asyncio.sleep(interval)
+    return ttfts, failed
+
+def run(mode: str, args, stats, handler) -> None:
+    from app.core.config import settings
+    from app.core.redis_client import get_redis
+    from app.services.chat_service import ChatService
+    from app.services.vision_client import get_vision_client
+
+    settings.LLM_GATEWAY_ENABLED = mode == "lanes"
+    clear_keys(get_redis())
+    handler.limits.__init__(args.rpm, 0, 0, 60.0)
+    stats.update({"requests": 0, "throttled": 0})
+
+    client = get_vision_client()
+    chat_service = ChatService()
+    image = b"\xff\xd8" + os.urandom(1024)
+    stop = threading.Event()
+    outcomes = {"ok": 0, "failed": 0}
+    lock = threading.Lock()
+
+    def background(_):
+        while not stop.is_set():
+            try:
+                client.analyze("Describe this image", image)
+                outcome = "ok"
+            except Exception:
+                outcome = "failed"
+            with lock:
+                outcomes[outcome] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.background_threads) as executor:
+        for index in range(args.background_threads):
+            executor.submit(background, index)
+        # Let the backlog build before the first chat
+        time.sleep(args.warmup)
+        try:
+            ttfts, failed_probes = asyncio.run(run_probes(chat_service, args.probes, args.probe_interval))
+        finally:
+            stop.set()
+    elapsed = time.perf_counter() - started
+
+    print(f"{mode}")
+    print(f"  chat TTFT     p50 {percentile(ttfts, 0.5):6.2f}s  p95 {percentile(ttfts, 0.95):6.2f}s  "
+          f"max {max(ttfts) if ttfts else float('nan'):6.2f}s  failed {failed_probes}")
+    print(f"  background    {outcomes['ok']} ok {outcomes['failed']} failed, "
+          f"goodput {outcomes['ok'] / elapsed:5.1f} calls/s  429s sent {stats['throttled']}")
+    if settings.LLM_GATEWAY_ENABLED:
+        from app.services.llm_gateway import gateway
+        for lane, state in gateway.budget("openai", MODEL).state()["lanes"].items():
+            waits = state["wait_seconds"]
+            print(f"  {lane:<13} queue wait p50 {waits['p50'] or 0:6.2f}s  p95 {waits['p95'] or 0:6.2f}s  "
+                  f"({waits['samples']} samples)")
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM gateway priority benchmark")
+    parser.add_argument("--redis-url", default=None, help="Redis the gateway shares state through; use a scratch database")
+    parser.add_argument("--rpm", type=int, default=300, help="Requests per minute the stub allows")
+    parser.add_argument("--latency", type=float, default=0.3, help="Stub seconds per completion and to first token")
+    parser.add_argument("--background-threads", type=int, default=32)
+    parser.add_argument("--probes", type=int, default=20, help="Chats streamed during the run")
+    parser.add_argument("--probe-interval", type=float, default=1.0)
+    parser.add_argument("--warmup", type=float, default=5.0, help="Seconds of background load before the first chat")
+    parser.add_argument("--mode", choices=("off", "lanes", "both"), default="both")
+    args = parser.parse_args()
+
+    from scripts.bench_provider_limiter import start_stub
+    url, handler, stats = start_stub(args.latency, args.rpm, 0, 0, 60.0)
+    # Settings are read at import; the gateway budget sits just under the stub's limit
+    os.environ.update({
+        "OPENAI_BASE_URL": url,
+        "OPENAI_API_KEY": "stub",
+        "VISION_MODEL": MODEL,
+        "OPENAI_REQUESTS_PER_MINUTE": str(int(args.rpm * 0.95)),
+        "OPENAI_TOKENS_PER_MINUTE": "0",
+        "PROVIDER_RETRY_MAX_SECONDS": "10"
+    })
+    if args.redis_url:
+        os.environ["REDIS_URL"] = args.redis_url
+    import logging
+    logging.disable(logging.WARNING)
+
+    print(f"{args.background_threads} background threads against a stub allowing {args.rpm} requests/min; "
+          f"{args.probes} chats, one every {args.probe_interval:g}s")
+    for mode in (("off", "lanes") if args.mode == "both" else (args.mode,)):
+        run(mode, args, stats, handler)
+
+if __name__ == "__main__":
+    main()
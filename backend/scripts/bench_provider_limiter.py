@@ -0,0 +1,130 @@
+"""Benchmark vision calls against a rate-limited stub provider, with and without the adaptive limiter.
+
+Starts the stub vision server with the given RPM/TPM/concurrency limits, then
+runs the same load from several worker processes twice: with
+PROVIDER_LIMITER_ENABLED=false (SDK retries only, as before) and with the
+AIMD limiter shared through Redis. Reports goodput (successful calls per
+second), failed calls and the 429s the provider sent:
+
+    python scripts/bench_provider_limiter.py --redis-url redis://localhost:6379/15 \\
+        --processes 4 --threads 16 --calls 25 --rpm 200 --max-concurrent 8 --window 10
+
+Use a scratch Redis database; the limiter's keys are cleared before each run.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+def start_stub(latency: float, rpm: int, tpm: int, max_concurrent: int, window: float):
+    """Serve the rate-limited stub from a background thread; returns its base URL and stats"""
+    from scripts.stub_vision_server import STATS, RateLimits, StubVisionHandler
+
+    handler = type("Handler", (StubVisionHandler,), {
+        "latency": latency,
+        "limits": RateLimits(rpm, tpm, max_concurrent, window)
+    })
+    server_class = type("Server", (ThreadingHTTPServer,), {"request_queue_size": 256, "daemon_threads": True})
+    server = server_class(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/v1", handler, STATS
+
+def run_worker(threads: int, calls: int) -> dict:
+    """Make threads x calls vision calls from this process and count the outcomes"""
+    from app.services.vision_client import get_vision_client
+
+    client = get_vision_client()
+    image = b"\xff\xd8" + os.urandom(1024)
+    outcomes = {"ok": 0, "failed": 0}
+    lock = threading.Lock()
+
+    def call(_):
+        try:
+            client.analyze("Describe this image", image)
+            outcome = "ok"
+        except Exception:
+            outcome = "failed"
+        with lock:
+            outcomes[outcome] += 1
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(call, range(threads * calls)))
+    return outcomes
+
+def main():
+    parser = argparse.ArgumentParser(description="Provider limiter goodput benchmark")
+    parser.add_argument("--redis-url", default=None, help="Redis the limiter shares state through; use a scratch database")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=16, help="Concurrent calls per process")
+    parser.add_argument("--calls", type=int, default=25, help="Calls per thread")
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--rpm", type=int, default=200, help="Requests per window")
+    parser.add_argument("--tpm", type=int, default=0, help="Tokens per window")
+    parser.add_argument("--max-concurrent", type=int, default=8)
+    parser.add_argument("--window", type=float, default=10.0, help="Seconds per rate-limit window")
+    parser.add_argument("--mode", choices=("off", "aimd", "both"), default="both")
+    parser.add_argument("--run-worker", nargs=2, type=int, metavar=("THREADS", "CALLS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_worker:
+        import logging
+        logging.disable(logging.WARNING)
+        print(json.dumps(run_worker(*args.run_worker)), flush=True)
+        return
+
+    if args.redis_url:
+        os.environ["REDIS_URL"] = args.redis_url
+    url, handler, stats = start_stub(args.latency, args.rpm, args.tpm, args.max_concurrent, args.window)
+    total = args.processes * args.threads * args.calls
+    print(f"{total} calls from {args.processes} processes x {args.threads} threads; provider allows "
+          f"{args.rpm or '-'} requests and {args.tpm or '-'} tokens per {args.window:g}s, {args.max_concurrent or '-'} in flight")
+
+    modes = (("off", "false"), ("aimd", "true")) if args.mode == "both" else ((args.mode, "true" if args.mode == "aimd" else "false"),)
+    for mode, enabled in modes:
+        if enabled == "true":
+            from app.core.redis_client import get_redis
+            redis = get_redis()
+            keys = list(redis.scan_iter("limiter:*"))
+            if keys:
+                redis.delete(*keys)
+        handler.limits.__init__(args.rpm, args.tpm, args.max_concurrent, args.window)
+        stats.update({"requests": 0, "throttled": 0})
+        env = dict(
+            os.environ,
+            OPENAI_BASE_URL=url,
+            OPENAI_API_KEY="stub",
+            PROVIDER_LIMITER_ENABLED=enabled,
+            PROVIDER_RETRY_MAX_SECONDS=str(args.window),
+            # One limit cut per round trip of the stub
+            PROVIDER_LIMIT_DECREASE_WINDOW_SECONDS=str(max(2 * args.latency, 0.1)),
+            PYTHONPATH=os.path.join(os.path.dirname(__file__), "..")
+        )
+        started = time.perf_counter()
+        workers = [
+            subprocess.Popen(
+                [sys.executable, __file__, "--run-worker", str(args.threads), str(args.calls)],
+                env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+            )
+            for _ in range(args.processes)
+        ]
+        outcomes = {"ok": 0, "failed": 0}
+        for worker in workers:
+            output, _ = worker.communicate()
+            for line in output.splitlines():
+                if line.startswith("{"):
+                    result = json.loads(line)
+                    outcomes["ok"] += result["ok"]
+                    outcomes["failed"] += result["failed"]
+        elapsed = time.perf_counter() - started
+        print(f"{mode:<5} {outcomes['ok']:5d} ok {outcomes['failed']:5d} failed in {elapsed:6.1f}s  "
+              f"goodput {outcomes['ok'] / elapsed:6.1f} calls/s  429s sent {stats['throttled']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Benchmark the Celery task serializers on realistic result payloads.
+
+Compares custom_json with custom_msgpack on serialize/deserialize throughput
+and encoded size, and, when Redis is reachable, on the memory the stored
+result keys take (MEMORY USAGE).
+
+    pip install msgpack
+    python scripts/bench_serializers.py --iterations 20000 --redis-url redis://localhost:6379/15
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from kombu.serialization import dumps, loads
+from app.core.celery_app import JSON_CONTENT_TYPE, MSGPACK_CONTENT_TYPE, msgpack
+
+def analysis_result(native: bool) -> dict:
+    """An analyze_image result as stored in the result backend; native keeps UUIDs and datetimes as objects"""
+    started = datetime.now(timezone.utc)
+    stamp = (lambda value: value) if native else (lambda value: value.isoformat())
+    ident = (lambda value: value) if native else str
+    image_id, job_id = uuid.uuid4(), uuid.uuid4()
+    processing = {
+        "id": ident(uuid.uuid4()),
+        "job_id": str(job_id),
+        "user_id": "user_2abcdefghijklmnop",
+        "image_id": ident(image_id),
+        "status": "completed",
+        "model_version": "gpt-4o-mini",
+        "description": "A detailed description of the image. " * 20,
+        "start_time": stamp(started),
+        "end_time": stamp(started + timedelta(seconds=3.2)),
+        "duration_seconds": 3.2,
+        "api_start_time": stamp(started + timedelta(seconds=0.4)),
+        "api_end_time": stamp(started + timedelta(seconds=3.0)),
+        "api_duration_seconds": 2.6,
+        "cache_hit": False,
+        "saved_api_seconds": None
+    }
+    return {
+        "status": "SUCCESS",
+        "result": {
+            "id": ident(image_id),
+            "filename": "photo.jpg",
+            "user_id": "user_2abcdefghijklmnop",
+            "uploaded_at": stamp(started - timedelta(minutes=5)),
+            "storage_path": f"images/{image_id}.jpg",
+            "content_hash": uuid.uuid4().hex * 2,
+            "processings": [processing] * 3,
+            "status": "completed",
+            "job_id": str(job_id),
+            "stats": processing,
+            "error": None
+        },
+        "traceback": None,
+        "children": [],
+        "date_done": datetime.utcnow().isoformat(),
+        "task_id": str(job_id)
+    }
+
+def run(name: str, serializer: str, content_type: str, encoding: str, payload: dict, iterations: int) -> list:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        _, _, body = dumps(payload, serializer=serializer)
+    encode_rate = iterations / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        loads(body, content_type, encoding, accept=[content_type])
+    decode_rate = iterations / (time.perf_counter() - started)
+
+    print(f"{name:<22} {len(body):6d} bytes  dumps {encode_rate:9.0f}/s  loads {decode_rate:9.0f}/s")
+    return body
+
+def redis_memory(redis_url: str, bodies: dict, keys: int) -> None:
+    import redis
+
+    client = redis.Redis.from_url(redis_url)
+    try:
+        client.ping()
+    except Exception as e:
+        print(f"Skipping Redis memory comparison: {str(e)}")
+        return
+    for name, body in bodies.items():
+        prefix = f"bench-serializer:{name}:"
+        with client.pipeline(transaction=False) as pipe:
+            for i in range(keys):
+                pipe.set(f"{prefix}{i}", body, ex=600)
+            pipe.execute()
+        with client.pipeline(transaction=False) as pipe:
+            for i in range(keys):
+                pipe.memory_usage(f"{prefix}{i}")
+            used = sum(value or 0 for value in pipe.execute())
+        print(f"{name:<22} {keys} keys use {used / 1024 / 1024:7.2f} MiB in Redis")
+        client.delete(*[f"{prefix}{i}" for i in range(keys)])
+
+def main():
+    parser = argparse.ArgumentParser(description="Celery serializer benchmark")
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--redis-url", default=None, help="Redis to measure stored size in; use a scratch database")
+    parser.add_argument("--keys", type=int, default=10000)
+    args = parser.parse_args()
+
+    bodies = {}
+    bodies["custom_json"] = run("custom_json", "custom_json", JSON_CONTENT_TYPE, "utf-8", analysis_result(False), args.iterations)
+    if msgpack is None:
+        print("custom_msgpack         skipped (pip install msgpack)")
+    else:
+        bodies["custom_msgpack"] = run("custom_msgpack", "custom_msgpack", MSGPACK_CONTENT_TYPE, "binary", analysis_result(False), args.iterations)
+        # UUIDs and datetimes as ext types rather than strings
+        bodies["custom_msgpack-native"] = run("custom_msgpack-native", "custom_msgpack", MSGPACK_CONTENT_TYPE, "binary", analysis_result(True), args.iterations)
+
+    if args.redis_url:
+        redis_memory(args.redis_url, bodies, args.keys)
+
+if __name__ == "__main__":
+    main()
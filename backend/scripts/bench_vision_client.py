@@ -0,0 +1,61 @@
+"""Benchmark vision call throughput against scripts/stub_vision_server.py.
+
+Compares a fresh client per call (the old behaviour) with the pooled sync
+client and the async client, each driven by the same number of threads to
+mimic a threads-pool Celery worker.
+
+    python scripts/stub_vision_server.py --latency 0.5 &
+    OPENAI_BASE_URL=http://localhost:8090/v1 OPENAI_API_KEY=stub \
+        python scripts/bench_vision_client.py --calls 200 --threads 32
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import httpx
+from openai import OpenAI
+from app.core.config import settings
+from app.services.vision_client import VisionClient, build_vision_messages
+
+IMAGE_BYTES = os.urandom(32 * 1024)
+
+def call_with_fresh_client(prompt: str) -> str:
+    with httpx.Client() as http_client:
+        client = OpenAI(api_key=settings.OPENAI_API_KEY, http_client=http_client, base_url=settings.OPENAI_BASE_URL)
+        response = client.chat.completions.create(
+            model=settings.VISION_MODEL,
+            messages=build_vision_messages(prompt, IMAGE_BYTES),
+            max_tokens=500
+        )
+        return response.choices[0].message.content
+
+def run(name: str, fn, calls: int, threads: int) -> None:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(fn, ["Describe this image"] * calls))
+    elapsed = time.perf_counter() - started
+    print(f"{name:<14} {calls} calls in {elapsed:6.2f}s  ->  {calls / elapsed:7.1f} calls/s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Vision client throughput benchmark")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=32)
+    args = parser.parse_args()
+
+    print(f"Target: {settings.OPENAI_BASE_URL}")
+    run("fresh-client", call_with_fresh_client, args.calls, args.threads)
+
+    pooled = VisionClient("sync")
+    run("pooled-sync", lambda prompt: pooled.analyze(prompt, IMAGE_BYTES), args.calls, args.threads)
+    pooled.close()
+
+    async_client = VisionClient("async")
+    run("async", lambda prompt: async_client.analyze(prompt, IMAGE_BYTES), args.calls, args.threads)
+    async_client.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Benchmark worker pool types on the task shapes of each queue, against stub backends.
+
+Runs each workload under the pools used by scripts/worker.sh and prints
+tasks/s, so the profile choice per queue can be checked on a given machine:
+
+  upload      CPU-bound: validate and hash a JPEG, as upload_image does
+  analysis    I/O-bound: a vision call through VisionClient to a stub API (--vision-latency)
+  extraction  I/O-bound: a slow HTTP call standing in for a crawl (--extraction-latency)
+
+    python scripts/bench_worker_profiles.py --tasks 200
+
+Each run happens in a fresh interpreter so gevent can patch before imports.
+"""
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+def start_stub(latency: float) -> str:
+    """Serve the stub vision API from a background thread and return its base URL"""
+    from scripts.stub_vision_server import StubVisionHandler
+
+    handler = type("Handler", (StubVisionHandler,), {"latency": latency, "log_message": lambda *args: None})
+    # A deep accept backlog so a burst of concurrent clients is not refused
+    server_class = type("Server", (ThreadingHTTPServer,), {"request_queue_size": 256, "daemon_threads": True})
+    server = server_class(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+def make_image(path: str) -> None:
+    from PIL import Image
+
+    Image.effect_noise((1600, 1200), 64).convert("RGB").save(path, format="JPEG", quality=90)
+
+# Workloads, run inside pool workers
+def upload_task(path: str) -> str:
+    from app.utils.helpers import is_valid_image, compute_file_hash
+
+    if not is_valid_image(path):
+        raise ValueError("invalid image")
+    return compute_file_hash(path)
+
+def analysis_task(_) -> str:
+    from app.services.vision_client import get_vision_client
+
+    return get_vision_client().analyze("Describe this image", b"\xff\xd8" + os.urandom(16 * 1024))
+
+_http_client = None
+
+def extraction_task(url: str) -> int:
+    global _http_client
+    import httpx
+
+    if _http_client is None:
+        _http_client = httpx.Client(timeout=60)
+    return _http_client.post(f"{url}/chat/completions", json={"model": "stub", "messages": []}).status_code
+
+def run_one(pool: str, concurrency: int, workload: str, tasks: int, argument: str) -> None:
+    """Run one workload on one pool and print tasks/s"""
+    logging.disable(logging.INFO)
+    if pool == "gevent":
+        from gevent import monkey
+        monkey.patch_all()
+
+    task = {"upload": upload_task, "analysis": analysis_task, "extraction": extraction_task}[workload]
+    if pool == "prefork":
+        from concurrent.futures import ProcessPoolExecutor as Executor
+    elif pool == "threads":
+        from concurrent.futures import ThreadPoolExecutor as Executor
+    else:
+        from gevent.pool import Pool
+
+        class Executor:
+            def __init__(self, max_workers):
+                self.pool = Pool(max_workers)
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                self.pool.join()
+
+            def map(self, fn, items):
+                return self.pool.imap(fn, items)
+
+    with Executor(max_workers=concurrency) as executor:
+        # Warm up clients and imports in every worker before timing
+        list(executor.map(task, [argument] * concurrency))
+        started = time.perf_counter()
+        list(executor.map(task, [argument] * tasks))
+        elapsed = time.perf_counter() - started
+    print(f"{workload:<11} {pool:<8} c={concurrency:<3} {tasks} tasks in {elapsed:6.2f}s  ->  {tasks / elapsed:7.1f} tasks/s", flush=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker pool benchmark per queue workload")
+    parser.add_argument("--tasks", type=int, default=200)
+    parser.add_argument("--vision-latency", type=float, default=0.5)
+    parser.add_argument("--extraction-latency", type=float, default=2.0)
+    parser.add_argument("--run", nargs=4, metavar=("POOL", "CONCURRENCY", "WORKLOAD", "ARGUMENT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        pool, concurrency, workload, argument = args.run
+        run_one(pool, int(concurrency), workload, args.tasks, argument)
+        return
+
+    cpus = os.cpu_count() or 1
+    pools = [("prefork", cpus), ("threads", 32)]
+    try:
+        import gevent  # noqa: F401
+        pools.append(("gevent", 64))
+    except ImportError:
+        print("gevent not installed, skipping the gevent pool")
+
+    vision_url = start_stub(args.vision_latency)
+    extraction_url = start_stub(args.extraction_latency)
+    env = dict(os.environ, OPENAI_BASE_URL=vision_url, OPENAI_API_KEY="stub", PYTHONPATH=os.path.join(os.path.dirname(__file__), ".."))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        image_path = os.path.join(tmp, "bench.jpg")
+        make_image(image_path)
+        workloads = [("upload", image_path), ("analysis", "-"), ("extraction", extraction_url)]
+        for workload, argument in workloads:
+            for pool, concurrency in pools:
+                subprocess.run(
+                    [sys.executable, __file__, "--tasks", str(args.tasks), "--run", pool, str(concurrency), workload, argument],
+                    env=env,
+                    check=False,
+                    stderr=subprocess.DEVNULL
+                )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Local stand-in for the Firecrawl extract API.
+
+Run it and point the backend at it to exercise extraction offline:
+
+    python scripts/fake_firecrawl.py --port 3002 --latency 0.5
+    FIRECRAWL_API_URL=http://localhost:3002 FIRECRAWL_API_KEY=fake ...
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+JOBS = {}
+JOBS_LOCK = threading.Lock()
+CALLS = {"extract": 0}
+
+class FakeFirecrawlHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+
+    def _send_json(self, status: int, body: dict) -> None:
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        if self.path != "/v1/extract":
+            return self._send_json(404, {"success": False, "error": "Not found"})
+
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        time.sleep(self.latency)
+
+        job_id = str(uuid.uuid4())
+        data = {
+            "urls": request.get("urls", []),
+            "prompt": request.get("prompt"),
+            "title": f"Fake extraction of {', '.join(request.get('urls', []))}"
+        }
+        with JOBS_LOCK:
+            JOBS[job_id] = data
+            CALLS["extract"] += 1
+        self._send_json(200, {"success": True, "id": job_id})
+
+    def do_GET(self):
+        if self.path == "/stats":
+            return self._send_json(200, CALLS)
+        if not self.path.startswith("/v1/extract/"):
+            return self._send_json(404, {"success": False, "error": "Not found"})
+
+        job_id = self.path.rsplit("/", 1)[-1]
+        with JOBS_LOCK:
+            data = JOBS.pop(job_id, None)
+        if data is None:
+            return self._send_json(404, {"success": False, "error": "Unknown job"})
+        self._send_json(200, {"success": True, "status": "completed", "data": data})
+
+    def log_message(self, format, *args):
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Firecrawl extract server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3002)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds to wait per extract call")
+    args = parser.parse_args()
+
+    FakeFirecrawlHandler.latency = args.latency
+    server = ThreadingHTTPServer((args.host, args.port), FakeFirecrawlHandler)
+    print(f"Fake Firecrawl listening on http://{args.host}:{args.port}")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
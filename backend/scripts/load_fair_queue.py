@@ -0,0 +1,128 @@
+"""Load test for the fair analysis queue against a real Redis.
+
+One heavy user submits a large album at once while light users keep submitting
+single images. Simulated workers take jobs from an in-process FIFO standing in
+for the Celery analysis queue, and the queue wait of every job is reported per
+user class, with and without the fair queue in front:
+
+    python scripts/load_fair_queue.py --redis-url redis://localhost:6379/15 --heavy-jobs 2000 --workers 16
+
+Use a scratch Redis database; keys are namespaced per run and removed at the end.
+"""
+import argparse
+import os
+import queue
+import statistics
+import sys
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def run(mode: str, args) -> None:
+    from app.services.fair_queue import FairQueue
+    from app.core.redis_client import get_redis
+
+    broker: queue.Queue = queue.Queue()
+    submitted, started = {}, {}
+    lock = threading.Lock()
+
+    def send(job_id, job_args, job_kwargs):
+        broker.put(job_id)
+
+    fair = FairQueue(f"loadtest-{uuid.uuid4().hex[:8]}", "loadtest", max_in_flight=args.max_in_flight, send=send)
+
+    def submit(user_id: str) -> None:
+        submitted_at = time.perf_counter()
+        if mode == "fair":
+            job_id = fair.submit(user_id, [user_id])
+        else:
+            job_id = str(uuid.uuid4())
+            send(job_id, [user_id], {})
+        with lock:
+            submitted[job_id] = (user_id, submitted_at)
+
+    def worker():
+        while True:
+            job_id = broker.get()
+            if job_id is None:
+                return
+            with lock:
+                started[job_id] = time.perf_counter()
+            if mode == "fair":
+                fair.started(job_id)
+            time.sleep(args.service_time)
+            if mode == "fair":
+                fair.finished(job_id)
+
+    workers = [threading.Thread(target=worker, daemon=True) for _ in range(args.workers)]
+    for thread in workers:
+        thread.start()
+
+    def light_user(index: int) -> None:
+        for _ in range(args.light_jobs):
+            submit(f"light-{index}")
+            time.sleep(args.light_interval)
+
+    lights = [threading.Thread(target=light_user, args=(i,)) for i in range(args.light_users)]
+    began = time.perf_counter()
+    for _ in range(args.heavy_jobs):
+        submit("heavy")
+    for thread in lights:
+        thread.start()
+    for thread in lights:
+        thread.join()
+
+    total = args.heavy_jobs + args.light_users * args.light_jobs
+    while len(started) < total:
+        if mode == "fair":
+            # Stands in for the periodic dispatch task
+            fair.dispatch()
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - began
+    for _ in workers:
+        broker.put(None)
+
+    waits = {"heavy": [], "light": []}
+    with lock:
+        for job_id, (user_id, submitted_at) in submitted.items():
+            waits["heavy" if user_id == "heavy" else "light"].append(started[job_id] - submitted_at)
+    print(f"{mode:<6} {total} jobs in {elapsed:6.2f}s")
+    for name, values in waits.items():
+        print(f"  {name:<6} {len(values):5d} jobs  wait p50 {percentile(values, 0.5):7.3f}s  "
+              f"p95 {percentile(values, 0.95):7.3f}s  mean {statistics.mean(values):7.3f}s")
+    if mode == "fair":
+        stats = fair.user_stats("light-0")
+        print(f"  recorded for light-0: p95 {stats['wait_seconds']['p95']}s over {stats['wait_seconds']['samples']} samples")
+        redis = get_redis()
+        keys = list(redis.scan_iter(f"{fair.prefix}*"))
+        if keys:
+            redis.delete(*keys)
+
+def main():
+    parser = argparse.ArgumentParser(description="Fair analysis queue load test")
+    parser.add_argument("--redis-url", default=None, help="Redis to run against; use a scratch database")
+    parser.add_argument("--heavy-jobs", type=int, default=2000)
+    parser.add_argument("--light-users", type=int, default=20)
+    parser.add_argument("--light-jobs", type=int, default=10, help="Jobs per light user")
+    parser.add_argument("--light-interval", type=float, default=0.2)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--service-time", type=float, default=0.02)
+    parser.add_argument("--max-in-flight", type=int, default=4)
+    parser.add_argument("--mode", choices=("fair", "direct", "both"), default="both")
+    args = parser.parse_args()
+
+    if args.redis_url:
+        os.environ["REDIS_URL"] = args.redis_url
+    for mode in (("direct", "fair") if args.mode == "both" else (args.mode,)):
+        run(mode, args)
+
+if __name__ == "__main__":
+    main()
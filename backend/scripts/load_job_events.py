@@ -0,0 +1,107 @@
+"""Load test for GET /api/v1/jobs/{job_id}/events.
+
+Opens many concurrent SSE watchers against a running API, then publishes
+PROGRESS and SUCCESS events for their jobs straight to Redis, as a worker
+would, and reports connect time and publish-to-delivery latency.
+
+    ulimit -n 65536
+    python scripts/load_job_events.py --token "$CLERK_JWT" --watchers 10000 --jobs 1000
+
+Watchers share jobs round-robin, so --jobs controls the fan-out per event.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import httpx
+from app.core.job_events import TERMINAL_STATES, publish_job_event
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+async def watch(client: httpx.AsyncClient, url: str, connected: asyncio.Event, stats: dict) -> None:
+    started = time.perf_counter()
+    try:
+        async with client.stream("GET", url) as response:
+            response.raise_for_status()
+            first = True
+            state = None
+            async for line in response.aiter_lines():
+                if line.startswith("event: "):
+                    state = line[len("event: "):].upper()
+                elif line.startswith("data: "):
+                    if first:
+                        # The first event is the current state, sent once subscribed
+                        stats["connect"].append(time.perf_counter() - started)
+                        stats["connected"] += 1
+                        connected.set()
+                        first = False
+                        continue
+                    data = json.loads(line[len("data: "):])
+                    if isinstance(data, dict) and "sent_at" in data:
+                        stats["latency"].append(time.time() - data["sent_at"])
+                    if state in TERMINAL_STATES:
+                        stats["finished"] += 1
+                        return
+    except Exception as e:
+        stats["errors"].append(type(e).__name__)
+
+async def main():
+    parser = argparse.ArgumentParser(description="Job event fan-out load test")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--token", required=True, help="Bearer token accepted by the API")
+    parser.add_argument("--watchers", type=int, default=10000)
+    parser.add_argument("--jobs", type=int, default=1000)
+    parser.add_argument("--progress-events", type=int, default=5)
+    parser.add_argument("--connect-timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    job_ids = [f"loadtest-{uuid.uuid4()}" for _ in range(args.jobs)]
+    stats = {"connect": [], "latency": [], "connected": 0, "finished": 0, "errors": []}
+    connected = asyncio.Event()
+
+    limits = httpx.Limits(max_connections=args.watchers, max_keepalive_connections=0)
+    timeout = httpx.Timeout(args.connect_timeout, read=None)
+    headers = {"Authorization": f"Bearer {args.token}"}
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=timeout, headers=headers) as client:
+        started = time.perf_counter()
+        watchers = [
+            asyncio.create_task(watch(client, f"/api/v1/jobs/{job_ids[i % args.jobs]}/events", connected, stats))
+            for i in range(args.watchers)
+        ]
+        deadline = time.perf_counter() + args.connect_timeout
+        while stats["connected"] + len(stats["errors"]) < args.watchers and time.perf_counter() < deadline:
+            await asyncio.sleep(0.1)
+        print(f"connected  {stats['connected']}/{args.watchers} watchers in {time.perf_counter() - started:.2f}s "
+              f"(p50 {percentile(stats['connect'], 0.5) * 1000:.0f} ms, p99 {percentile(stats['connect'], 0.99) * 1000:.0f} ms)")
+
+        started = time.perf_counter()
+        for step in range(args.progress_events):
+            for job_id in job_ids:
+                publish_job_event(job_id, "PROGRESS", {"status": "processing", "job_id": job_id, "completed": step, "sent_at": time.time()})
+            await asyncio.sleep(0)
+        for job_id in job_ids:
+            publish_job_event(job_id, "SUCCESS", {"status": "completed", "job_id": job_id, "sent_at": time.time()})
+        await asyncio.wait(watchers, timeout=args.connect_timeout)
+        elapsed = time.perf_counter() - started
+
+    latency = stats["latency"]
+    print(f"delivered  {len(latency)} events to {stats['finished']} finished watchers in {elapsed:.2f}s")
+    if latency:
+        print(f"latency    p50 {percentile(latency, 0.5) * 1000:.1f} ms, p99 {percentile(latency, 0.99) * 1000:.1f} ms, "
+              f"mean {statistics.mean(latency) * 1000:.1f} ms")
+    if stats["errors"]:
+        print(f"errors     {len(stats['errors'])}: {sorted(set(stats['errors']))}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,220 @@
+"""Local stand-in for the OpenAI-compatible APIs used by image analysis, chat and embeddings.
+
+    python scripts/stub_vision_server.py --port 8090 --latency 0.8
+    OPENAI_BASE_URL=http://localhost:8090/v1 GROQ_BASE_URL=http://localhost:8090 OPENAI_API_KEY=stub GROQ_API_KEY=stub ...
+
+Chat completions with "stream": true are streamed as server-sent events, one
+word per chunk every --token-interval seconds after --latency. To simulate a
+flaky provider, --slow-rate of completions take --slow-latency instead and
+--error-rate of them fail with a 500.
+
+With --rpm, --tpm or --max-concurrent it enforces rate limits like the real
+API: over-limit requests get a 429, and every response carries the
+x-ratelimit-* headers. Tokens are counted as 100 prompt tokens plus the
+requested max_tokens, which OpenAI reserves up front.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STATS = {"requests": 0, "connections": 0, "throttled": 0, "errors": 0}
+STATS_LOCK = threading.Lock()
+
+class RateLimits:
+    """Fixed-window request and token budgets plus a concurrency cap"""
+
+    def __init__(self, rpm: int = 0, tpm: int = 0, max_concurrent: int = 0, window: float = 60.0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_concurrent = max_concurrent
+        self.window = window
+        self.window_start = time.monotonic()
+        self.requests = 0
+        self.tokens = 0
+        self.in_flight = 0
+        self.lock = threading.Lock()
+
+    def admit(self, tokens: int) -> tuple:
+        """Count a request against the budgets; returns (admitted, rate-limit headers)"""
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_start >= self.window:
+                self.window_start, self.requests, self.tokens = now, 0, 0
+            reset = f"{max(0.0, self.window - (now - self.window_start)):.3f}s"
+            admitted = (
+                (not self.rpm or self.requests < self.rpm)
+                and (not self.tpm or self.tokens + tokens <= self.tpm)
+                and (not self.max_concurrent or self.in_flight < self.max_concurrent)
+            )
+            if admitted:
+                self.requests += 1
+                self.tokens += tokens
+                self.in_flight += 1
+            headers = {}
+            if self.rpm:
+                headers.update({
+                    "x-ratelimit-limit-requests": str(self.rpm),
+                    "x-ratelimit-remaining-requests": str(max(0, self.rpm - self.requests)),
+                    "x-ratelimit-reset-requests": reset
+                })
+            if self.tpm:
+                headers.update({
+                    "x-ratelimit-limit-tokens": str(self.tpm),
+                    "x-ratelimit-remaining-tokens": str(max(0, self.tpm - self.tokens)),
+                    "x-ratelimit-reset-tokens": reset
+                })
+            return admitted, headers
+
+    def done(self) -> None:
+        with self.lock:
+            self.in_flight -= 1
+
+STREAM_REPLY = "This is a stub reply streamed one word at a time by the local provider."
+
+CHAT_PATHS = ("/v1/chat/completions", "/openai/v1/chat/completions")  # OpenAI, Groq
+EMBEDDING_PATHS = ("/v1/embeddings",)
+
+class StubVisionHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive so pooled clients can reuse connections
+    latency = 0.0
+    stats = STATS
+    token_interval = 0.01
+    slow_rate = 0.0
+    slow_latency = 0.0
+    error_rate = 0.0
+    limits = RateLimits()
+
+    def setup(self):
+        super().setup()
+        with STATS_LOCK:
+            self.stats["connections"] += 1
+
+    def _send_json(self, status: int, body: dict, headers: dict = None) -> None:
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _stream_completion(self, request: dict, headers: dict) -> None:
+        """Send the reply as chat.completion.chunk events, like the real API with stream=true"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        completion_id = f"chatcmpl-stub-{self.stats['requests']}"
+        words = STREAM_REPLY.split(" ")
+        for index, word in enumerate(words + [None]):
+            if index:
+                time.sleep(self.token_interval)
+            delta = {"role": "assistant", "content": word + " "} if word is not None else {}
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "gpt-4o-mini"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": None if word is not None else "stop"}]
+            }
+            self._send_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+        self._send_chunk(b"data: [DONE]\n\n")
+        self._send_chunk(b"")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if self.path not in CHAT_PATHS + EMBEDDING_PATHS:
+            return self._send_json(404, {"error": {"message": "Not found"}})
+        if self.error_rate and random.random() < self.error_rate:
+            with STATS_LOCK:
+                self.stats["errors"] += 1
+            return self._send_json(500, {"error": {"message": "Simulated provider error", "type": "server_error"}})
+
+        admitted, headers = self.limits.admit(100 + int(request.get("max_tokens") or 0))
+        if not admitted:
+            with STATS_LOCK:
+                self.stats["throttled"] += 1
+            return self._send_json(429, {
+                "error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}
+            }, headers)
+
+        try:
+            slow = self.slow_rate and random.random() < self.slow_rate
+            time.sleep(self.slow_latency if slow else self.latency)
+            with STATS_LOCK:
+                self.stats["requests"] += 1
+            if self.path in EMBEDDING_PATHS:
+                return self._send_json(200, {
+                    "object": "list",
+                    "data": [{"object": "embedding", "index": 0, "embedding": [0.0] * 8}],
+                    "model": request.get("model", "text-embedding-3-small"),
+                    "usage": {"prompt_tokens": 8, "total_tokens": 8}
+                }, headers)
+            if request.get("stream"):
+                try:
+                    return self._stream_completion(request, headers)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client cancelled the stream, e.g. a hedge that lost
+                    self.close_connection = True
+                    return
+        finally:
+            self.limits.done()
+        self._send_json(200, {
+            "id": f"chatcmpl-stub-{self.stats['requests']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "gpt-4o-mini"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "A stub description of the image."},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 100, "completion_tokens": 8, "total_tokens": 108}
+        }, headers)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            return self._send_json(200, self.stats)
+        self._send_json(404, {"error": {"message": "Not found"}})
+
+    def log_message(self, format, *args):
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub OpenAI vision server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=0.8, help="Seconds to wait per completion, or before the first streamed chunk")
+    parser.add_argument("--token-interval", type=float, default=0.01, help="Seconds between streamed chunks")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Share of completions that take --slow-latency")
+    parser.add_argument("--slow-latency", type=float, default=5.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with a 500")
+    parser.add_argument("--rpm", type=int, default=0, help="Requests per window, 0 for no limit")
+    parser.add_argument("--tpm", type=int, default=0, help="Tokens per window, 0 for no limit")
+    parser.add_argument("--max-concurrent", type=int, default=0, help="Requests in flight, 0 for no limit")
+    parser.add_argument("--window", type=float, default=60.0, help="Seconds per rate-limit window")
+    args = parser.parse_args()
+
+    StubVisionHandler.latency = args.latency
+    StubVisionHandler.token_interval = args.token_interval
+    StubVisionHandler.slow_rate = args.slow_rate
+    StubVisionHandler.slow_latency = args.slow_latency
+    StubVisionHandler.error_rate = args.error_rate
+    StubVisionHandler.limits = RateLimits(args.rpm, args.tpm, args.max_concurrent, args.window)
+    server = ThreadingHTTPServer((args.host, args.port), StubVisionHandler)
+    print(f"Stub vision server listening on http://{args.host}:{args.port}/v1")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Summarise spans written by the file trace exporter.
+
+Prints each trace as an indented tree with durations, so a slow analysis
+can be broken down into queue wait, GCS download, encoding, the provider
+call and the stats write.
+
+    TRACING_EXPORTER=file TRACING_SAMPLE_RATIO=1 uvicorn app.main:app
+    python scripts/trace_summary.py logs/traces.jsonl --slowest 5
+"""
+import argparse
+import json
+from collections import defaultdict
+
+def load_traces(path: str):
+    traces = defaultdict(list)
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                span = json.loads(line)
+                traces[span["trace_id"]].append(span)
+    return traces
+
+def print_trace(trace_id: str, spans) -> None:
+    by_parent = defaultdict(list)
+    span_ids = {span["span_id"] for span in spans}
+    for span in spans:
+        parent = span["parent_id"] if span["parent_id"] in span_ids else None
+        by_parent[parent].append(span)
+
+    def walk(parent, depth):
+        for span in sorted(by_parent[parent], key=lambda s: s["start_ns"]):
+            service = span.get("service") or "?"
+            status = "" if span["status"] != "ERROR" else "  [error]"
+            print(f"{'  ' * depth}{span['name']:<{60 - 2 * depth}} {span['duration_ms']:>10.1f} ms  {service}{status}")
+            walk(span["span_id"], depth + 1)
+
+    start = min(span["start_ns"] for span in spans)
+    end = max(span["end_ns"] for span in spans)
+    print(f"trace {trace_id}  {(end - start) / 1e6:.1f} ms")
+    walk(None, 1)
+    print()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path")
+    parser.add_argument("--trace", help="Only print this trace ID")
+    parser.add_argument("--slowest", type=int, default=10, help="Print the N slowest traces")
+    args = parser.parse_args()
+
+    traces = load_traces(args.path)
+    if args.trace:
+        print_trace(args.trace, traces[args.trace])
+        return
+
+    def total(spans):
+        return max(s["end_ns"] for s in spans) - min(s["start_ns"] for s in spans)
+
+    for trace_id, spans in sorted(traces.items(), key=lambda item: total(item[1]), reverse=True)[:args.slowest]:
+        print_trace(trace_id, spans)
+
+if __name__ == "__main__":
+    main()
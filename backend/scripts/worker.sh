@@ -0,0 +1,74 @@
+#!/bin/bash
+set -e
+
+# Start a Celery worker tuned for one group of queues:
+#
+#   scripts/worker.sh uploads       # prefork, CPU-bound image validation and hashing
+#   scripts/worker.sh analysis      # threads, I/O-bound vision calls
+#   scripts/worker.sh extraction    # threads (gevent when installed), I/O-bound crawls
+#   scripts/worker.sh maintenance   # beat housekeeping and unrouted tasks
+#   scripts/worker.sh all           # every queue in one worker, for development
+#
+# WORKER_POOL, WORKER_CONCURRENCY and WORKER_PREFETCH override the profile;
+# further arguments are passed to celery worker.
+
+PROFILE=${1:-all}
+shift || true
+
+# Ensure we're in the backend directory
+cd "$(dirname "$0")/.."
+export PYTHONPATH=.
+
+CPUS=$(python -c "import os; print(os.cpu_count() or 1)")
+
+case "$PROFILE" in
+    uploads)
+        QUEUES=uploads
+        POOL=prefork
+        CONCURRENCY=$CPUS
+        PREFETCH=4  # Short tasks; prefetching hides broker round trips
+        ;;
+    analysis)
+        QUEUES=analysis
+        POOL=threads
+        CONCURRENCY=32
+        PREFETCH=1  # Long tasks; with acks_late each thread reserves only what it runs
+        export VISION_CLIENT_MODE=${VISION_CLIENT_MODE:-async}
+        ;;
+    extraction)
+        QUEUES=extraction
+        if python -c "import gevent" 2>/dev/null; then
+            POOL=gevent
+            CONCURRENCY=64
+        else
+            POOL=threads
+            CONCURRENCY=16
+        fi
+        PREFETCH=1
+        ;;
+    maintenance)
+        QUEUES=maintenance,celery
+        POOL=prefork
+        CONCURRENCY=1
+        PREFETCH=1
+        ;;
+    all)
+        QUEUES=celery,uploads,analysis,extraction,maintenance
+        POOL=prefork
+        CONCURRENCY=$CPUS
+        PREFETCH=1
+        ;;
+    *)
+        echo "Unknown worker profile: $PROFILE (uploads, analysis, extraction, maintenance or all)"
+        exit 1
+        ;;
+esac
+
+exec celery -A app.core.celery_app:celery_app worker \
+    --hostname "$PROFILE@%h" \
+    --queues "$QUEUES" \
+    --pool "${WORKER_POOL:-$POOL}" \
+    --concurrency "${WORKER_CONCURRENCY:-$CONCURRENCY}" \
+    --prefetch-multiplier "${WORKER_PREFETCH:-$PREFETCH}" \
+    --loglevel info \
+    "$@"
@@ -0,0 +1,89 @@
+import pytest
+from app.core.config import settings
+from app.services.fair_queue import FairQueue
+
+@pytest.fixture
+def sent():
+    return []
+
+@pytest.fixture
+def queue(redis, sent, monkeypatch):
+    monkeypatch.setattr(settings, "FAIR_QUEUE_ENABLED", True)
+    return FairQueue("test", "tests.task", max_in_flight=2, lease_seconds=60, send=lambda job_id, args, kwargs: sent.append(job_id))
+
+def queue_without_dispatch(queue, monkeypatch, jobs):
+    """Submit (user, job_id) pairs without the dispatch submit() runs after each"""
+    with monkeypatch.context() as patch:
+        patch.setattr(queue, "dispatch", lambda *args, **kwargs: 0)
+        for user_id, job_id in jobs:
+            queue.submit(user_id, [job_id], job_id=job_id)
+
+def test_dispatch_visits_users_round_robin(queue, sent, monkeypatch):
+    queue.max_in_flight = 10
+    queue_without_dispatch(queue, monkeypatch, [("a", "a1"), ("a", "a2"), ("a", "a3"), ("b", "b1"), ("b", "b2")])
+
+    assert queue.dispatch() == 5
+    # Users alternate while both have jobs, and each user's jobs keep their order
+    assert {sent[0][0], sent[1][0]} == {"a", "b"}
+    assert [job[0] for job in sent[:4]] == [sent[0][0], sent[1][0]] * 2
+    assert [job for job in sent if job[0] == "a"] == ["a1", "a2", "a3"]
+    assert [job for job in sent if job[0] == "b"] == ["b1", "b2"]
+
+def test_in_flight_cap_holds_jobs_until_one_finishes(queue, sent):
+    for index in range(4):
+        queue.submit("a", [index], job_id=f"a{index}")
+    assert sent == ["a0", "a1"]
+    assert queue.user_stats("a")["pending"] == 2
+    assert queue.user_stats("a")["in_flight"] == 2
+
+    queue.finished("a0")
+    assert sent == ["a0", "a1", "a2"]
+
+def test_capped_user_does_not_block_others(queue, sent):
+    for index in range(3):
+        queue.submit("a", [index], job_id=f"a{index}")
+    queue.submit("b", [0], job_id="b0")
+    assert sent == ["a0", "a1", "b0"]
+
+def test_expired_lease_frees_the_slot(queue, sent, clock):
+    queue.max_in_flight = 1
+    queue.submit("a", [0], job_id="a0")
+    queue.submit("a", [1], job_id="a1")
+    assert sent == ["a0"]
+
+    # a0 never reported back; its slot is reclaimed once the lease runs out
+    clock.advance(30)
+    assert queue.dispatch() == 0
+    clock.advance(31)
+    assert queue.dispatch() == 1
+    assert sent == ["a0", "a1"]
+
+def test_unsent_jobs_are_requeued_in_order(queue, sent, monkeypatch):
+    queue.max_in_flight = 10
+    queue_without_dispatch(queue, monkeypatch, [("a", "a1"), ("a", "a2"), ("a", "a3"), ("b", "b1")])
+
+    def broker_down_at_a2(job_id, args, kwargs):
+        if job_id == "a2":
+            raise ConnectionError("broker unavailable")
+        sent.append(job_id)
+
+    queue.send = broker_down_at_a2
+    assert queue.dispatch() == 2
+    assert sorted(sent) == ["a1", "b1"]
+    # a2 and everything after it went back to the front of a's queue without holding a slot
+    assert queue.user_stats("a")["pending"] == 2
+    assert queue.user_stats("a")["in_flight"] == 1
+
+    queue.send = lambda job_id, args, kwargs: sent.append(job_id)
+    assert queue.dispatch() == 2
+    assert sent[2:] == ["a2", "a3"]
+    assert queue.user_stats("a")["pending"] == 0
+    assert queue.user_stats("a")["in_flight"] == 3
+
+def test_unavailable_redis_sends_directly(queue, sent, redis):
+    def down(*args, **kwargs):
+        raise ConnectionError("redis unavailable")
+
+    queue._scripts = (down, down, down)
+    queue.submit("a", [0], job_id="a0")
+    assert sent == ["a0"]
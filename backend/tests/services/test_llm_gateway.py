@@ -0,0 +1,112 @@
+import pytest
+from app.core.config import settings
+from app.services import llm_gateway
+from app.services.llm_gateway import BACKGROUND, INTERACTIVE, WAITER_TTL_SECONDS, LLMGateway, RateBudget, _parse_model_limits
+
+@pytest.fixture(autouse=True)
+def reserve(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_BACKGROUND_RESERVE", 0.2)
+
+def admit(budget, lane, tokens=0, waiter="caller"):
+    return budget._try_admit(waiter, lane, tokens, 0.0)
+
+def admitted_in_a_row(budget, lane, tokens=0):
+    count = 0
+    while admit(budget, lane, tokens, waiter=f"{lane}-{count}")[0]:
+        count += 1
+    return count
+
+def test_requests_refill_over_the_minute(redis, clock):
+    budget = RateBudget("openai", "test-model", rpm=10, tpm=0)
+    assert admitted_in_a_row(budget, INTERACTIVE) == 10
+
+    admitted, wait = admit(budget, INTERACTIVE)
+    assert not admitted
+    assert wait == pytest.approx(6.0)
+
+    clock.advance(6.0)
+    assert admit(budget, INTERACTIVE)[0]
+    assert not admit(budget, INTERACTIVE)[0]
+
+def test_background_leaves_the_reserve_to_interactive_calls(redis, clock):
+    budget = RateBudget("openai", "test-model", rpm=10, tpm=0)
+    assert admitted_in_a_row(budget, BACKGROUND) == 8
+    assert admitted_in_a_row(budget, INTERACTIVE) == 2
+
+def test_background_yields_to_queued_interactive_callers(redis, clock, monkeypatch):
+    # Without a reserve the budget alone would let the background call through
+    monkeypatch.setattr(settings, "LLM_BACKGROUND_RESERVE", 0.0)
+    budget = RateBudget("openai", "test-model", rpm=0, tpm=600)
+    assert admit(budget, INTERACTIVE, tokens=500)[0]
+    # This chat has to queue for tokens and registers as waiting
+    assert not admit(budget, INTERACTIVE, tokens=150, waiter="chat")[0]
+
+    admitted, wait = admit(budget, BACKGROUND, tokens=100)
+    assert not admitted
+    assert wait == pytest.approx(0.05)
+
+    # Once the chat is admitted the background call goes ahead
+    clock.advance(5)
+    assert admit(budget, INTERACTIVE, tokens=150, waiter="chat")[0]
+    clock.advance(10)
+    assert admit(budget, BACKGROUND, tokens=100)[0]
+
+def test_crashed_interactive_waiters_expire(redis, clock, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_BACKGROUND_RESERVE", 0.0)
+    budget = RateBudget("openai", "test-model", rpm=0, tpm=600)
+    assert admit(budget, INTERACTIVE, tokens=500)[0]
+    assert not admit(budget, INTERACTIVE, tokens=150, waiter="gone")[0]
+
+    clock.advance(WAITER_TTL_SECONDS + 1)
+    assert admit(budget, BACKGROUND, tokens=100)[0]
+
+def test_oversized_calls_are_capped_to_the_budget(redis, clock):
+    budget = RateBudget("openai", "test-model", rpm=0, tpm=1000)
+    # More tokens than a minute allows would otherwise never be admitted
+    assert admit(budget, INTERACTIVE, tokens=5000)[0]
+
+    clock.advance(60)
+    # A background call is capped to what it may use without touching the reserve
+    assert admit(budget, BACKGROUND, tokens=5000)[0]
+    assert budget.state()["tokens_available"] == pytest.approx(200)
+
+def test_admitted_waits_are_sampled_per_lane(redis, clock):
+    budget = RateBudget("openai", "test-model", rpm=10, tpm=0)
+    budget._try_admit("caller", INTERACTIVE, 0, 1.5)
+    waits = budget.state()["lanes"][INTERACTIVE]["wait_seconds"]
+    assert waits["samples"] == 1
+    assert waits["p50"] == 1.5
+
+def test_throttled_retries_are_charged_to_the_budget(redis, clock, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_GATEWAY_ENABLED", True)
+    monkeypatch.setattr(settings, "PROVIDER_LIMITER_ENABLED", True)
+    monkeypatch.setattr(settings, "PROVIDER_RETRY_BASE_SECONDS", 0.0)
+    monkeypatch.setattr(llm_gateway, "MODEL_RATE_LIMITS", {("openai", "retried-model"): (10, 0)})
+    attempts = []
+
+    class ThrottledError(Exception):
+        status_code = 429
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ThrottledError("rate limited")
+        return "ok"
+
+    gateway = LLMGateway()
+    assert gateway.call("openai", "retried-model", flaky, lane=INTERACTIVE) == "ok"
+    assert gateway.budget("openai", "retried-model").state()["requests_available"] == pytest.approx(7)
+
+def test_parse_model_limits():
+    assert _parse_model_limits("") == {}
+    assert _parse_model_limits("openai:gpt-4o=500/30000, groq:llama-3.3-70b-versatile=30/6000,") == {
+        ("openai", "gpt-4o"): (500, 30000),
+        ("groq", "llama-3.3-70b-versatile"): (30, 6000)
+    }
+    # Model names may contain colons
+    assert _parse_model_limits("openai:ft:gpt-4o:org=10/100") == {("openai", "ft:gpt-4o:org"): (10, 100)}
+
+@pytest.mark.parametrize("value", ["openai=500/30000", "openai:gpt-4o=500", "openai:gpt-4o=many/30000"])
+def test_parse_model_limits_rejects_malformed_entries(value):
+    with pytest.raises(ValueError, match="LLM_MODEL_RATE_LIMITS"):
+        _parse_model_limits(value)
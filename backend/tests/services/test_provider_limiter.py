@@ -0,0 +1,154 @@
+import uuid
+import pytest
+from app.core.config import settings
+from app.services.provider_limiter import AdaptiveLimiter, ProviderBusyError, block_seconds_from_headers
+
+class ThrottledError(Exception):
+    status_code = 429
+
+class RawResponse:
+    def __init__(self, headers):
+        self.headers = headers
+
+@pytest.fixture
+def limiter(redis, clock, monkeypatch):
+    monkeypatch.setattr(settings, "PROVIDER_LIMIT_BACKOFF_FACTOR", 0.5)
+    monkeypatch.setattr(settings, "PROVIDER_LIMIT_DECREASE_WINDOW_SECONDS", 1.0)
+    monkeypatch.setattr(settings, "PROVIDER_LEASE_SECONDS", 600)
+    return AdaptiveLimiter("openai", "test-model", initial_limit=4, min_limit=1, max_limit=5)
+
+def take(limiter):
+    """Try for a slot without waiting; returns its token (or None) and how long callers are blocked"""
+    token = uuid.uuid4().hex
+    acquired, blocked_for = limiter._try_acquire(token)
+    return token if acquired else None, blocked_for
+
+def test_success_raises_the_limit_additively(limiter):
+    token, _ = take(limiter)
+    limiter._release(token, "success")
+    assert limiter.state()["limit"] == pytest.approx(4.25)
+
+    # One slot per round of calls, up to the maximum
+    for _ in range(20):
+        token, _ = take(limiter)
+        limiter._release(token, "success")
+    assert limiter.state()["limit"] == 5
+
+def test_throttle_cuts_the_limit_once_per_window(limiter, clock):
+    for _ in range(3):
+        token, _ = take(limiter)
+        limiter._release(token, "throttled")
+    assert limiter.state()["limit"] == 2
+
+    clock.advance(1.5)
+    token, _ = take(limiter)
+    limiter._release(token, "throttled")
+    assert limiter.state()["limit"] == 1
+
+    # Never below the minimum
+    clock.advance(1.5)
+    token, _ = take(limiter)
+    limiter._release(token, "throttled")
+    assert limiter.state()["limit"] == 1
+
+def test_limit_caps_concurrent_slots(limiter):
+    tokens = [take(limiter)[0] for _ in range(4)]
+    assert all(tokens)
+    assert take(limiter) == (None, 0.0)
+
+    limiter._release(tokens[0], "success")
+    assert take(limiter)[0] is not None
+
+def test_retry_after_blocks_every_caller(limiter, clock):
+    token, _ = take(limiter)
+    limiter._release(token, "throttled", block_seconds_from_headers({"retry-after": "2"}))
+
+    token, blocked_for = take(limiter)
+    assert token is None
+    assert blocked_for == pytest.approx(2.0)
+
+    clock.advance(2.1)
+    assert take(limiter)[0] is not None
+
+def test_exhausted_rate_limit_headers_block_until_reset(limiter, clock):
+    # A successful call can still report that the provider's budget is spent
+    result = limiter.call(lambda: RawResponse({
+        "x-ratelimit-remaining-requests": "0",
+        "x-ratelimit-reset-requests": "1m30s",
+        "x-ratelimit-remaining-tokens": "1200",
+        "x-ratelimit-reset-tokens": "6m0s"
+    }))
+    assert isinstance(result, RawResponse)
+
+    token, blocked_for = take(limiter)
+    assert token is None
+    assert blocked_for == pytest.approx(90.0)
+
+    clock.advance(91)
+    assert take(limiter)[0] is not None
+
+def test_block_seconds_from_headers():
+    assert block_seconds_from_headers(None) == 0.0
+    assert block_seconds_from_headers({"retry-after-ms": "250", "retry-after": "5"}) == 0.25
+    assert block_seconds_from_headers({"retry-after": "5"}) == 5.0
+    assert block_seconds_from_headers({"x-ratelimit-remaining-tokens": "0", "x-ratelimit-reset-tokens": "20ms"}) == pytest.approx(0.02)
+    assert block_seconds_from_headers({"x-ratelimit-remaining-requests": "3", "x-ratelimit-reset-requests": "1s"}) == 0.0
+
+def test_expired_lease_returns_the_slot(limiter, clock):
+    limiter.initial_limit = 1
+    assert take(limiter)[0] is not None  # never released, as if its process crashed
+    assert take(limiter)[0] is None
+
+    clock.advance(settings.PROVIDER_LEASE_SECONDS + 1)
+    assert take(limiter)[0] is not None
+
+def test_throttled_call_is_retried(limiter, monkeypatch):
+    monkeypatch.setattr(settings, "PROVIDER_RETRY_BASE_SECONDS", 0.0)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ThrottledError("rate limited")
+        return "ok"
+
+    assert limiter.call(flaky) == "ok"
+    assert len(attempts) == 3
+    assert limiter.state()["in_flight"] == 0
+
+def test_other_errors_are_not_retried(limiter):
+    def broken():
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        limiter.call(broken)
+    assert limiter.state()["in_flight"] == 0
+
+def test_retries_run_before_retry(limiter, monkeypatch):
+    monkeypatch.setattr(settings, "PROVIDER_RETRY_BASE_SECONDS", 0.0)
+    charged = []
+
+    def flaky():
+        if len(charged) < 2:
+            raise ThrottledError("rate limited")
+        return "ok"
+
+    assert limiter.call(flaky, before_retry=lambda: charged.append(1)) == "ok"
+    # Once per retry, not for the first attempt
+    assert len(charged) == 2
+
+def test_slot_wait_gives_up_after_the_timeout(limiter, clock, monkeypatch):
+    limiter.initial_limit = 1
+    assert take(limiter)[0] is not None
+    polls = []
+
+    def poll_delay(blocked_for):
+        polls.append(1)
+        clock.advance(1.0)
+        return 0
+
+    monkeypatch.setattr(limiter, "_poll_delay", poll_delay)
+    with pytest.raises(ProviderBusyError):
+        limiter.acquire(timeout=5)
+    # Well short of PROVIDER_QUEUE_TIMEOUT_SECONDS
+    assert len(polls) == 6